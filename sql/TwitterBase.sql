@@ -1,33 +1,21 @@
 PRAGMA foreign_keys;
 
-DROP TABLE IF EXISTS TweetKeyPhrases;
-DROP TABLE IF EXISTS TweetHashtags;
-DROP TABLE IF EXISTS TweetSentiment;
-DROP TABLE IF EXISTS TweetConfidence;
-DROP TABLE IF EXISTS Tweets;
-DROP TABLE IF EXISTS Users;
-DROP TABLE IF EXISTS ConfidenceTypes;
-DROP TABLE IF EXISTS Hashtags;
-DROP TABLE IF EXISTS Locations;
-DROP TABLE IF EXISTS KeyPhrases;
-DROP TABLE IF EXISTS Sentiments;
-
-CREATE TABLE Users
+CREATE TABLE IF NOT EXISTS Users
 (
-    UserID int IDENTITY(1,1) PRIMARY KEY NOT NULL,
-    AuthorID bigint NOT NULL,
+    UserID INTEGER PRIMARY KEY NOT NULL,
+    AuthorID bigint NOT NULL UNIQUE,
     UserHandle nvarchar(255) NOT NULL,
     UserName nvarchar(255) NOT NULL
 );
 
-CREATE TABLE Locations
+CREATE TABLE IF NOT EXISTS Locations
 (
-    LocationID int IDENTITY(1,1) PRIMARY KEY NOT NULL,
-    LocationCode nvarchar(255) NOT NULL,
+    LocationID INTEGER PRIMARY KEY NOT NULL,
+    LocationCode nvarchar(255) NOT NULL UNIQUE,
     LocationName nvarchar(255) NOT NULL
 );
 
-CREATE TABLE Tweets
+CREATE TABLE IF NOT EXISTS Tweets
 (
     TweetID bigint PRIMARY KEY NOT NULL,
     TweetAuthorID int NOT NULL,
@@ -40,31 +28,31 @@ CREATE TABLE Tweets
     FOREIGN KEY (LocationID) REFERENCES Locations(LocationID)
 );
 
-CREATE TABLE ConfidenceTypes
+CREATE TABLE IF NOT EXISTS ConfidenceTypes
 (
-    ConfidenceTypeID int IDENTITY(1,1) PRIMARY KEY NOT NULL,
+    ConfidenceTypeID INTEGER PRIMARY KEY NOT NULL,
     ConfidenceLabel nvarchar(255) NOT NULL
 );
 
-CREATE TABLE Hashtags
+CREATE TABLE IF NOT EXISTS Hashtags
 (
-    HashtagID int IDENTITY(1,1) PRIMARY KEY NOT NULL,
-    HashtagText nvarchar(255) NOT NULL
+    HashtagID INTEGER PRIMARY KEY NOT NULL,
+    HashtagText nvarchar(255) NOT NULL UNIQUE
 );
 
-CREATE TABLE KeyPhrases
+CREATE TABLE IF NOT EXISTS KeyPhrases
 (
-    KeyPhraseID int IDENTITY(1,1) PRIMARY KEY NOT NULL,
-    KeyPhraseText nvarchar(255) NOT NULL
+    KeyPhraseID INTEGER PRIMARY KEY NOT NULL,
+    KeyPhraseText nvarchar(255) NOT NULL UNIQUE
 );
 
-CREATE TABLE Sentiments
+CREATE TABLE IF NOT EXISTS Sentiments
 (
-    SentimentID int IDENTITY(1,1) PRIMARY KEY NOT NULL,
+    SentimentID INTEGER PRIMARY KEY NOT NULL,
     SentimentName nvarchar(255) NOT NULL
 );
 
-CREATE TABLE TweetSentiment
+CREATE TABLE IF NOT EXISTS TweetSentiment
 (
     TweetID bigint NOT NULL,
     SentimentID int NOT NULL,
@@ -73,7 +61,7 @@ CREATE TABLE TweetSentiment
     PRIMARY KEY (TweetID, SentimentID)
 );
 
-CREATE TABLE TweetConfidence
+CREATE TABLE IF NOT EXISTS TweetConfidence
 (
     TweetID bigint NOT NULL,
     ConfidenceTypeID int NOT NULL,
@@ -83,7 +71,7 @@ CREATE TABLE TweetConfidence
     PRIMARY KEY (TweetID, ConfidenceTypeID)
 );
 
-CREATE TABLE TweetKeyPhrases
+CREATE TABLE IF NOT EXISTS TweetKeyPhrases
 (
     TweetID bigint NOT NULL,
     KeyPhraseID int NOT NULL,
@@ -92,7 +80,7 @@ CREATE TABLE TweetKeyPhrases
     PRIMARY KEY (TweetID, KeyPhraseID)
 );
 
-CREATE TABLE TweetHashtags
+CREATE TABLE IF NOT EXISTS TweetHashtags
 (
     TweetID bigint NOT NULL,
     HashtagID int NOT NULL,
@@ -105,11 +93,13 @@ INSERT INTO ConfidenceTypes (ConfidenceTypeID, ConfidenceLabel)
 VALUES
     (1, 'positive'),
     (2, 'neutral'),
-    (3, 'negative');
+    (3, 'negative')
+ON CONFLICT (ConfidenceTypeID) DO NOTHING;
 
 INSERT INTO Sentiments (SentimentID, SentimentName)
 VALUES
     (1, 'positive'),
     (2, 'neutral'),
     (3, 'mixed'),
-    (4, 'negative');
+    (4, 'negative')
+ON CONFLICT (SentimentID) DO NOTHING;
@@ -1,27 +1,4 @@
-DROP VIEW IF EXISTS TweetUserView;
-DROP VIEW IF EXISTS TweetTagView;
-DROP VIEW IF EXISTS TweetPhraseView;
-DROP VIEW IF EXISTS NegativeTweets;
-DROP VIEW IF EXISTS AbortionTweets;
-DROP VIEW IF EXISTS GunControlTweets;
-DROP VIEW IF EXISTS VaccineTweets;
-DROP VIEW IF EXISTS PositiveTweets;
-DROP VIEW IF EXISTS TweetDominantConfidenceScore;
-
-WITH DistinctTweets
-AS
-(
-    SELECT DISTINCT
-        T.TweetID
-    FROM
-        Tweets AS T
-)
-SELECT
-    COUNT(*)
-FROM
-    DistinctTweets;
-
-CREATE VIEW TweetUserView
+CREATE VIEW IF NOT EXISTS TweetUserView
 AS
     SELECT DISTINCT
         T.TweetTopic,
@@ -39,7 +16,7 @@ AS
         LEFT JOIN Locations AS L
             ON T.LocationID = L.LocationID;
 
-CREATE VIEW TweetTagView
+CREATE VIEW IF NOT EXISTS TweetTagView
 AS
     SELECT
         T.TweetID,
@@ -52,7 +29,7 @@ AS
         INNER JOIN Hashtags AS H
             ON TH.HashtagID = H.HashtagID;
 
--- CREATE VIEW TweetSentimentView
+-- CREATE VIEW IF NOT EXISTS TweetSentimentView
 -- AS
 --     WITH TweetConTable
 --     AS
@@ -86,7 +63,7 @@ AS
 --             FOR TC.ConfidenceLabel IN ([positive], [neutral], [negative])
 --         ) AS PVT;
 
-CREATE VIEW TweetPhraseView
+CREATE VIEW IF NOT EXISTS TweetPhraseView
 AS
     SELECT
         TKP.TweetID,
@@ -97,7 +74,7 @@ AS
         INNER JOIN KeyPhrases AS KP
             ON TKP.KeyPhraseID = KP.KeyPhraseID;
 
-CREATE VIEW NegativeTweets
+CREATE VIEW IF NOT EXISTS NegativeTweets
 AS
     SELECT
         T.TweetID,
@@ -113,7 +90,7 @@ AS
     WHERE
         S.SentimentName = 'negative';
 
-CREATE VIEW AbortionTweets
+CREATE VIEW IF NOT EXISTS AbortionTweets
 AS
     SELECT
         *
@@ -124,7 +101,7 @@ AS
     WHERE
         TweetTopic = 'Abortion';
 
-CREATE VIEW GunControlTweets
+CREATE VIEW IF NOT EXISTS GunControlTweets
 AS
     SELECT
         *
@@ -135,7 +112,7 @@ AS
     WHERE
         TweetTopic = 'Gun Control';
 
-CREATE VIEW VaccineTweets
+CREATE VIEW IF NOT EXISTS VaccineTweets
 AS
     SELECT
         *
@@ -147,7 +124,7 @@ AS
         TweetTopic = 'Vaccine';
 
 
-CREATE VIEW PositiveTweets
+CREATE VIEW IF NOT EXISTS PositiveTweets
 AS
     SELECT
         T.TweetID,
@@ -164,7 +141,7 @@ AS
         S.SentimentName = 'positive';
 
 
-CREATE VIEW TweetDominantConfidenceScore
+CREATE VIEW IF NOT EXISTS TweetDominantConfidenceScore
 AS
     SELECT
         TC.TweetID,
@@ -0,0 +1,19 @@
+-- Where each topic's ingest left off. A "pass" pages backwards from the newest tweets (stopping at
+-- SinceID, the newest tweet stored by the previous pass) until it has TargetCount tweets or runs out
+-- of pages. While a pass is running, NextToken is the page to fetch next, so a restart picks up there.
+CREATE TABLE IF NOT EXISTS IngestCheckpoints
+(
+    TopicName nvarchar(255) PRIMARY KEY NOT NULL,
+    Status nvarchar(16) NOT NULL DEFAULT 'complete',
+    NextToken nvarchar(255) DEFAULT NULL,
+    SinceID bigint DEFAULT NULL,
+    NewestTweetID bigint DEFAULT NULL,
+    OldestTweetID bigint DEFAULT NULL,
+    TargetCount int NOT NULL DEFAULT 0,
+    PassFetched int NOT NULL DEFAULT 0,
+    TotalFetched int NOT NULL DEFAULT 0,
+    TotalStored int NOT NULL DEFAULT 0,
+    PagesFetched int NOT NULL DEFAULT 0,
+    StartedAt datetime NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    UpdatedAt datetime NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,25 @@
+-- Secondary indexes for the exporter's lookups and the reporting views. The natural keys of the
+-- dimension tables (Users.AuthorID, Locations.LocationCode, Hashtags.HashtagText,
+-- KeyPhrases.KeyPhraseText) are UNIQUE, which SQLite backs with an index of its own, and their surrogate
+-- keys are INTEGER PRIMARY KEYs (SQLite's rowid, assigned automatically on insert). Databases made with the
+-- original schema get both from TwitterNaturalKeys.sql.
+
+-- Topic filters (the per-topic views) and topic + date range queries:
+CREATE INDEX IF NOT EXISTS IX_Tweets_TopicDate ON Tweets (TweetTopic, TweetDate);
+
+-- Date range queries across all topics:
+CREATE INDEX IF NOT EXISTS IX_Tweets_Date ON Tweets (TweetDate);
+
+-- Joins from the dimension tables back to their tweets:
+CREATE INDEX IF NOT EXISTS IX_Tweets_Author ON Tweets (TweetAuthorID);
+CREATE INDEX IF NOT EXISTS IX_Tweets_Location ON Tweets (LocationID);
+
+-- The junction tables' primary keys start with TweetID; these cover the other direction
+-- (e.g. every tweet with a given hashtag, key phrase or sentiment) without touching the table:
+CREATE INDEX IF NOT EXISTS IX_TweetHashtags_Hashtag ON TweetHashtags (HashtagID, TweetID);
+CREATE INDEX IF NOT EXISTS IX_TweetKeyPhrases_KeyPhrase ON TweetKeyPhrases (KeyPhraseID, TweetID);
+CREATE INDEX IF NOT EXISTS IX_TweetSentiment_Sentiment ON TweetSentiment (SentimentID, TweetID);
+
+-- The lookup tables' labels are natural keys too:
+CREATE UNIQUE INDEX IF NOT EXISTS UX_Sentiments_Name ON Sentiments (SentimentName);
+CREATE UNIQUE INDEX IF NOT EXISTS UX_ConfidenceTypes_Label ON ConfidenceTypes (ConfidenceLabel);
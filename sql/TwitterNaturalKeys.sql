@@ -0,0 +1,179 @@
+-- Rebuilds the dimension tables of databases made before their natural keys were UNIQUE. The original
+-- schema gave Users, Locations, Hashtags and KeyPhrases T-SQL "int IDENTITY(1,1)" keys (which SQLite never
+-- assigns) and allowed the same AuthorID, LocationCode, HashtagText or KeyPhraseText more than once, and
+-- CREATE TABLE IF NOT EXISTS leaves such tables as they are, so the exporter's upserts fail on them.
+-- Each table's duplicates are merged into their lowest ID (with every reference moved over), and the table
+-- is recreated with an INTEGER PRIMARY KEY and a UNIQUE natural key. On a database that is already in
+-- that shape, this only copies each table once.
+
+-- Step 1: Users (referenced by Tweets.TweetAuthorID).
+CREATE TEMP TABLE UserKeyMap
+AS
+    SELECT OldID, NewID
+    FROM (SELECT UserID AS OldID, MIN(UserID) OVER (PARTITION BY AuthorID) AS NewID FROM Users)
+    WHERE OldID != NewID;
+
+UPDATE Tweets
+SET TweetAuthorID = (SELECT M.NewID FROM temp.UserKeyMap AS M WHERE M.OldID = Tweets.TweetAuthorID)
+WHERE TweetAuthorID IN (SELECT OldID FROM temp.UserKeyMap);
+
+CREATE TEMP TABLE UsersCopy
+AS
+    SELECT UserID, AuthorID, UserHandle, UserName
+    FROM Users
+    WHERE UserID NOT IN (SELECT OldID FROM temp.UserKeyMap);
+
+DROP TABLE Users;
+
+CREATE TABLE Users
+(
+    UserID INTEGER PRIMARY KEY NOT NULL,
+    AuthorID bigint NOT NULL UNIQUE,
+    UserHandle nvarchar(255) NOT NULL,
+    UserName nvarchar(255) NOT NULL
+);
+
+INSERT INTO Users (UserID, AuthorID, UserHandle, UserName)
+    SELECT UserID, AuthorID, UserHandle, UserName FROM temp.UsersCopy;
+
+DROP TABLE temp.UsersCopy;
+DROP TABLE temp.UserKeyMap;
+
+-- Step 2: Locations (referenced by Tweets.LocationID).
+CREATE TEMP TABLE LocationKeyMap
+AS
+    SELECT OldID, NewID
+    FROM (SELECT LocationID AS OldID, MIN(LocationID) OVER (PARTITION BY LocationCode) AS NewID FROM Locations)
+    WHERE OldID != NewID;
+
+UPDATE Tweets
+SET LocationID = (SELECT M.NewID FROM temp.LocationKeyMap AS M WHERE M.OldID = Tweets.LocationID)
+WHERE LocationID IN (SELECT OldID FROM temp.LocationKeyMap);
+
+CREATE TEMP TABLE LocationsCopy
+AS
+    SELECT LocationID, LocationCode, LocationName
+    FROM Locations
+    WHERE LocationID NOT IN (SELECT OldID FROM temp.LocationKeyMap);
+
+DROP TABLE Locations;
+
+CREATE TABLE Locations
+(
+    LocationID INTEGER PRIMARY KEY NOT NULL,
+    LocationCode nvarchar(255) NOT NULL UNIQUE,
+    LocationName nvarchar(255) NOT NULL
+);
+
+INSERT INTO Locations (LocationID, LocationCode, LocationName)
+    SELECT LocationID, LocationCode, LocationName FROM temp.LocationsCopy;
+
+DROP TABLE temp.LocationsCopy;
+DROP TABLE temp.LocationKeyMap;
+
+-- Step 3: Hashtags (referenced by TweetHashtags and TopicHashtagCounts). A tweet tagged with two copies of
+-- the same hashtag keeps one junction row, and the merged hashtags' counts are recounted:
+CREATE TEMP TABLE HashtagKeyMap
+AS
+    SELECT OldID, NewID
+    FROM (SELECT HashtagID AS OldID, MIN(HashtagID) OVER (PARTITION BY HashtagText) AS NewID FROM Hashtags)
+    WHERE OldID != NewID;
+
+UPDATE OR IGNORE TweetHashtags
+SET HashtagID = (SELECT M.NewID FROM temp.HashtagKeyMap AS M WHERE M.OldID = TweetHashtags.HashtagID)
+WHERE HashtagID IN (SELECT OldID FROM temp.HashtagKeyMap);
+
+DELETE FROM TweetHashtags WHERE HashtagID IN (SELECT OldID FROM temp.HashtagKeyMap);
+
+DELETE FROM TopicHashtagCounts
+WHERE HashtagID IN (SELECT OldID FROM temp.HashtagKeyMap UNION SELECT NewID FROM temp.HashtagKeyMap);
+
+INSERT INTO TopicHashtagCounts (TweetTopic, HashtagID, TweetCount)
+    SELECT
+        T.TweetTopic,
+        TH.HashtagID,
+        COUNT(*)
+
+    FROM
+        TweetHashtags AS TH
+        INNER JOIN Tweets AS T
+            ON TH.TweetID = T.TweetID
+
+    WHERE
+        TH.HashtagID IN (SELECT NewID FROM temp.HashtagKeyMap)
+
+    GROUP BY
+        T.TweetTopic, TH.HashtagID;
+
+CREATE TEMP TABLE HashtagsCopy
+AS
+    SELECT HashtagID, HashtagText
+    FROM Hashtags
+    WHERE HashtagID NOT IN (SELECT OldID FROM temp.HashtagKeyMap);
+
+DROP TABLE Hashtags;
+
+CREATE TABLE Hashtags
+(
+    HashtagID INTEGER PRIMARY KEY NOT NULL,
+    HashtagText nvarchar(255) NOT NULL UNIQUE
+);
+
+INSERT INTO Hashtags (HashtagID, HashtagText)
+    SELECT HashtagID, HashtagText FROM temp.HashtagsCopy;
+
+DROP TABLE temp.HashtagsCopy;
+DROP TABLE temp.HashtagKeyMap;
+
+-- Step 4: KeyPhrases (referenced by TweetKeyPhrases and TopicKeyPhraseCounts), the same way:
+CREATE TEMP TABLE KeyPhraseKeyMap
+AS
+    SELECT OldID, NewID
+    FROM (SELECT KeyPhraseID AS OldID, MIN(KeyPhraseID) OVER (PARTITION BY KeyPhraseText) AS NewID FROM KeyPhrases)
+    WHERE OldID != NewID;
+
+UPDATE OR IGNORE TweetKeyPhrases
+SET KeyPhraseID = (SELECT M.NewID FROM temp.KeyPhraseKeyMap AS M WHERE M.OldID = TweetKeyPhrases.KeyPhraseID)
+WHERE KeyPhraseID IN (SELECT OldID FROM temp.KeyPhraseKeyMap);
+
+DELETE FROM TweetKeyPhrases WHERE KeyPhraseID IN (SELECT OldID FROM temp.KeyPhraseKeyMap);
+
+DELETE FROM TopicKeyPhraseCounts
+WHERE KeyPhraseID IN (SELECT OldID FROM temp.KeyPhraseKeyMap UNION SELECT NewID FROM temp.KeyPhraseKeyMap);
+
+INSERT INTO TopicKeyPhraseCounts (TweetTopic, KeyPhraseID, TweetCount)
+    SELECT
+        T.TweetTopic,
+        TKP.KeyPhraseID,
+        COUNT(*)
+
+    FROM
+        TweetKeyPhrases AS TKP
+        INNER JOIN Tweets AS T
+            ON TKP.TweetID = T.TweetID
+
+    WHERE
+        TKP.KeyPhraseID IN (SELECT NewID FROM temp.KeyPhraseKeyMap)
+
+    GROUP BY
+        T.TweetTopic, TKP.KeyPhraseID;
+
+CREATE TEMP TABLE KeyPhrasesCopy
+AS
+    SELECT KeyPhraseID, KeyPhraseText
+    FROM KeyPhrases
+    WHERE KeyPhraseID NOT IN (SELECT OldID FROM temp.KeyPhraseKeyMap);
+
+DROP TABLE KeyPhrases;
+
+CREATE TABLE KeyPhrases
+(
+    KeyPhraseID INTEGER PRIMARY KEY NOT NULL,
+    KeyPhraseText nvarchar(255) NOT NULL UNIQUE
+);
+
+INSERT INTO KeyPhrases (KeyPhraseID, KeyPhraseText)
+    SELECT KeyPhraseID, KeyPhraseText FROM temp.KeyPhrasesCopy;
+
+DROP TABLE temp.KeyPhrasesCopy;
+DROP TABLE temp.KeyPhraseKeyMap;
@@ -0,0 +1,30 @@
+-- Near-duplicate clusters (see lib/near_duplicates.py). Each analyzed tweet records an ID for the text
+-- that was actually analyzed for it, so copies and lightly edited copies of the same tweet share a
+-- ClusterID and can be counted once.
+ALTER TABLE Tweets ADD COLUMN ClusterID int DEFAULT NULL;
+
+CREATE INDEX IF NOT EXISTS IX_Tweets_TopicIDCluster ON Tweets (TopicID, ClusterID);
+
+-- A topic's sentiment share with each cluster counted once (tweets without a ClusterID count on their own):
+CREATE VIEW IF NOT EXISTS TopicClusterSentimentView
+AS
+    SELECT
+        TP.TopicID,
+        TP.TopicName,
+        S.SentimentName,
+        COUNT(*) AS TweetCount,
+        COUNT(DISTINCT COALESCE('C' || T.ClusterID, 'T' || T.TweetID)) AS ClusterCount
+
+    FROM
+        Topics AS TP
+        INNER JOIN Tweets AS T
+            ON TP.TopicID = T.TopicID
+        INNER JOIN TweetSentiment AS TS
+            ON T.TweetID = TS.TweetID
+        INNER JOIN Sentiments AS S
+            ON TS.SentimentID = S.SentimentID
+
+    GROUP BY
+        TP.TopicID,
+        TP.TopicName,
+        S.SentimentName;
@@ -0,0 +1,17 @@
+-- Compressed copies of the raw X API search responses (see lib/raw_store.py). Tweets point at the page
+-- they came in on, so their full API payload stays available without widening the Tweets table; tweets
+-- stored with a RawPageID get an empty TweetJSON.
+CREATE TABLE IF NOT EXISTS RawPages
+(
+    RawPageID INTEGER PRIMARY KEY NOT NULL,
+    TopicID int DEFAULT NULL,
+    FetchedAt datetime NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    Codec nvarchar(16) NOT NULL,
+    RawSize int NOT NULL,
+    Payload blob NOT NULL,
+    FOREIGN KEY (TopicID) REFERENCES Topics(TopicID)
+);
+
+CREATE INDEX IF NOT EXISTS IX_RawPages_Topic ON RawPages (TopicID, RawPageID);
+
+ALTER TABLE Tweets ADD COLUMN RawPageID int DEFAULT NULL REFERENCES RawPages(RawPageID);
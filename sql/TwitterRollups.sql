@@ -0,0 +1,191 @@
+-- Rollup tables for the dashboard, kept up to date by the exporter in the same transaction as each
+-- page of tweets (so they only ever count committed tweets, each exactly once). Reading them costs
+-- per topic and time bucket rather than per tweet.
+
+-- Tweets per topic, hour and overall sentiment, with running sums of their confidence scores
+-- (divide by TweetCount for the averages):
+CREATE TABLE IF NOT EXISTS TopicSentimentHourly
+(
+    TweetTopic nvarchar(255) NOT NULL,
+    HourStart datetime NOT NULL,
+    SentimentID int NOT NULL,
+    TweetCount int NOT NULL DEFAULT 0,
+    PositiveScoreSum real NOT NULL DEFAULT 0,
+    NeutralScoreSum real NOT NULL DEFAULT 0,
+    NegativeScoreSum real NOT NULL DEFAULT 0,
+    FOREIGN KEY (SentimentID) REFERENCES Sentiments(SentimentID),
+    PRIMARY KEY (TweetTopic, HourStart, SentimentID)
+) WITHOUT ROWID;
+
+-- Tweets per topic that carry each key phrase / hashtag:
+CREATE TABLE IF NOT EXISTS TopicKeyPhraseCounts
+(
+    TweetTopic nvarchar(255) NOT NULL,
+    KeyPhraseID int NOT NULL,
+    TweetCount int NOT NULL DEFAULT 0,
+    FOREIGN KEY (KeyPhraseID) REFERENCES KeyPhrases(KeyPhraseID),
+    PRIMARY KEY (TweetTopic, KeyPhraseID)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS TopicHashtagCounts
+(
+    TweetTopic nvarchar(255) NOT NULL,
+    HashtagID int NOT NULL,
+    TweetCount int NOT NULL DEFAULT 0,
+    FOREIGN KEY (HashtagID) REFERENCES Hashtags(HashtagID),
+    PRIMARY KEY (TweetTopic, HashtagID)
+) WITHOUT ROWID;
+
+-- Top-N per topic reads the counts in order instead of sorting them:
+CREATE INDEX IF NOT EXISTS IX_TopicKeyPhraseCounts_Count ON TopicKeyPhraseCounts (TweetTopic, TweetCount DESC);
+CREATE INDEX IF NOT EXISTS IX_TopicHashtagCounts_Count ON TopicHashtagCounts (TweetTopic, TweetCount DESC);
+
+-- Backfill from whatever the database already holds:
+INSERT INTO TopicSentimentHourly
+    (TweetTopic, HourStart, SentimentID, TweetCount, PositiveScoreSum, NeutralScoreSum, NegativeScoreSum)
+    SELECT
+        T.TweetTopic,
+        strftime('%Y-%m-%d %H:00:00', T.TweetDate),
+        TS.SentimentID,
+        COUNT(*),
+        TOTAL(TC.PositiveScore),
+        TOTAL(TC.NeutralScore),
+        TOTAL(TC.NegativeScore)
+
+    FROM
+        Tweets AS T
+        INNER JOIN TweetSentiment AS TS
+            ON T.TweetID = TS.TweetID
+        LEFT JOIN
+        (
+            SELECT
+                TweetID,
+                TOTAL(CASE WHEN ConfidenceTypeID = 1 THEN ConfidenceScore END) AS PositiveScore,
+                TOTAL(CASE WHEN ConfidenceTypeID = 2 THEN ConfidenceScore END) AS NeutralScore,
+                TOTAL(CASE WHEN ConfidenceTypeID = 3 THEN ConfidenceScore END) AS NegativeScore
+            FROM
+                TweetConfidence
+            GROUP BY
+                TweetID
+        ) AS TC
+            ON T.TweetID = TC.TweetID
+
+    GROUP BY
+        T.TweetTopic, strftime('%Y-%m-%d %H:00:00', T.TweetDate), TS.SentimentID
+ON CONFLICT (TweetTopic, HourStart, SentimentID) DO NOTHING;
+
+INSERT INTO TopicKeyPhraseCounts (TweetTopic, KeyPhraseID, TweetCount)
+    SELECT
+        T.TweetTopic,
+        TKP.KeyPhraseID,
+        COUNT(*)
+
+    FROM
+        TweetKeyPhrases AS TKP
+        INNER JOIN Tweets AS T
+            ON TKP.TweetID = T.TweetID
+
+    GROUP BY
+        T.TweetTopic, TKP.KeyPhraseID
+ON CONFLICT (TweetTopic, KeyPhraseID) DO NOTHING;
+
+INSERT INTO TopicHashtagCounts (TweetTopic, HashtagID, TweetCount)
+    SELECT
+        T.TweetTopic,
+        TH.HashtagID,
+        COUNT(*)
+
+    FROM
+        TweetHashtags AS TH
+        INNER JOIN Tweets AS T
+            ON TH.TweetID = T.TweetID
+
+    GROUP BY
+        T.TweetTopic, TH.HashtagID
+ON CONFLICT (TweetTopic, HashtagID) DO NOTHING;
+
+-- Dashboard views over the rollups:
+CREATE VIEW IF NOT EXISTS TopicSentimentDaily
+AS
+    SELECT
+        R.TweetTopic,
+        date(R.HourStart) AS [Day],
+        S.SentimentName,
+        SUM(R.TweetCount) AS [TweetCount],
+        SUM(R.PositiveScoreSum) / SUM(R.TweetCount) AS [AvgPositive],
+        SUM(R.NeutralScoreSum) / SUM(R.TweetCount) AS [AvgNeutral],
+        SUM(R.NegativeScoreSum) / SUM(R.TweetCount) AS [AvgNegative]
+
+    FROM
+        TopicSentimentHourly AS R
+        INNER JOIN Sentiments AS S
+            ON R.SentimentID = S.SentimentID
+
+    GROUP BY
+        R.TweetTopic, date(R.HourStart), S.SentimentName;
+
+CREATE VIEW IF NOT EXISTS TopicSentimentSummary
+AS
+    SELECT
+        R.TweetTopic,
+        S.SentimentName,
+        SUM(R.TweetCount) AS [TweetCount],
+        SUM(R.PositiveScoreSum) / SUM(R.TweetCount) AS [AvgPositive],
+        SUM(R.NeutralScoreSum) / SUM(R.TweetCount) AS [AvgNeutral],
+        SUM(R.NegativeScoreSum) / SUM(R.TweetCount) AS [AvgNegative]
+
+    FROM
+        TopicSentimentHourly AS R
+        INNER JOIN Sentiments AS S
+            ON R.SentimentID = S.SentimentID
+
+    GROUP BY
+        R.TweetTopic, S.SentimentName;
+
+CREATE VIEW IF NOT EXISTS TopicTopKeyPhrases
+AS
+    SELECT
+        TweetTopic,
+        [Rank],
+        KeyPhraseText,
+        TweetCount
+
+    FROM
+    (
+        SELECT
+            R.TweetTopic,
+            ROW_NUMBER() OVER (PARTITION BY R.TweetTopic ORDER BY R.TweetCount DESC, KP.KeyPhraseText) AS [Rank],
+            KP.KeyPhraseText,
+            R.TweetCount
+        FROM
+            TopicKeyPhraseCounts AS R
+            INNER JOIN KeyPhrases AS KP
+                ON R.KeyPhraseID = KP.KeyPhraseID
+    )
+
+    WHERE
+        [Rank] <= 25;
+
+CREATE VIEW IF NOT EXISTS TopicTopHashtags
+AS
+    SELECT
+        TweetTopic,
+        [Rank],
+        HashtagText,
+        TweetCount
+
+    FROM
+    (
+        SELECT
+            R.TweetTopic,
+            ROW_NUMBER() OVER (PARTITION BY R.TweetTopic ORDER BY R.TweetCount DESC, H.HashtagText) AS [Rank],
+            H.HashtagText,
+            R.TweetCount
+        FROM
+            TopicHashtagCounts AS R
+            INNER JOIN Hashtags AS H
+                ON R.HashtagID = H.HashtagID
+    )
+
+    WHERE
+        [Rank] <= 25;
@@ -0,0 +1,65 @@
+-- Topics as a dimension: tweets are filtered by an integer TopicID (through an index) instead of by
+-- comparing TweetTopic strings, and any number of topics can be queried without new views.
+CREATE TABLE IF NOT EXISTS Topics
+(
+    TopicID INTEGER PRIMARY KEY NOT NULL,
+    TopicName nvarchar(255) NOT NULL UNIQUE
+);
+
+ALTER TABLE Tweets ADD COLUMN TopicID int DEFAULT NULL REFERENCES Topics(TopicID);
+
+-- Backfill from the topics already stored:
+INSERT INTO Topics (TopicName)
+    SELECT DISTINCT TweetTopic FROM Tweets ORDER BY TweetTopic
+ON CONFLICT (TopicName) DO NOTHING;
+
+UPDATE Tweets
+SET TopicID = (SELECT TP.TopicID FROM Topics AS TP WHERE TP.TopicName = Tweets.TweetTopic);
+
+-- Topic filters (and topic + date ranges) now go through TopicID; TweetTopic stays for the rollups:
+CREATE INDEX IF NOT EXISTS IX_Tweets_TopicIDDate ON Tweets (TopicID, TweetDate);
+DROP INDEX IF EXISTS IX_Tweets_TopicDate;
+
+-- The hard-coded per-topic views are replaced by TopicTweetView (filter it on TopicID or TopicName):
+DROP VIEW IF EXISTS AbortionTweets;
+DROP VIEW IF EXISTS GunControlTweets;
+DROP VIEW IF EXISTS VaccineTweets;
+
+-- Narrow projection of a topic's tweets (the raw TweetJSON stays out of it):
+CREATE VIEW IF NOT EXISTS TopicTweetView
+AS
+    SELECT
+        TP.TopicID,
+        TP.TopicName,
+        T.TweetID,
+        T.TweetDate,
+        U.UserHandle,
+        L.LocationName,
+        T.TweetBody
+
+    FROM
+        Topics AS TP
+        INNER JOIN Tweets AS T
+            ON TP.TopicID = T.TopicID
+        INNER JOIN Users AS U
+            ON T.TweetAuthorID = U.UserID
+        LEFT JOIN Locations AS L
+            ON T.LocationID = L.LocationID;
+
+CREATE VIEW IF NOT EXISTS TopicSentimentView
+AS
+    SELECT
+        TP.TopicID,
+        TP.TopicName,
+        T.TweetID,
+        T.TweetDate,
+        S.SentimentName
+
+    FROM
+        Topics AS TP
+        INNER JOIN Tweets AS T
+            ON TP.TopicID = T.TopicID
+        INNER JOIN TweetSentiment AS TS
+            ON T.TweetID = TS.TweetID
+        INNER JOIN Sentiments AS S
+            ON TS.SentimentID = S.SentimentID;
@@ -0,0 +1,159 @@
+"""
+bench_azure: throughput of the Azure analysis paths against FakeTextAnalyticsClient, a stand-in for
+TextAnalyticsClient that answers with the SDK's own result objects after a fixed latency per request.
+Compares the original two-requests-per-10-tweets path (request_tweet_sentiments + request_tweet_keywords)
+with AnalysisEngine's one multi-action request per 25 tweets, with one and with several batches in flight.
+
+No credentials or network access are needed, so only the request pattern is measured: with a realistic
+--latency, documents per second is set almost entirely by how many round trips each path makes.
+
+Run from tweet-link-app/: python -m benchmarks.bench_azure [--tweets N] [--latency SECONDS] [--workers W]
+
+@author Abigail Goodwin <abby.goodwin@outlook.com>
+Copyright 2024, Abigail Goodwin, All rights reserved.
+"""
+
+import argparse
+import threading
+import time
+import zlib
+
+from azure.ai.textanalytics import (AnalyzeSentimentAction, AnalyzeSentimentResult, DocumentError,
+                                    ExtractKeyPhrasesResult, SentimentConfidenceScores, TextAnalyticsError)
+
+from lib import sentiment_analyzer
+from lib.sentiment_analyzer import MAX_ACTIONS_BATCH_SIZE, MAX_SYNC_BATCH_SIZE, AnalysisEngine
+from benchmarks.bench_entities import make_corpus
+
+SENTIMENTS = ["positive", "neutral", "negative"]
+
+
+class FakePoller:
+    """
+    Stands in for the LROPoller returned by begin_analyze_actions: result() waits out the request's latency.
+    """
+
+    def __init__(self, latency, results):
+        self.latency = latency
+        self.results = results
+
+    def result(self):
+        time.sleep(self.latency)
+        return self.results
+
+
+class FakeTextAnalyticsClient:
+    """
+    Stands in for TextAnalyticsClient. Results are derived from each document's text (so they're stable
+    across runs), documents whose ID is in error_ids come back as DocumentErrors, and every request is
+    recorded in requests as (method name, [document IDs]).
+    """
+
+    def __init__(self, latency=0.0, error_ids=()):
+        """
+        Constructor.
+
+        @param latency: Seconds each request takes, or Callable(documents) -> seconds.
+        @param error_ids: IDs of documents the service should reject.
+        """
+        self.latency = latency
+        self.error_ids = {str(tweet_id) for tweet_id in error_ids}
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def request_latency(self, method_name, documents, max_documents):
+        """
+        Records a request, checks its size against the service's limit, and returns its latency.
+        """
+        if len(documents) > max_documents:
+            raise ValueError(f"{method_name} accepts at most {max_documents} documents, got {len(documents)}.")
+        with self.lock:
+            self.requests.append((method_name, [document['id'] for document in documents]))
+        return self.latency(documents) if callable(self.latency) else self.latency
+
+    def document_error(self, document):
+        return DocumentError(id=document['id'], is_error=True,
+                             error=TextAnalyticsError(code="InvalidDocument", message="Document text is invalid."))
+
+    def sentiment_result(self, document):
+        if document['id'] in self.error_ids:
+            return self.document_error(document)
+        seed = zlib.crc32(document['text'].encode())
+        positive = (seed % 100) / 100
+        negative = round((1 - positive) * (seed % 7) / 7, 2)
+        return AnalyzeSentimentResult(
+            id=document['id'], sentiment=SENTIMENTS[seed % len(SENTIMENTS)], warnings=[], statistics=None,
+            confidence_scores=SentimentConfidenceScores(positive=positive, neutral=round(1 - positive - negative, 2),
+                                                        negative=negative),
+            sentences=[], is_error=False)
+
+    def key_phrases_result(self, document):
+        if document['id'] in self.error_ids:
+            return self.document_error(document)
+        key_phrases = [word for word in document['text'].split() if len(word) > 5 and word.isalpha()][:3]
+        return ExtractKeyPhrasesResult(id=document['id'], key_phrases=key_phrases, warnings=[], statistics=None,
+                                       is_error=False)
+
+    def begin_analyze_actions(self, documents, actions, polling_interval=None, **kwargs):
+        latency = self.request_latency("begin_analyze_actions", documents, MAX_ACTIONS_BATCH_SIZE)
+        # One list per document, holding each action's result in the order the actions were given:
+        results = [[self.sentiment_result(document) if isinstance(action, AnalyzeSentimentAction)
+                    else self.key_phrases_result(document) for action in actions]
+                   for document in documents]
+        return FakePoller(latency, results)
+
+    def analyze_sentiment(self, documents, **kwargs):
+        time.sleep(self.request_latency("analyze_sentiment", documents, MAX_SYNC_BATCH_SIZE))
+        return [self.sentiment_result(document) for document in documents]
+
+    def extract_key_phrases(self, documents, **kwargs):
+        time.sleep(self.request_latency("extract_key_phrases", documents, MAX_SYNC_BATCH_SIZE))
+        return [self.key_phrases_result(document) for document in documents]
+
+
+def legacy_analyze(tweet_list):
+    """
+    The original path: one sentiment request and one key-phrase request per 10 tweets, one at a time.
+
+    @return One result per analyzed tweet.
+    """
+    tweet_sentiments = sentiment_analyzer.request_tweet_sentiments(tweet_list)
+    tweet_keywords = sentiment_analyzer.request_tweet_keywords(tweet_list)
+    return [dict(sentiment_info, key_phrases=keyword_info['key_phrases'])
+            for sentiment_info, keyword_info in zip(tweet_sentiments, tweet_keywords)]
+
+
+def time_path(name, analyze, corpus, client):
+    """
+    Runs one analysis path over the corpus and prints its throughput.
+    """
+    start_time = time.perf_counter()
+    results = analyze(corpus)
+    seconds = time.perf_counter() - start_time
+    print(f"INFO: {name:<36} {seconds:8.2f}s  {len(client.requests):5d} requests  "
+          f"{len(results) / seconds:10,.1f} docs/s")
+    client.requests.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--tweets", type=int, default=500, help="Size of the synthetic corpus.")
+    parser.add_argument("--latency", type=float, default=0.25, help="Seconds per request.")
+    parser.add_argument("--workers", type=int, default=4, help="Batches in flight for the concurrent run.")
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.tweets)
+    client = FakeTextAnalyticsClient(latency=args.latency)
+    sentiment_analyzer.init_cog_services = lambda: client
+
+    print(f"INFO: {args.tweets} tweets, {args.latency:.2f}s per request.")
+    time_path("sentiment + key phrases (10/request)", legacy_analyze, corpus, client)
+    time_path("AnalysisEngine (25/request, 1 worker)",
+              AnalysisEngine(client=client, max_workers=1, polling_interval=0).analyze_uncached, corpus, client)
+    time_path(f"AnalysisEngine (25/request, {args.workers} workers)",
+              AnalysisEngine(client=client, max_workers=args.workers, polling_interval=0).analyze_uncached,
+              corpus, client)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+bench_entities: micro-benchmark of hashtag extraction. Compares the original character-by-character
+collect_hashtags (kept here as legacy_collect_hashtags) with extract_page_entities, for hashtags alone
+(what the exporter asks for) and for every entity type, on a synthetic corpus of tweets.
+
+Run from tweet-link-app/: python -m benchmarks.bench_entities [--tweets N] [--repeat R]
+
+@author Abigail Goodwin <abby.goodwin@outlook.com>
+Copyright 2024, Abigail Goodwin, All rights reserved.
+"""
+
+import argparse
+import random
+import time
+
+from lib.tweet_splitter import extract_page_entities
+
+WORDS = ["vaccine", "policy", "today", "people", "debate", "senate", "rights", "vote", "news", "safety",
+         "community", "health", "law", "support", "against", "think", "should", "every", "state", "why"]
+TAGS = ["#Vaccine", "#vaccine", "#GunControl", "#ProChoice", "#COVID19", "#日本", "#Election2024"]
+EXTRAS = ["@CDCgov", "@someone_else", "$TSLA", "https://t.co/AbC123xyz", "…", "!", ",", "\n"]
+
+
+def legacy_collect_hashtags(tweet):
+    """
+    The original collect_hashtags: walks the tweet character by character.
+
+    @param tweet: The given Tweet.
+    """
+    hashtag_list = []
+    tweet_text = tweet['text']
+
+    tag_start = 0
+    while (tag_start < len(tweet_text) and tag_start >= 0):
+        tag_start = tweet_text.find("#", tag_start)
+
+        if (tag_start >= 0):
+            for char_index in range(tag_start+1, len(tweet_text)):
+                current_char = tweet_text[char_index]
+                if (current_char in [' ', '#', ',', '!', '.', '?', '\n', '\"', ':', ';']):
+                    tag_end = char_index
+                    break
+
+                tag_end = len(tweet_text)
+
+            hashtag = tweet_text[tag_start:tag_end]
+            hashtag_list.append(hashtag)
+
+            tag_start = tag_end
+
+    return hashtag_list
+
+
+def make_corpus(num_tweets, seed=0):
+    """
+    @param num_tweets: How many synthetic tweets to build.
+    @param seed: Random seed (so runs are comparable).
+    @return List of {'id', 'text'} tweets; 20-40 words each, with a few hashtags, mentions, etc.
+    """
+    rng = random.Random(seed)
+    corpus = []
+    for tweet_id in range(num_tweets):
+        tokens = rng.choices(WORDS, k=rng.randint(20, 40))
+        for _ in range(rng.randint(0, 4)):
+            tokens.insert(rng.randrange(len(tokens) + 1), rng.choice(TAGS))
+        for _ in range(rng.randint(0, 3)):
+            tokens.insert(rng.randrange(len(tokens) + 1), rng.choice(EXTRAS))
+        corpus.append({'id': str(tweet_id), 'text': " ".join(tokens)})
+    return corpus
+
+
+def time_best(function, repeat):
+    """
+    @return The fastest of `repeat` runs of function(), in seconds.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start_time)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--tweets", type=int, default=100000, help="Size of the synthetic corpus.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per implementation (best is kept).")
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.tweets)
+    total_chars = sum(len(tweet['text']) for tweet in corpus)
+
+    timings = [
+        ("legacy collect_hashtags",
+         time_best(lambda: [legacy_collect_hashtags(tweet) for tweet in corpus], args.repeat)),
+        ("extract (hashtags only)",
+         time_best(lambda: extract_page_entities(corpus, ("hashtags",)), args.repeat)),
+        ("extract (all entities)",
+         time_best(lambda: extract_page_entities(corpus), args.repeat))
+    ]
+
+    print(f"INFO: {args.tweets} tweets, {total_chars / 1e6:.1f}M characters (best of {args.repeat}).")
+    legacy = timings[0][1]
+    for name, seconds in timings:
+        print(f"INFO: {name:<24} {seconds:8.3f}s  {args.tweets / seconds:12,.0f} tweets/s  "
+              f"{total_chars / seconds / 1e6:8.1f} MB/s  {legacy / seconds:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
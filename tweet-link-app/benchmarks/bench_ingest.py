@@ -0,0 +1,302 @@
+"""
+bench_ingest: end-to-end ingest benchmark. Replays API pages (synthetic, or recorded ones) through the same
+steps as the app's import - decode, split_page, duplicate check, analysis and DataExporter.add_tweet_page -
+into a fresh database, without any network access or credentials. Reports each stage's time, overall
+tweets per second, peak RSS and the SQLite statements executed, and can save the results as JSON and
+compare them with an earlier run's.
+
+Recorded pages can be a folder of search-response .json files, or a database whose RawPages table
+(filled by normal app runs) is replayed. They're replayed as many times as needed to reach --tweets,
+with tweet IDs shifted on each repeat so every tweet is new.
+
+Run from tweet-link-app/:
+    python -m benchmarks.bench_ingest [--tweets N] [--fixtures PATH] [--analyzer stub|local]
+                                      [--output results.json] [--compare baseline.json]
+
+@author Abigail Goodwin <abby.goodwin@outlook.com>
+Copyright 2024, Abigail Goodwin, All rights reserved.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from collections import Counter
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from lib.data_exporter import DataExporter, STORAGE_PROFILES
+from lib.raw_store import RawPayload, decompress
+from lib.sentiment_analyzer import TweetAnalyzer, make_analyzer
+from lib.tweet_splitter import split_page
+from benchmarks.bench_page_memory import make_raw_page
+
+STAGES = ("decode", "split", "dedupe", "analyze", "write")
+TOPICS = ["vaccines", "gun control", "abortion"]
+TAGS = ["#Vaccine", "#GunControl", "#ProChoice", "#COVID19", "#Election2024", "@CDCgov", "$TSLA"]
+SENTIMENTS = ["positive", "neutral", "negative", "mixed"]
+
+
+class StubAnalyzer(TweetAnalyzer):
+    """
+    Stands in for the analysis backends at (almost) no cost: results are derived from each tweet's ID and
+    text, so the benchmark measures the rest of the import.
+    """
+
+    def analyze(self, tweet_list):
+        results = []
+        for tweet in tweet_list:
+            seed = zlib.crc32(tweet['id'].encode())
+            positive = (seed % 100) / 100
+            negative = (1 - positive) * ((seed >> 8) % 100) / 100
+            words = tweet['text'].split()
+            results.append({'id': tweet['id'],
+                            'overall_sentiment': SENTIMENTS[seed % len(SENTIMENTS)],
+                            'confidence_scores': {'positive': positive, 'neutral': 1 - positive - negative,
+                                                  'negative': negative},
+                            'key_phrases': [" ".join(words[index:index + 2]) for index in (0, 3, 6)
+                                            if index < len(words)]})
+        return results
+
+
+############################################################
+#   Page Sources
+############################################################
+
+def synthetic_pages(page_size, seed=0):
+    """
+    @return Endless generator of synthetic search responses (as bytes) with some hashtags, mentions and
+            cashtags mixed into the text.
+    """
+    rng = random.Random(seed)
+    page_number = 0
+    while True:
+        response = json.loads(make_raw_page(page_number, page_size, rng))
+        for tweet in response['data']:
+            words = tweet['text'].split()
+            for _ in range(rng.randint(0, 3)):
+                words.insert(rng.randrange(len(words) + 1), rng.choice(TAGS))
+            tweet['text'] = " ".join(words)
+        yield json.dumps(response).encode()
+        page_number += 1
+
+
+def load_fixtures(path):
+    """
+    @param path: A folder of .json search responses, or a SQLite database with a RawPages table.
+    @return List of decoded responses.
+    """
+    if os.path.isdir(path):
+        responses = []
+        for file_name in sorted(os.listdir(path)):
+            if file_name.endswith(".json"):
+                with open(os.path.join(path, file_name), "rb") as fixture_file:
+                    responses.append(json.loads(fixture_file.read()))
+        return responses
+
+    connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        rows = connection.execute("SELECT Codec, Payload FROM RawPages ORDER BY RawPageID").fetchall()
+    finally:
+        connection.close()
+    return [json.loads(decompress(codec, blob)) for codec, blob in rows]
+
+
+def replayed_pages(responses):
+    """
+    @return Endless generator of the recorded responses (as bytes); tweet IDs are shifted past the
+            recording's own range on every repeat, so replayed tweets are never duplicates.
+    """
+    tweet_ids = [int(tweet['id']) for response in responses for tweet in response.get('data', [])]
+    if not tweet_ids:
+        raise ValueError("The fixtures don't hold any tweets.")
+    id_span = max(tweet_ids) - min(tweet_ids) + 1
+
+    repeat = 0
+    while True:
+        for response in responses:
+            if repeat:
+                response = dict(response, data=[dict(tweet, id=str(int(tweet['id']) + repeat * id_span))
+                                                for tweet in response.get('data', [])])
+            yield json.dumps(response).encode()
+        repeat += 1
+
+
+############################################################
+#   Benchmark
+############################################################
+
+def peak_rss_mb() -> float:
+    """
+    @return This process's peak resident set size in MB (0 where it can't be measured).
+    """
+    if resource is None:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1e6 if sys.platform == "darwin" else peak / 1e3
+
+
+def git_commit():
+    """
+    @return The checked-out commit (short hash), or None outside of a git checkout.
+    """
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.realpath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(pages, num_tweets, analyzer, db_path, profile) -> dict:
+    """
+    Imports pages until num_tweets tweets have been replayed, timing every stage.
+
+    @param pages: Generator of raw search responses (bytes).
+    @param num_tweets: How many tweets to import.
+    @param analyzer: TweetAnalyzer for the analysis stage.
+    @param db_path: Database to import into (created if needed).
+    @param profile: DataExporter storage profile.
+    @return Python dictionary; the run's results.
+    """
+    data_uploader = DataExporter(db_path, profile=profile)
+
+    # Every statement SQLite runs, by kind (each executemany() row counts once):
+    statements = Counter()
+
+    def count_statement(statement):
+        statements[(statement.split(None, 1) or ["?"])[0].upper()] += 1
+
+    data_uploader.connection.set_trace_callback(count_statement)
+
+    stage_seconds = dict.fromkeys(STAGES, 0.0)
+    tweet_count = 0
+    stored_count = 0
+    page_count = 0
+    start_time = time.perf_counter()
+    while tweet_count < num_tweets:
+        raw_bytes = next(pages)
+
+        stage_start = time.perf_counter()
+        response = json.loads(raw_bytes)
+        raw_payload = RawPayload.pack(raw_bytes)
+        split_start = time.perf_counter()
+        page = split_page(response)
+        page.raw_payload = raw_payload
+        dedupe_start = time.perf_counter()
+        page = page.with_tweets(data_uploader.check_existing_tweets(page.tweets))
+        analyze_start = time.perf_counter()
+        tweet_results = analyzer.analyze(page.tweets)
+        write_start = time.perf_counter()
+        data_uploader.add_tweet_page(TOPICS[page_count % len(TOPICS)], page, tweet_results, tweet_results)
+        write_end = time.perf_counter()
+
+        stage_seconds['decode'] += split_start - stage_start
+        stage_seconds['split'] += dedupe_start - split_start
+        stage_seconds['dedupe'] += analyze_start - dedupe_start
+        stage_seconds['analyze'] += write_start - analyze_start
+        stage_seconds['write'] += write_end - write_start
+
+        tweet_count += page.result_count
+        stored_count += len(page)
+        page_count += 1
+
+    elapsed = time.perf_counter() - start_time
+    data_uploader.connection.set_trace_callback(None)
+    del data_uploader
+
+    return {
+        'tweets': tweet_count,
+        'stored': stored_count,
+        'pages': page_count,
+        'seconds': elapsed,
+        'tweets_per_second': tweet_count / elapsed,
+        'stages': {name: {'seconds': seconds, 'share': seconds / elapsed,
+                          'tweets_per_second': tweet_count / seconds if seconds > 0 else None}
+                   for name, seconds in stage_seconds.items()},
+        'sql_statements': dict(statements.most_common()),
+        'peak_rss_mb': peak_rss_mb(),
+        'db_size_mb': os.path.getsize(db_path) / 1e6
+    }
+
+
+def compare(results, baseline) -> None:
+    """
+    Prints how a run's stage times and throughput changed against an earlier run's results.
+    """
+    print(f"INFO: Compared with {baseline.get('git_commit') or 'baseline'} ({baseline['timestamp']}):")
+    for name in STAGES:
+        old = baseline['stages'].get(name, {}).get('seconds')
+        new = results['stages'][name]['seconds']
+        if old:
+            print(f"INFO:   {name:<8} {old:8.3f}s -> {new:8.3f}s  ({new / old - 1:+.0%})")
+    change = results['tweets_per_second'] / baseline['tweets_per_second'] - 1
+    print(f"INFO:   tweets/s {baseline['tweets_per_second']:8.0f} -> {results['tweets_per_second']:8.0f}"
+          f"  ({change:+.0%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--tweets", type=int, default=10000, help="Tweets to import (e.g. 1000 to 1000000).")
+    parser.add_argument("--page-size", type=int, default=100, help="Tweets per synthetic page.")
+    parser.add_argument("--fixtures", help="Folder of recorded .json responses, or a database to replay "
+                                           "RawPages from; synthetic pages otherwise.")
+    parser.add_argument("--analyzer", choices=["stub", "local"], default="stub",
+                        help="stub (near-zero cost, the default) or the offline local analyzer.")
+    parser.add_argument("--profile", choices=list(STORAGE_PROFILES), default="balanced",
+                        help="DataExporter storage profile.")
+    parser.add_argument("--db", help="Database to import into (default: a temporary one).")
+    parser.add_argument("--output", help="Write the results to this JSON file.")
+    parser.add_argument("--compare", help="Earlier --output file to compare against.")
+    args = parser.parse_args()
+
+    if args.fixtures:
+        pages = replayed_pages(load_fixtures(args.fixtures))
+    else:
+        pages = synthetic_pages(args.page_size)
+    analyzer = StubAnalyzer() if args.analyzer == "stub" else make_analyzer("local")
+
+    with tempfile.TemporaryDirectory() as directory:
+        results = run(pages, args.tweets, analyzer, args.db or os.path.join(directory, "bench.db"),
+                      args.profile)
+
+    results = {
+        'benchmark': "ingest",
+        'timestamp': time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime()),
+        'git_commit': git_commit(),
+        'environment': {'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version,
+                        'platform': platform.platform(), 'cpus': os.cpu_count()},
+        'params': {'tweets': args.tweets, 'page_size': args.page_size, 'fixtures': args.fixtures,
+                   'analyzer': args.analyzer, 'profile': args.profile},
+        **results
+    }
+
+    print(f"INFO: {results['tweets']} tweets in {results['pages']} pages ({results['stored']} stored), "
+          f"{results['seconds']:.2f}s, {results['tweets_per_second']:,.0f} tweets/s.")
+    for name, stage in results['stages'].items():
+        print(f"INFO:   {name:<8} {stage['seconds']:8.3f}s  {stage['share']:6.1%}")
+    print(f"INFO: Peak RSS {results['peak_rss_mb']:.1f} MB, database {results['db_size_mb']:.1f} MB.")
+    print("INFO: SQL statements: " + ", ".join(f"{count} {kind}"
+                                               for kind, count in results['sql_statements'].items()))
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+        print(f"INFO: Results written to {args.output}.")
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            compare(results, json.load(baseline_file))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+bench_page_memory: measures how much memory a page of tweets holds once it's been split, comparing the
+original lists of per-tweet dictionaries (split_json/split_authors/split_locations) with the columnar
+TweetPage from split_page. Pages are decoded from JSON inside the measurement and the decoded response
+is dropped afterwards, as it is in the importer, so only what the split page keeps alive is counted.
+
+Run from tweet-link-app/: python -m benchmarks.bench_page_memory [--pages N] [--page-size M]
+
+@author Abigail Goodwin <abby.goodwin@outlook.com>
+Copyright 2024, Abigail Goodwin, All rights reserved.
+"""
+
+import argparse
+import gc
+import json
+import random
+import tracemalloc
+
+from lib.tweet_splitter import split_authors, split_json, split_locations, split_page
+
+WORDS = ["vaccine", "policy", "today", "people", "debate", "senate", "rights", "vote", "news", "safety",
+         "community", "health", "law", "support", "against", "think", "should", "every", "state", "why"]
+
+
+def make_raw_page(page_number, page_size, rng):
+    """
+    @return JSON string shaped like one X recent-search response (tweets, users, places, meta).
+    """
+    data = []
+    for index in range(page_size):
+        tweet = {'id': str(1760000000000000000 + page_number * page_size + index),
+                 'author_id': str(10 ** 9 + rng.randrange(page_size)),
+                 'created_at': f"2024-03-01T12:{rng.randrange(60):02d}:{rng.randrange(60):02d}.000Z",
+                 'text': " ".join(rng.choices(WORDS, k=rng.randint(10, 30)))}
+        if rng.random() < 0.05:
+            tweet['geo'] = {'place_id': f"{rng.randrange(16 ** 16):016x}"}
+        data.append(tweet)
+
+    users = [{'id': author_id, 'name': f"User {author_id}", 'username': f"user{author_id}"}
+             for author_id in {tweet['author_id'] for tweet in data}]
+    places = [{'id': tweet['geo']['place_id'], 'full_name': "Springfield, USA"}
+              for tweet in data if 'geo' in tweet]
+    return json.dumps({'data': data, 'includes': {'users': users, 'places': places},
+                       'meta': {'next_token': f"token{page_number}"}})
+
+
+def split_dicts(raw_json):
+    """
+    The original representation: lists of dictionaries for the tweets, authors and places.
+    """
+    return split_json(raw_json), split_authors(raw_json), split_locations(raw_json)
+
+
+def retained_bytes(raw_pages, split_function):
+    """
+    @return Bytes still allocated after decoding and splitting every page (and dropping the decoded JSON).
+    """
+    gc.collect()
+    tracemalloc.start()
+    start_bytes = tracemalloc.get_traced_memory()[0]
+
+    pages = []
+    for raw_page in raw_pages:
+        raw_json = json.loads(raw_page)
+        pages.append(split_function(raw_json))
+        del raw_json
+
+    gc.collect()
+    used_bytes = tracemalloc.get_traced_memory()[0] - start_bytes
+    tracemalloc.stop()
+    del pages
+    return used_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--pages", type=int, default=200, help="Number of pages held in memory.")
+    parser.add_argument("--page-size", type=int, default=100, help="Tweets per page.")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    raw_pages = [make_raw_page(page_number, args.page_size, rng) for page_number in range(args.pages)]
+    num_tweets = args.pages * args.page_size
+
+    dict_bytes = retained_bytes(raw_pages, split_dicts)
+    page_bytes = retained_bytes(raw_pages, split_page)
+
+    print(f"INFO: {args.pages} pages x {args.page_size} tweets held in memory.")
+    for name, used_bytes in (("dictionary lists", dict_bytes), ("columnar TweetPage", page_bytes)):
+        print(f"INFO: {name:<20} {used_bytes / 1e6:8.2f} MB  {used_bytes / num_tweets:8.0f} bytes/tweet")
+    print(f"INFO: TweetPage uses {page_bytes / dict_bytes:.0%} of the memory.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+bench_storage: compares the SQLite storage profiles (data_exporter.STORAGE_PROFILES). For each profile, a
+fresh database is bulk-loaded page by page through DataExporter.add_tweet_page while another process (like a
+dashboard would be) keeps running reporting queries on a read-only connection, and the insert throughput and
+read latencies are reported.
+
+Run from tweet-link-app/: python -m benchmarks.bench_storage [--pages N] [--page-size M]
+
+@author Abigail Goodwin <abby.goodwin@outlook.com>
+Copyright 2024, Abigail Goodwin, All rights reserved.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from lib.data_exporter import DataExporter, STORAGE_PROFILES, connect_read_only
+from lib.tweet_splitter import split_page
+from benchmarks.bench_page_memory import make_raw_page
+
+TOPICS = ["vaccines", "gun control", "abortion"]
+SENTIMENTS = ["positive", "neutral", "negative", "mixed"]
+
+# What a dashboard asks for while the import runs:
+READ_QUERIES = [
+    "SELECT TopicID, COUNT(*) FROM Tweets GROUP BY TopicID",
+    """SELECT T.TweetTopic, S.SentimentName, COUNT(*)
+       FROM Tweets AS T
+       INNER JOIN TweetSentiment AS TS ON TS.TweetID = T.TweetID
+       INNER JOIN Sentiments AS S ON S.SentimentID = TS.SentimentID
+       GROUP BY T.TweetTopic, S.SentimentName""",
+    "SELECT * FROM Tweets ORDER BY TweetID DESC LIMIT 50"
+]
+
+
+def fake_results(page, rng):
+    """
+    @return Analysis results shaped like analyze_tweets()'s, so no analyzer is needed.
+    """
+    results = []
+    for tweet in page:
+        positive = rng.random()
+        negative = rng.random() * (1 - positive)
+        results.append({'id': tweet['id'],
+                        'overall_sentiment': rng.choice(SENTIMENTS),
+                        'confidence_scores': {'positive': positive, 'neutral': 1 - positive - negative,
+                                              'negative': negative},
+                        'key_phrases': rng.sample(tweet['text'].split(), 2)})
+    return results
+
+
+def read_loop(db_path, profile, stop_event, result_queue):
+    """
+    Runs READ_QUERIES back to back on a read-only connection until stop_event is set, then sends back
+    (latencies, errors).
+    """
+    latencies = []
+    errors = []
+    connection = connect_read_only(db_path, profile)
+    while not stop_event.is_set():
+        for query in READ_QUERIES:
+            start_time = time.perf_counter()
+            try:
+                connection.execute(query).fetchall()
+                latencies.append(time.perf_counter() - start_time)
+            except sqlite3.OperationalError:
+                errors.append(time.perf_counter() - start_time)
+        time.sleep(0.001)
+    connection.close()
+    result_queue.put((latencies, errors))
+
+
+def run_profile(profile, raw_pages, directory):
+    """
+    @return Python dictionary; insert rows/s and tweets/s, plus read latency percentiles and error count.
+    """
+    db_path = os.path.join(directory, f"{profile}.db")
+    exporter = DataExporter(db_path, profile=profile)
+    rng = random.Random(0)
+    pages = [split_page(json.loads(raw_page)) for raw_page in raw_pages]
+
+    stop_event = multiprocessing.Event()
+    result_queue = multiprocessing.Queue()
+    reader = multiprocessing.Process(target=read_loop, args=(db_path, profile, stop_event, result_queue))
+    reader.start()
+
+    total_rows = 0
+    start_time = time.perf_counter()
+    for index, page in enumerate(pages):
+        results = fake_results(page, rng)
+        total_rows += exporter.add_tweet_page(TOPICS[index % len(TOPICS)], page, results, results)['rows']
+    elapsed = time.perf_counter() - start_time
+
+    stop_event.set()
+    latencies, errors = result_queue.get()
+    reader.join()
+    del exporter
+
+    latencies.sort()
+
+    def percentile(fraction):
+        return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))] if latencies else 0.0
+
+    return {
+        'rows_per_second': total_rows / elapsed,
+        'tweets_per_second': sum(len(page) for page in pages) / elapsed,
+        'reads': len(latencies),
+        'read_p50': percentile(0.50),
+        'read_p95': percentile(0.95),
+        'read_max': latencies[-1] if latencies else 0.0,
+        'read_errors': len(errors)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--pages", type=int, default=300, help="Pages written per profile.")
+    parser.add_argument("--page-size", type=int, default=100, help="Tweets per page.")
+    parser.add_argument("--profiles", nargs="*", default=list(STORAGE_PROFILES),
+                        help="Profiles to compare (default: all).")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    raw_pages = [make_raw_page(page_number, args.page_size, rng) for page_number in range(args.pages)]
+
+    print(f"INFO: {args.pages} pages x {args.page_size} tweets per profile, with one concurrent reader process.")
+    print(f"INFO: {'profile':<10} {'rows/s':>10} {'tweets/s':>10} {'reads':>7} {'read p50':>10} "
+          f"{'read p95':>10} {'read max':>10} {'errors':>7}")
+    with tempfile.TemporaryDirectory() as directory:
+        for profile in args.profiles:
+            stats = run_profile(profile, raw_pages, directory)
+            print(f"INFO: {profile:<10} {stats['rows_per_second']:10.0f} {stats['tweets_per_second']:10.0f} "
+                  f"{stats['reads']:7d} {stats['read_p50'] * 1000:8.2f}ms {stats['read_p95'] * 1000:8.2f}ms "
+                  f"{stats['read_max'] * 1000:8.2f}ms {stats['read_errors']:7d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+check_query_plans: regression check for the schema's indexes. Runs EXPLAIN QUERY PLAN for every lookup in
+data_exporter.INDEXED_QUERIES (on a fresh database, or on an existing one with --db) and exits with status 1
+if any of them would scan a whole table.
+
+Run from tweet-link-app/: python -m benchmarks.check_query_plans [--db PATH] [--verbose]
+
+@author Abigail Goodwin <abby.goodwin@outlook.com>
+Copyright 2024, Abigail Goodwin, All rights reserved.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+
+from lib.data_exporter import DataExporter, INDEXED_QUERIES
+
+
+def check(exporter, verbose=False) -> int:
+    """
+    @return The number of queries that would scan a table.
+    """
+    unindexed = exporter.unindexed_queries()
+    for name, sql_query in INDEXED_QUERIES.items():
+        if name in unindexed:
+            print(f"FAIL: {name}: {sql_query}")
+            for step in unindexed[name]:
+                print(f"FAIL:     {step}")
+        elif verbose:
+            print(f"OK:   {name}: {'; '.join(exporter.query_plan(sql_query))}")
+
+    print(f"INFO: {len(INDEXED_QUERIES) - len(unindexed)} of {len(INDEXED_QUERIES)} lookups use an index "
+          f"(schema version {exporter.schema_version()}).")
+    return len(unindexed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--db", help="Existing database to check (migrated first); a fresh one otherwise.")
+    parser.add_argument("--verbose", action="store_true", help="Print every query's plan.")
+    args = parser.parse_args()
+
+    if args.db:
+        return 1 if check(DataExporter(args.db), args.verbose) else 0
+
+    with tempfile.TemporaryDirectory() as directory:
+        exporter = DataExporter(os.path.join(directory, "check.db"))
+        failures = check(exporter, args.verbose)
+        del exporter
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,285 @@
+"""
+analysis_cache: a persistent cache of Azure analysis results, keyed by a hash of the tweet's normalized
+text and the model version, so copy-pasta and bot spam are only ever analyzed once. An index of the
+cached texts' MinHash signatures (see near_duplicates) lets lightly edited copies reuse a result too.
+
+@author Abigail Goodwin <abby.goodwin@outlook.com>
+Copyright 2024, Abigail Goodwin, All rights reserved.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from lib.data_exporter import SQL_PATH
+from lib.near_duplicates import (MIN_SIMILARITY, NearDuplicateIndex, cluster, cluster_id, normalize_text,
+                                 phrases_in_text, signature)
+
+
+def text_key(text, model_version) -> str:
+    """
+    @param text: The tweet's text.
+    @param model_version: The analysis model version the result came from.
+    @return The cache key (a SHA-256 hex digest).
+    """
+    return hashlib.sha256(f"{model_version}\x00{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class AnalysisCache:
+    """
+    SQLite-backed cache of sentiment/key-phrase results. Safe to share between threads.
+    """
+
+    def __init__(self, db_path=None, model_version="latest", max_bytes=64 * 1024 * 1024,
+                 min_similarity=MIN_SIMILARITY):
+        """
+        Constructor.
+
+        @param db_path: (If given) where the cache database lives; sql/analysis_cache.db otherwise.
+        @param model_version: The analysis model version; results from other versions are never returned.
+        @param max_bytes: Roughly how much result data to keep before evicting the least recently used.
+        @param min_similarity: How much a near-duplicate's wording must overlap (see near_duplicates); None to
+                               only share results between identical (normalized) texts.
+        """
+        self.db_path = db_path or os.path.join(SQL_PATH, "analysis_cache.db")
+        self.model_version = model_version
+        self.max_bytes = max_bytes
+
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(
+            self.db_path, check_same_thread=False)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS AnalysisCache
+            (
+                TextHash char(64) PRIMARY KEY NOT NULL,
+                ModelVersion nvarchar(255) NOT NULL,
+                Sentiment nvarchar(255) DEFAULT NULL,
+                ConfidenceScores nvarchar(255) DEFAULT NULL,
+                KeyPhrases text DEFAULT NULL,
+                ByteSize int NOT NULL,
+                LastUsed real NOT NULL
+            )
+        """)
+        self.connection.execute("""
+            CREATE INDEX IF NOT EXISTS IX_AnalysisCache_LastUsed ON AnalysisCache (LastUsed)
+        """)
+        self.near_duplicates = None
+        if min_similarity is not None:
+            self.near_duplicates = NearDuplicateIndex(self.connection, min_similarity)
+        self.connection.commit()
+
+        # Per-run counters:
+        self.hits = 0
+        self.near_duplicate_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def close(self) -> None:
+        """
+        Closes the cache's connection.
+        """
+        with self.lock:
+            self.connection.close()
+
+    def lookup(self, tweet_list, need_sentiment=True, need_key_phrases=True):
+        """
+        Splits tweets into cache hits and misses.
+
+        @param tweet_list: A list of tweets.
+        @param need_sentiment: Whether a hit must include the sentiment and confidence scores.
+        @param need_key_phrases: Whether a hit must include the key phrases.
+        @return (hits, misses); hits is a list of result dictionaries (re-keyed with each tweet's id, and
+                with the 'cluster_id' of the text they came from), misses is the list of tweets that still
+                need to be analyzed.
+        """
+        keys = {str(tweet['id']): text_key(tweet['text'], self.model_version)
+                for tweet in tweet_list}
+
+        def usable(row):
+            return not (row is None or (need_sentiment and row[1] is None)
+                        or (need_key_phrases and row[3] is None))
+
+        with self.lock:
+            rows = self.fetch_rows(set(keys.values()))
+
+            # Tweets with no result for their exact text may have one for a near-duplicate:
+            if self.near_duplicates is not None:
+                near_keys = {}
+                for tweet in tweet_list:
+                    tweet_id = str(tweet['id'])
+                    if not usable(rows.get(keys[tweet_id])):
+                        match_key = self.near_duplicates.find(signature(tweet['text']))
+                        if match_key is not None:
+                            near_keys[tweet_id] = match_key
+                near_rows = self.fetch_rows(set(near_keys.values()))
+                for tweet_id, match_key in near_keys.items():
+                    if usable(near_rows.get(match_key)):
+                        keys[tweet_id] = match_key
+                        rows[match_key] = near_rows[match_key]
+                        self.near_duplicate_hits += 1
+
+            hits = []
+            misses = []
+            used_keys = set()
+            for tweet in tweet_list:
+                row = rows.get(keys[str(tweet['id'])])
+                if not usable(row):
+                    misses.append(tweet)
+                    continue
+
+                tweet_info = {'id': str(tweet['id']), 'cluster_id': cluster_id(row[0])}
+                if row[1] is not None:
+                    tweet_info['overall_sentiment'] = row[1]
+                    tweet_info['confidence_scores'] = json.loads(row[2])
+                if row[3] is not None:
+                    tweet_info['key_phrases'] = json.loads(row[3])
+                    # A near-duplicate's key phrases only carry over where this tweet uses them too:
+                    if row[0] != text_key(tweet['text'], self.model_version):
+                        tweet_info['key_phrases'] = phrases_in_text(tweet_info['key_phrases'], tweet['text'])
+                hits.append(tweet_info)
+                used_keys.add(row[0])
+
+            if used_keys:
+                now = time.time()
+                self.connection.executemany("""
+                    UPDATE AnalysisCache SET LastUsed = ? WHERE TextHash = ?
+                """, [(now, key) for key in used_keys])
+                self.connection.commit()
+
+            self.hits += len(hits)
+            self.misses += len(misses)
+
+        return hits, misses
+
+    def fetch_rows(self, keys) -> dict:
+        """
+        Expects the lock to be held.
+
+        @param keys: Iterable of cache keys.
+        @return Python dictionary; key -> (TextHash, Sentiment, ConfidenceScores, KeyPhrases) for cached keys.
+        """
+        rows = {}
+        keys = list(keys)
+        for index in range(0, len(keys), 500):
+            key_chunk = keys[index:index + 500]
+            placeholders = ", ".join("?" * len(key_chunk))
+            for row in self.connection.execute(f"""
+                SELECT TextHash, Sentiment, ConfidenceScores, KeyPhrases
+                FROM AnalysisCache
+                WHERE TextHash IN ({placeholders})
+            """, key_chunk):
+                rows[row[0]] = row
+        return rows
+
+    def cluster(self, tweet_list) -> dict:
+        """
+        Picks one tweet to analyze per distinct text, or per cluster of near-duplicate texts.
+
+        @param tweet_list: A list of tweets (e.g. lookup()'s misses).
+        @return Python dictionary; tweet id -> the representative tweet whose result it should share.
+        """
+        by_key = {}
+        for tweet in tweet_list:
+            by_key.setdefault(text_key(tweet['text'], self.model_version), tweet)
+        distinct = list(by_key.values())
+
+        if self.near_duplicates is None:
+            representative_of_text = by_key
+        else:
+            representative_indexes = cluster([signature(tweet['text']) for tweet in distinct],
+                                             self.near_duplicates.min_similarity)
+            representative_of_text = {key: distinct[representative_index] for key, representative_index
+                                      in zip(by_key, representative_indexes)}
+
+        return {str(tweet['id']): representative_of_text[text_key(tweet['text'], self.model_version)]
+                for tweet in tweet_list}
+
+    def store(self, tweet_list, tweet_results) -> None:
+        """
+        Caches analysis results (merging with whatever is already cached for the same text).
+
+        @param tweet_list: The tweets that were analyzed.
+        @param tweet_results: The analysis results; matched to tweets by id.
+        """
+        texts = {str(tweet['id']): tweet['text'] for tweet in tweet_list}
+        now = time.time()
+
+        rows = []
+        signatures = []
+        for tweet_info in tweet_results:
+            text = texts.get(str(tweet_info['id']))
+            if text is None:
+                continue
+
+            sentiment = tweet_info.get('overall_sentiment')
+            confidence_scores = None
+            if 'confidence_scores' in tweet_info:
+                scores = tweet_info['confidence_scores']
+                confidence_scores = json.dumps(
+                    {label: scores[label] for label in ('positive', 'neutral', 'negative')})
+            key_phrases = json.dumps(
+                list(tweet_info['key_phrases'])) if 'key_phrases' in tweet_info else None
+
+            byte_size = len(text) + len(confidence_scores or "") + len(key_phrases or "")
+            rows.append((text_key(text, self.model_version), self.model_version, sentiment,
+                         confidence_scores, key_phrases, byte_size, now))
+            signatures.append((rows[-1][0], signature(text)))
+
+        with self.lock:
+            self.connection.executemany("""
+                INSERT INTO AnalysisCache (TextHash, ModelVersion, Sentiment, ConfidenceScores, KeyPhrases, ByteSize, LastUsed)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (TextHash) DO UPDATE SET
+                    Sentiment = COALESCE(excluded.Sentiment, Sentiment),
+                    ConfidenceScores = COALESCE(excluded.ConfidenceScores, ConfidenceScores),
+                    KeyPhrases = COALESCE(excluded.KeyPhrases, KeyPhrases),
+                    ByteSize = MAX(excluded.ByteSize, ByteSize),
+                    LastUsed = excluded.LastUsed
+            """, rows)
+            if self.near_duplicates is not None:
+                self.near_duplicates.add(signatures)
+            self.evict()
+            self.connection.commit()
+
+    def evict(self) -> None:
+        """
+        Drops the least recently used results once the cache is over max_bytes (down to 90% of it).
+        Expects the lock to be held.
+        """
+        total_bytes = self.connection.execute(
+            "SELECT COALESCE(SUM(ByteSize), 0) FROM AnalysisCache").fetchone()[0]
+        if total_bytes <= self.max_bytes:
+            return
+
+        to_free = total_bytes - int(self.max_bytes * 0.9)
+        freed = 0
+        doomed = []
+        for text_hash, byte_size in self.connection.execute(
+                "SELECT TextHash, ByteSize FROM AnalysisCache ORDER BY LastUsed"):
+            if freed >= to_free:
+                break
+            doomed.append((text_hash,))
+            freed += byte_size
+
+        self.connection.executemany(
+            "DELETE FROM AnalysisCache WHERE TextHash = ?", doomed)
+        if self.near_duplicates is not None:
+            self.near_duplicates.remove(text_hash for (text_hash,) in doomed)
+        self.evictions += len(doomed)
+
+    def stats(self) -> dict:
+        """
+        @return Python dictionary; this run's hits (and how many of them were near-duplicates), misses,
+                hit rate, and evictions.
+        """
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'near_duplicate_hits': self.near_duplicate_hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits / lookups) if lookups > 0 else 0.0,
+            'evictions': self.evictions
+        }
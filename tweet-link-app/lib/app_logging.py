@@ -0,0 +1,61 @@
+"""
+app_logging: sets up the app's log output, either as the usual "INFO: ..." lines or as one JSON object
+per line (for log shippers). Fields passed with extra={...} (topic, tweets, etc.) are kept as JSON keys.
+
+@author Abigail Goodwin <abby.goodwin@outlook.com>
+Copyright 2024, Abigail Goodwin, All rights reserved.
+"""
+
+import json
+import logging
+import sys
+
+LOG_FORMATS = ("text", "json")
+
+# Attributes every LogRecord has; anything else on a record came from extra={...}:
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats each record as a single-line JSON object: time, level, logger, message, plus any extra fields.
+    """
+
+    def format(self, record) -> str:
+        entry = {
+            'time': self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level="INFO", log_format="text", stream=None) -> None:
+    """
+    Sends the app's logs to stderr (or the given stream).
+
+    @param level: The lowest level to show ("DEBUG" adds per-page timings).
+    @param log_format: "text" for "LEVEL: message" lines, or "json" for one JSON object per line.
+    @param stream: (If given) where to write; sys.stderr otherwise.
+    """
+    if log_format not in LOG_FORMATS:
+        raise ValueError(f"Unknown log format {log_format!r}; expected one of {LOG_FORMATS}.")
+
+    handler = logging.StreamHandler(stream or sys.stderr)
+    if log_format == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(levelname)s: %(message)s"))
+
+    root = logging.getLogger()
+    for old_handler in list(root.handlers):
+        root.removeHandler(old_handler)
+    root.addHandler(handler)
+    root.setLevel(level)
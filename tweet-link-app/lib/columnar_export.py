@@ -0,0 +1,309 @@
+"""
+columnar_export: the file in charge of exporting the database's tweets as compressed, columnar Parquet files
+for analytics tools, partitioned by topic and date (e.g. tweets/topic=vaccines/date=2024-03-01/part-*.parquet).
+
+Exports are incremental: each run only writes tweets stored since the last one (tracked by the Tweets
+table's rowid in the export folder's _export_state.json). Rows are streamed in chunks over a read-only
+connection, so memory use doesn't grow with the database and the writer is never blocked.
+
+Each tweet is exported once, as a snapshot with its sentiment, hashtags and key phrases. DataExporter only
+writes those rows in the same transaction as a new tweet (results for tweets already stored are dropped),
+so the Tweets rowid watermark covers them too. Rows changed any other way after a tweet was exported (e.g.
+by hand) are not exported again; delete the export folder to re-export everything.
+
+@author Abigail Goodwin <abby.goodwin@outlook.com>
+Copyright 2024, Abigail Goodwin, All rights reserved.
+"""
+
+# Python libs:
+import json
+import logging
+import os
+import time
+from urllib.parse import quote
+
+# Arrow libs (optional; only needed to export):
+try:
+    import pyarrow
+    import pyarrow.compute
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Project libs:
+from lib.data_exporter import connect_read_only
+
+logger = logging.getLogger(__name__)
+
+# Name of the file (in the export folder) that records how far exports have got:
+STATE_FILE_NAME = "_export_state.json"
+
+# Exported datasets: name -> (query, Parquet columns). Each query selects the partition keys (topic and
+# date) first, then one value per column, for the tweets whose rowid falls in (?, ?]. Tweets carry their
+# sentiment and confidence scores; hashtags and key phrases get one row per (tweet, hashtag/phrase).
+EXPORT_DATASETS = {
+    "tweets": ("""
+        SELECT
+            COALESCE(TP.TopicName, T.TweetTopic), substr(T.TweetDate, 1, 10),
+            T.TweetID, T.TopicID, T.TweetDate, U.AuthorID, U.UserHandle, L.LocationName, T.TweetBody,
+            S.SentimentName, TCP.ConfidenceScore, TCU.ConfidenceScore, TCN.ConfidenceScore
+        FROM
+            Tweets AS T
+            LEFT JOIN Topics AS TP ON T.TopicID = TP.TopicID
+            LEFT JOIN Users AS U ON T.TweetAuthorID = U.UserID
+            LEFT JOIN Locations AS L ON T.LocationID = L.LocationID
+            LEFT JOIN TweetSentiment AS TS ON T.TweetID = TS.TweetID
+            LEFT JOIN Sentiments AS S ON TS.SentimentID = S.SentimentID
+            LEFT JOIN TweetConfidence AS TCP ON T.TweetID = TCP.TweetID AND TCP.ConfidenceTypeID = 1
+            LEFT JOIN TweetConfidence AS TCU ON T.TweetID = TCU.TweetID AND TCU.ConfidenceTypeID = 2
+            LEFT JOIN TweetConfidence AS TCN ON T.TweetID = TCN.TweetID AND TCN.ConfidenceTypeID = 3
+        WHERE
+            T.rowid > ? AND T.rowid <= ?
+    """, ("tweet_id", "topic_id", "created_at", "author_id", "username", "location", "text",
+          "sentiment", "positive", "neutral", "negative")),
+
+    "hashtags": ("""
+        SELECT
+            COALESCE(TP.TopicName, T.TweetTopic), substr(T.TweetDate, 1, 10), T.TweetID, H.HashtagText
+        FROM
+            Tweets AS T
+            LEFT JOIN Topics AS TP ON T.TopicID = TP.TopicID
+            INNER JOIN TweetHashtags AS TH ON T.TweetID = TH.TweetID
+            INNER JOIN Hashtags AS H ON TH.HashtagID = H.HashtagID
+        WHERE
+            T.rowid > ? AND T.rowid <= ?
+    """, ("tweet_id", "hashtag")),
+
+    "key_phrases": ("""
+        SELECT
+            COALESCE(TP.TopicName, T.TweetTopic), substr(T.TweetDate, 1, 10), T.TweetID, KP.KeyPhraseText
+        FROM
+            Tweets AS T
+            LEFT JOIN Topics AS TP ON T.TopicID = TP.TopicID
+            INNER JOIN TweetKeyPhrases AS TKP ON T.TweetID = TKP.TweetID
+            INNER JOIN KeyPhrases AS KP ON TKP.KeyPhraseID = KP.KeyPhraseID
+        WHERE
+            T.rowid > ? AND T.rowid <= ?
+    """, ("tweet_id", "key_phrase"))
+}
+
+
+def column_types() -> dict:
+    """
+    @return Python dictionary; exported column name -> its Arrow type.
+    """
+    return {
+        'tweet_id': pyarrow.int64(),
+        'topic_id': pyarrow.int64(),
+        'created_at': pyarrow.timestamp("ms", tz="UTC"),
+        'author_id': pyarrow.int64(),
+        'username': pyarrow.string(),
+        'location': pyarrow.string(),
+        'text': pyarrow.string(),
+        'sentiment': pyarrow.string(),
+        'positive': pyarrow.float64(),
+        'neutral': pyarrow.float64(),
+        'negative': pyarrow.float64(),
+        'hashtag': pyarrow.string(),
+        'key_phrase': pyarrow.string()
+    }
+
+
+class ColumnarExporter:
+    """
+    Class responsible for (incrementally) exporting the SQLite Database to partitioned Parquet files.
+    """
+
+    ############################################################
+    #   Constructor
+    ############################################################
+
+    def __init__(self, out_dir, db_path=None, profile="balanced", chunk_size=50000, compression="zstd"):
+        """
+        Constructor.
+
+        @param out_dir: The export folder; one sub-folder is written per dataset in EXPORT_DATASETS.
+        @param db_path: (If given) the SQLite database to export; sql/twitter_base.db otherwise.
+        @param profile: The read-only connection's storage profile (see data_exporter.STORAGE_PROFILES).
+        @param chunk_size: How many tweets are read (and written as one Parquet row group) at a time.
+        @param compression: Parquet compression codec (zstd, snappy, gzip, ... or none).
+        """
+        if pyarrow is None:
+            raise ImportError("pyarrow is not installed; install it to export Parquet files.")
+
+        self.out_dir = str(out_dir)
+        self.db_path = db_path
+        self.profile = profile
+        self.chunk_size = chunk_size
+        self.compression = compression
+        self.state_path = os.path.join(self.out_dir, STATE_FILE_NAME)
+
+        types = column_types()
+        self.schemas = {name: pyarrow.schema([(column, types[column]) for column in columns])
+                        for name, (_, columns) in EXPORT_DATASETS.items()}
+
+    ############################################################
+    #   Export State
+    ############################################################
+
+    def load_state(self) -> dict:
+        """
+        Reads the export state, first finishing any export that was interrupted while publishing its files.
+
+        @return Python dictionary; 'watermark' is the last Tweets rowid exported (0 before the first export).
+        """
+        if not os.path.exists(self.state_path):
+            return {'watermark': 0}
+
+        with open(self.state_path) as state_file:
+            state = json.load(state_file)
+
+        pending = state.pop('pending', None)
+        if pending is not None:
+            for temp_path, final_path in pending['files']:
+                if os.path.exists(temp_path):
+                    os.replace(temp_path, final_path)
+            state['watermark'] = pending['watermark']
+            self.save_state(state)
+            logger.info("Finished publishing an interrupted export (up to rowid %d).", state['watermark'])
+
+        return state
+
+    def save_state(self, state) -> None:
+        """
+        Atomically replaces the export state file.
+        """
+        temp_path = self.state_path + ".tmp"
+        with open(temp_path, "w") as state_file:
+            json.dump(state, state_file)
+        os.replace(temp_path, self.state_path)
+
+    def remove_temp_files(self) -> None:
+        """
+        Deletes files left behind by an export that failed before publishing anything.
+        """
+        for dataset_name in EXPORT_DATASETS:
+            for folder, _, file_names in os.walk(os.path.join(self.out_dir, dataset_name)):
+                for file_name in file_names:
+                    if file_name.startswith(".") and file_name.endswith(".tmp"):
+                        os.remove(os.path.join(folder, file_name))
+
+    ############################################################
+    #   Exporting
+    ############################################################
+
+    def partition_path(self, dataset_name, topic, date) -> str:
+        """
+        @return The Hive-style folder for a dataset's (topic, date) partition; the topic is URL-encoded.
+        """
+        return os.path.join(self.out_dir, dataset_name, f"topic={quote(str(topic), safe='')}", f"date={date}")
+
+    def write_chunk(self, connection, dataset_name, low_rowid, high_rowid, writers, file_name) -> int:
+        """
+        Writes one chunk of a dataset, one row group per (topic, date) partition it touches.
+
+        @param connection: The read-only SQLite connection.
+        @param dataset_name: One of EXPORT_DATASETS.
+        @param low_rowid: Tweets with a rowid above this...
+        @param high_rowid: ...and up to this one are written.
+        @param writers: Python dictionary; (dataset, topic, date) -> (ParquetWriter, temp path, final path).
+                        New partitions' writers are added to it.
+        @param file_name: Name of the file each partition gets for this export.
+        @return The number of rows written.
+        """
+        sql_query, columns = EXPORT_DATASETS[dataset_name]
+        schema = self.schemas[dataset_name]
+
+        # Step 1: Split the chunk's rows up by partition, column by column:
+        partitions = {}
+        num_rows = 0
+        for row in connection.execute(sql_query, (low_rowid, high_rowid)):
+            partition_columns = partitions.get(row[:2])
+            if partition_columns is None:
+                partition_columns = partitions[row[:2]] = [[] for _ in columns]
+            for values, value in zip(partition_columns, row[2:]):
+                values.append(value)
+            num_rows += 1
+
+        # Step 2: Append them to each partition's file:
+        for (topic, date), partition_columns in partitions.items():
+            arrays = []
+            for column, values in zip(columns, partition_columns):
+                if column == "created_at":
+                    arrays.append(pyarrow.compute.strptime(
+                        pyarrow.array(values, pyarrow.string()), format="%Y-%m-%d %H:%M:%S", unit="s")
+                        .cast(schema.field(column).type))
+                else:
+                    arrays.append(pyarrow.array(values, schema.field(column).type))
+
+            key = (dataset_name, topic, date)
+            if key not in writers:
+                folder = self.partition_path(dataset_name, topic, date)
+                os.makedirs(folder, exist_ok=True)
+                temp_path = os.path.join(folder, f".{file_name}.tmp")
+                writer = pyarrow.parquet.ParquetWriter(temp_path, schema, compression=self.compression)
+                writers[key] = (writer, temp_path, os.path.join(folder, file_name))
+
+            writers[key][0].write_table(pyarrow.Table.from_arrays(arrays, schema=schema))
+
+        return num_rows
+
+    def export(self) -> dict:
+        """
+        Exports every tweet stored since the last export (and its hashtags and key phrases, as they were
+        stored with it).
+
+        New files are written under temporary names, then published (renamed) together, so readers never
+        see a partial export and a failed export can simply be re-run.
+
+        @return stats: Python dictionary; rows written per dataset, files published, the new watermark
+                       and seconds taken.
+        """
+        start_time = time.perf_counter()
+        os.makedirs(self.out_dir, exist_ok=True)
+        state = self.load_state()
+        self.remove_temp_files()
+
+        connection = connect_read_only(self.db_path, self.profile)
+        try:
+            # Everything up to this rowid is committed (with its analysis rows, which share the transaction):
+            high_watermark = connection.execute("SELECT MAX(rowid) FROM Tweets").fetchone()[0] or 0
+            low_watermark = state['watermark']
+            rows = {dataset_name: 0 for dataset_name in EXPORT_DATASETS}
+            if high_watermark <= low_watermark:
+                return {'rows': rows, 'files': 0, 'watermark': low_watermark,
+                        'seconds': time.perf_counter() - start_time}
+
+            # Step 1: Stream the new tweets out, chunk by chunk:
+            file_name = f"part-{low_watermark + 1:012d}-{high_watermark:012d}.parquet"
+            writers = {}
+            try:
+                for low_rowid in range(low_watermark, high_watermark, self.chunk_size):
+                    high_rowid = min(low_rowid + self.chunk_size, high_watermark)
+                    for dataset_name in EXPORT_DATASETS:
+                        rows[dataset_name] += self.write_chunk(
+                            connection, dataset_name, low_rowid, high_rowid, writers, file_name)
+            finally:
+                for writer, _, _ in writers.values():
+                    writer.close()
+        finally:
+            connection.close()
+
+        # Step 2: Publish the files, recording them first so an interrupted publish is finished next time:
+        files = [[temp_path, final_path] for _, temp_path, final_path in writers.values()]
+        state['pending'] = {'watermark': high_watermark, 'files': files}
+        self.save_state(state)
+        for temp_path, final_path in files:
+            os.replace(temp_path, final_path)
+
+        del state['pending']
+        state['watermark'] = high_watermark
+        state['exported_at'] = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
+        self.save_state(state)
+
+        stats = {'rows': rows, 'files': len(files), 'watermark': high_watermark,
+                 'seconds': time.perf_counter() - start_time}
+        logger.info("Exported %s rows to %d Parquet files in %.2fs.",
+                    ", ".join(f"{count} {name}" for name, count in rows.items()), len(files),
+                    stats['seconds'], extra={'export': stats})
+        return stats
@@ -7,7 +7,210 @@ Copyright 2024, Abigail Goodwin, All rights reserved.
 
 import sqlite3
 import os
-from lib.tweet_splitter import collect_hashtags
+import json
+import logging
+import time
+from collections import Counter
+from pathlib import Path
+from lib.tweet_splitter import extract_page_entities
+from lib.key_cache import KeyCache, RecentIds
+from lib.raw_store import RawPayload
+from lib.keyword_engine import KeywordEngine
+from lib import metrics
+
+logger = logging.getLogger(__name__)
+
+# Maps Cognitive Services' overall sentiment labels to their Sentiments.SentimentID:
+SENTIMENT_IDS = {
+    "positive": 1,
+    "neutral": 2,
+    "mixed": 3,
+    "negative": 4
+}
+
+# Maps confidence score labels to their ConfidenceTypes.ConfidenceTypeID:
+CONFIDENCE_TYPE_IDS = {
+    "positive": 1,
+    "neutral": 2,
+    "negative": 3
+}
+
+# Dimension tables that get a natural key -> surrogate key cache:
+# Table name -> (natural key column, surrogate key column, columns written on insert)
+DIMENSION_TABLES = {
+    "Users": ("AuthorID", "UserID", ("AuthorID", "UserHandle", "UserName")),
+    "Locations": ("LocationCode", "LocationID", ("LocationCode", "LocationName")),
+    "Hashtags": ("HashtagText", "HashtagID", ("HashtagText",)),
+    "KeyPhrases": ("KeyPhraseText", "KeyPhraseID", ("KeyPhraseText",)),
+    "Topics": ("TopicName", "TopicID", ("TopicName",))
+}
+
+# Path to the project's sql folder (holds the schema scripts and the database itself):
+SQL_PATH = Path(os.path.dirname(os.path.realpath(__file__))).parent.parent.absolute() / "sql"
+
+# Schema migrations, applied in order and recorded in the SchemaVersion table: (version, script in SQL_PATH)
+SCHEMA_MIGRATIONS = [
+    (1, "TwitterBase.sql"),
+    (2, "TwitterBaseViews.sql"),
+    (3, "TwitterCheckpoints.sql"),
+    (4, "TwitterIndexes.sql"),
+    (5, "TwitterRollups.sql"),
+    (6, "TwitterTopics.sql"),
+    (7, "TwitterRawPages.sql"),
+    (8, "TwitterNearDuplicates.sql"),
+    (9, "TwitterNaturalKeys.sql")
+]
+
+# Topic queries (see the Topic Queries methods). Dates are compared as "YYYY-MM-DD HH:MM:SS" strings,
+# so these bounds stand in for "no limit":
+EARLIEST_DATE = "0000-00-00 00:00:00"
+LATEST_DATE = "9999-12-31 23:59:59"
+
+TOPIC_TWEETS_QUERY = """
+    SELECT TweetID, TweetDate, UserHandle, LocationName, TweetBody
+    FROM TopicTweetView
+    WHERE TopicID = ? AND TweetDate BETWEEN ? AND ?
+    ORDER BY TweetDate DESC
+    LIMIT ?
+"""
+
+TOPIC_SENTIMENT_QUERY = """
+    SELECT S.SentimentName, SUM(R.TweetCount), SUM(R.PositiveScoreSum), SUM(R.NeutralScoreSum),
+           SUM(R.NegativeScoreSum)
+    FROM TopicSentimentHourly AS R
+    INNER JOIN Sentiments AS S ON R.SentimentID = S.SentimentID
+    WHERE R.TweetTopic = ? AND R.HourStart BETWEEN ? AND ?
+    GROUP BY S.SentimentName
+"""
+
+TOP_KEY_PHRASES_QUERY = """
+    SELECT KP.KeyPhraseText, R.TweetCount
+    FROM TopicKeyPhraseCounts AS R
+    INNER JOIN KeyPhrases AS KP ON R.KeyPhraseID = KP.KeyPhraseID
+    WHERE R.TweetTopic = ?
+    ORDER BY R.TweetCount DESC
+    LIMIT ?
+"""
+
+TOP_HASHTAGS_QUERY = """
+    SELECT H.HashtagText, R.TweetCount
+    FROM TopicHashtagCounts AS R
+    INNER JOIN Hashtags AS H ON R.HashtagID = H.HashtagID
+    WHERE R.TweetTopic = ?
+    ORDER BY R.TweetCount DESC
+    LIMIT ?
+"""
+
+# Lookups that must be answered through an index rather than a full table scan, as the database grows
+# (see TwitterIndexes.sql). Checked by DataExporter.unindexed_queries(); name -> query:
+INDEXED_QUERIES = {
+    "user by AuthorID": "SELECT UserID FROM Users WHERE AuthorID = ?",
+    "location by LocationCode": "SELECT LocationID FROM Locations WHERE LocationCode = ?",
+    "hashtag by HashtagText": "SELECT HashtagID FROM Hashtags WHERE HashtagText = ?",
+    "key phrase by KeyPhraseText": "SELECT KeyPhraseID FROM KeyPhrases WHERE KeyPhraseText = ?",
+    "topic by TopicName": "SELECT TopicID FROM Topics WHERE TopicName = ?",
+    "tweets by TweetID": "SELECT TweetID FROM Tweets WHERE TweetID IN (?, ?, ?)",
+    "tweets by topic": TOPIC_TWEETS_QUERY,
+    "tweets by topic name": "SELECT TweetID, TweetBody FROM TopicTweetView WHERE TopicName = ?",
+    "tweets by date": "SELECT TweetID FROM Tweets WHERE TweetDate BETWEEN ? AND ?",
+    "tweets by author": "SELECT TweetID FROM Tweets WHERE TweetAuthorID = ?",
+    "tweets by hashtag": "SELECT TweetID FROM TweetHashtags WHERE HashtagID = ?",
+    "tweets by key phrase": "SELECT TweetID FROM TweetKeyPhrases WHERE KeyPhraseID = ?",
+    "tweets by sentiment": "SELECT * FROM NegativeTweets",
+    "topic sentiment": TOPIC_SENTIMENT_QUERY,
+    "topic key phrases": TOP_KEY_PHRASES_QUERY,
+    "topic hashtags": TOP_HASHTAGS_QUERY,
+    "checkpoint by topic": "SELECT Status FROM IngestCheckpoints WHERE TopicName = ?",
+    "raw pages by topic": "SELECT RawPageID FROM RawPages WHERE TopicID = ? ORDER BY RawPageID",
+    "topic clusters": "SELECT COUNT(DISTINCT ClusterID) FROM Tweets WHERE TopicID = ?"
+}
+
+# Keeps "IN (?, ?, ...)" lookups safely under SQLite's bound-parameter limit:
+MAX_SQL_VARIABLES = 500
+
+# Connection settings (PRAGMAs) per storage profile. WAL lets reporting connections read while the
+# single writer commits; synchronous=NORMAL in WAL mode only risks the last commits on power loss
+# (never corruption), while "bulk" (synchronous=OFF) can corrupt the file if the machine crashes.
+STORAGE_PROFILES = {
+    "compat": {             # SQLite's own defaults (rollback journal), plus a busy timeout
+        'journal_mode': "DELETE",
+        'synchronous': "FULL",
+        'busy_timeout': 5000
+    },
+    "balanced": {
+        'journal_mode': "WAL",
+        'synchronous': "NORMAL",
+        'cache_size': -64 * 1024,           # KiB (64 MiB)
+        'mmap_size': 256 * 1024 * 1024,
+        'temp_store': "MEMORY",
+        'busy_timeout': 5000
+    },
+    "bulk": {
+        'journal_mode': "WAL",
+        'synchronous': "OFF",
+        'cache_size': -256 * 1024,          # KiB (256 MiB)
+        'mmap_size': 1024 * 1024 * 1024,
+        'temp_store': "MEMORY",
+        'busy_timeout': 10000,
+        'wal_autocheckpoint': 10000         # pages
+    }
+}
+
+# PRAGMAs that only a writer may (or needs to) change:
+WRITER_ONLY_PRAGMAS = ("journal_mode", "synchronous", "wal_autocheckpoint")
+
+
+def connect(db_path, profile="balanced", read_only=False) -> sqlite3.Connection:
+    """
+    Opens a connection to the database with a storage profile's settings.
+
+    @param db_path: Where the SQLite database lives.
+    @param profile: One of STORAGE_PROFILES.
+    @param read_only: Opens the database read-only (for reporting); it must already exist.
+    @return sqlite3.Connection
+    """
+    if profile not in STORAGE_PROFILES:
+        raise ValueError(f"Unknown storage profile {profile!r}; expected one of {tuple(STORAGE_PROFILES)}.")
+    pragmas = STORAGE_PROFILES[profile]
+
+    timeout = pragmas.get('busy_timeout', 5000) / 1000
+    if read_only:
+        connection = sqlite3.connect(f"{Path(db_path).absolute().as_uri()}?mode=ro", uri=True,
+                                     timeout=timeout)
+    else:
+        connection = sqlite3.connect(db_path, timeout=timeout)
+
+    for name, value in pragmas.items():
+        if read_only and name in WRITER_ONLY_PRAGMAS:
+            continue
+        connection.execute(f"PRAGMA {name} = {value}").fetchall()
+    if read_only:
+        connection.execute("PRAGMA query_only = ON")
+
+    return connection
+
+
+def connect_read_only(db_path=None, profile="balanced") -> sqlite3.Connection:
+    """
+    Opens a read-only connection for reporting, separate from the exporter's (single) writer connection.
+    Under a WAL profile it never blocks, or is blocked by, the writer.
+
+    @param db_path: (If given) where the SQLite database lives; sql/twitter_base.db otherwise.
+    @param profile: One of STORAGE_PROFILES.
+    """
+    return connect(db_path or os.path.join(SQL_PATH, "twitter_base.db"), profile, read_only=True)
+
+
+def chunk(sequence, n):
+    """
+    Splits a sequence into lists of (at most) n items.
+
+    @param sequence: Any iterable.
+    @param n: The size of each chunk.
+    """
+    items = list(sequence)
+    for index in range(0, len(items), n):
+        yield items[index:index + n]
 
 
 class DataExporter:
@@ -19,16 +222,26 @@ class DataExporter:
     #   Constructor/Destructor
     ############################################################
 
-    def __init__(self):
+    def __init__(self, db_path=None, key_cache_size=10000, seen_tweet_ids=None, profile="balanced"):
         """
         Constructor. Opens up a connection to the database when the object is called (and used).
+
+        One exporter is meant to live for a whole run; opening it on an up-to-date database is just a
+        version check, so no schema work is repeated per page.
+
+        @param db_path: (If given) where the SQLite database lives; sql/twitter_base.db otherwise.
+        @param key_cache_size: The most natural keys to cache per dimension table (Users, Locations, etc.).
+        @param seen_tweet_ids: (If given) a RecentIds set of stored TweetIDs to share with other stages
+                               (e.g. to skip analysis of known tweets); a private one is made otherwise.
+        @param profile: The connection's storage profile (see STORAGE_PROFILES).
         """
         # Path to the project's sql folder:
-        self.sql_path = os.path.realpath("sql/")
+        self.sql_path = str(SQL_PATH)
+        self.db_path = db_path or os.path.join(self.sql_path, "twitter_base.db")
 
         # Create the TwitterBase SQLite DB in the SQL folder:
-        self.connection = sqlite3.connect(
-            os.path.join(self.sql_path, "twitter_base.db"))
+        self.profile = profile
+        self.connection = connect(self.db_path, profile)
 
         # Store the cursor as a class member:
         self.cursor = self.connection.cursor()
@@ -36,37 +249,110 @@ class DataExporter:
         # Lastly, create the database's tables, views, and stored procedures:
         self.create_tables()
 
-        print(
-            f"INFO: Connection opened to SQLite Database at {self.sql_path}/db.")
+        # Natural key -> surrogate key caches, warmed from whatever is already in the DB:
+        self.key_caches = {table_name: KeyCache(key_cache_size)
+                           for table_name in DIMENSION_TABLES}
+        self.warm_key_caches()
+
+        # TweetIDs recently found in (or written to) the DB, so overlapping pages skip the lookup:
+        self.seen_tweet_ids = seen_tweet_ids if seen_tweet_ids is not None else RecentIds()
+
+        # Key-phrase filtering, and per-topic phrase counts waiting to be upserted with the next commit:
+        self.keywords = KeywordEngine()
+
+        logger.info("Connection opened to SQLite Database at %s (%s profile).", self.db_path, profile)
 
     def __del__(self):
         """
         Destructor. Closes the connection to the database when the object goes out of scope.
         """
-        self.connection.close()
-        print("INFO: Connection to SQLite Database closed.")
+        if getattr(self, 'connection', None) is not None:
+            try:
+                self.connection.close()
+            except sqlite3.ProgrammingError:
+                # Collected on a different thread than the one that opened it (e.g. a writer thread's exporter
+                # kept alive by the traceback of its failed write); the connection closes itself once freed.
+                return
+            logger.debug("Connection to SQLite Database closed.")
 
     ############################################################
     #   Class Methods
     ############################################################
 
+    def schema_version(self) -> int:
+        """
+        @return The newest schema migration applied to the database (0 for a brand new database).
+        """
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS SchemaVersion
+            (
+                Version INTEGER PRIMARY KEY NOT NULL,
+                ScriptName nvarchar(255) NOT NULL,
+                AppliedAt datetime NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        rows = self.cursor.execute("SELECT MAX(Version) FROM SchemaVersion")
+        return rows.fetchone()[0] or 0
+
     def create_tables(self) -> None:
         """
-        Creates the database's schema, tables, views, and stored procedures.
+        Creates the database's schema, tables, and views by applying any schema migrations the database
+        hasn't seen yet. Each migration runs (and is recorded) in its own transaction. A database made before
+        versioning gets every migration: the early scripts use IF NOT EXISTS, so they leave its existing
+        tables alone, and TwitterNaturalKeys.sql then rebuilds the original schema's dimension tables with the
+        UNIQUE natural keys the exporter's upserts rely on.
         """
-        # List of SQL files to execute:
-        sql_files = ["TwitterBase.sql",
-                     "TwitterBaseViews.sql"]
+        current_version = self.schema_version()
+
+        for version, sql_file_path in SCHEMA_MIGRATIONS:
+            if version <= current_version:
+                continue
 
-        # Execute each script using SQLite:
-        for sql_file_path in sql_files:
             # Open the SQL file and slurp its contents into a string:
             with open(os.path.join(self.sql_path, sql_file_path), "r") as sql_file:
                 sql_script = sql_file.read()
-                self.cursor.executescript(sql_script)
-                self.connection.commit()
 
-        print("INFO: SQLite Database Successfully Configured.")
+            try:
+                self.cursor.executescript(f"""
+                    BEGIN;
+                    {sql_script};
+                    INSERT INTO SchemaVersion (Version, ScriptName) VALUES ({version}, '{sql_file_path}');
+                    COMMIT;
+                """)
+            except sqlite3.Error:
+                if self.connection.in_transaction:
+                    self.connection.rollback()
+                raise
+
+            current_version = version
+            logger.info("Applied schema migration %d (%s).", version, sql_file_path)
+
+        logger.info("SQLite Database Successfully Configured (schema version %d).", current_version)
+
+    def query_plan(self, sql_query, params=None) -> list:
+        """
+        @param sql_query: Any SELECT statement.
+        @param params: (If given) its parameters; every "?" is bound to NULL otherwise.
+        @return List of the steps SQLite would take (EXPLAIN QUERY PLAN's detail column).
+        """
+        if params is None:
+            params = (None,) * sql_query.count("?")
+        rows = self.cursor.execute(f"EXPLAIN QUERY PLAN {sql_query}", params)
+        return [detail for _, _, _, detail in rows]
+
+    def unindexed_queries(self, queries=None) -> dict:
+        """
+        Finds queries that SQLite would answer with a full table scan.
+
+        @param queries: (If given) name -> query; INDEXED_QUERIES otherwise.
+        @return Python dictionary; name -> query plan, for every query whose plan scans a table.
+        """
+        unindexed = {}
+        for name, sql_query in (queries or INDEXED_QUERIES).items():
+            plan = self.query_plan(sql_query)
+            if any(step.startswith("SCAN ") for step in plan):
+                unindexed[name] = plan
+        return unindexed
 
     def verify_not_in_table(self, table_name, id_field_name, id) -> bool:
         """
@@ -79,277 +365,643 @@ class DataExporter:
         @return True if the item is not in the target table, or False otherwise.
         """
         sql_query = f"""
-            SELECT COUNT(*) FROM {table_name} AS T WHERE T.{id_field_name} = {id}
+            SELECT COUNT(*) FROM {table_name} AS T WHERE T.{id_field_name} = ?
         """
-        rows = self.cursor.execute(sql_query)
-        return True if rows.fetchall() is None else False
+        rows = self.cursor.execute(sql_query, (id,))
+        return rows.fetchone()[0] == 0
 
-    def add_user(self, author):
-        """
-        Adds the user that wrote the given tweet to the Users table.
+    ############################################################
+    #   Dimension Key Cache
+    ############################################################
 
-        @param tweet: A tweet
-        @return userID: the primary key for the newly created author.
+    def warm_key_caches(self) -> None:
         """
-        # First, verify that the author isn't already in the DB:
-        not_in_table = self.verify_not_in_table(
-            "Users", "AuthorID", author['id'])
-
-        if not_in_table:
-            # Below query insert the new author:
+        Loads the most recently created rows of each dimension table into its key cache.
+        """
+        for table_name, (natural_field, id_field, _) in DIMENSION_TABLES.items():
+            cache = self.key_caches[table_name]
             sql_query = f"""
-            INSERT INTO Users (AuthorID, UserHandle, UserName)
-            VALUES
-                ({author['id']}, {author['username']}, {author['name']})
+                SELECT {natural_field}, {id_field} FROM {table_name} ORDER BY {id_field} DESC LIMIT ?
             """
-            self.cursor.execute(sql_query)
-            self.connection.commit()
+            # Insert oldest first so that the newest rows end up as the most recently used:
+            rows = self.cursor.execute(sql_query, (cache.capacity,)).fetchall()
+            for natural_key, surrogate_key in reversed(rows):
+                cache.put(str(natural_key), surrogate_key)
 
-        # Grab the author's unique identifier (PK) from the DB:
-        sql_query = f"""
-        SELECT UserID FROM Users WHERE AuthorID = {author['id']}
+    def clear_key_caches(self) -> None:
+        """
+        Empties every dimension key cache.
         """
-        rows = self.cursor.execute(sql_query)
-        rows.fetchone()
-        created_user_ID = rows[0]
+        for cache in self.key_caches.values():
+            cache.clear()
 
-        return created_user_ID
+    def key_cache_stats(self) -> dict:
+        """
+        @return Python dictionary; each dimension table's cache hit/miss counters.
+        """
+        return {table_name: cache.stats() for table_name, cache in self.key_caches.items()}
 
-    def add_location(self, place):
+    def fetch_keys(self, table_name, natural_keys) -> dict:
         """
-        Adds a locaton to the Locations table.
+        Looks up surrogate keys in SQLite (skipping the cache) and stores whatever is found in the cache.
 
-        @param tweet: A tweet.
-        @return created_location_id: Primary key for the newly created Locations row.
+        @param table_name: One of the DIMENSION_TABLES.
+        @param natural_keys: The natural keys (as strings) to look up.
+        @return key_map: Python dictionary; natural key -> surrogate key for the keys that exist.
         """
-        not_in_table = self.verify_not_in_table(
-            "Locations", "LocationCode", place['id'])
+        natural_field, id_field, _ = DIMENSION_TABLES[table_name]
+        cache = self.key_caches[table_name]
+        key_map = {}
 
-        if not_in_table:
-            # Below query inserts the new location:
+        for key_chunk in chunk(natural_keys, MAX_SQL_VARIABLES):
+            placeholders = ", ".join("?" * len(key_chunk))
             sql_query = f"""
-            INSERT INTO Locations (LocationCode, LocationName)
-            VALUES
-            ({place['id']}, {place['full_name']})
+                SELECT {natural_field}, {id_field} FROM {table_name} WHERE {natural_field} IN ({placeholders})
             """
-            self.cursor.execute(sql_query)
-            self.connection.commit()
+            for natural_key, surrogate_key in self.cursor.execute(sql_query, key_chunk):
+                cache.put(str(natural_key), surrogate_key)
+                key_map[str(natural_key)] = surrogate_key
 
-        sql_query = f"""
-            SELECT LocationID FROM Locations WHERE LocationCode = {place['id']}
-        """
-        rows = self.cursor.execute(sql_query)
-        rows.fetchone()
-        created_location_id = rows[0]
-
-        return created_location_id
+        return key_map
 
-    def add_tweet(self, topic, tweet, tweet_author_id, location_id):
+    def resolve_keys(self, table_name, natural_keys) -> dict:
         """
-        Adds a tweet to the Tweets table.
+        Maps natural keys to surrogate keys, only going to SQLite for keys that aren't cached.
 
-        @param tweet: The tweet that we are adding.
-        @param tweet_author_id: the UserID for the Author (PK in Users table)
-        @param location_id: the LocationID for the Location (PK in Locations table)
-        @return void
+        @param table_name: One of the DIMENSION_TABLES.
+        @param natural_keys: The natural keys to look up.
+        @return key_map: Python dictionary; natural key (as a string) -> surrogate key for the keys that exist.
         """
-        # <Query Info>
-        # tweet_id: The tweet's ID (created by Twitter, not us)
-        # authorID: The author's ID (should have been created before, passed in)
-        # location_id: The location ID (should have been created, passed in as param)
+        cache = self.key_caches[table_name]
+        key_map = {}
+        missing_keys = []
 
-        # Verify that this exact Tweet isn't already in the DB:
-        not_in_table = self.verify_not_in_table(
-            "Tweets", "TweetID", tweet['id'])
+        for natural_key in set(str(key) for key in natural_keys):
+            surrogate_key = cache.get(natural_key)
+            if surrogate_key is None:
+                missing_keys.append(natural_key)
+            else:
+                key_map[natural_key] = surrogate_key
 
-        if not_in_table:
-            # Convert the Tweet's creation date to a datetime object:
-            sql_query = f"""
-                CONVERT(DATETIME, {tweet['created_at']})
-            """
-            rows = self.cursor.execute(sql_query)
-            rows.fetchone()
-            date_time = rows[0]
+        if missing_keys:
+            key_map.update(self.fetch_keys(table_name, missing_keys))
 
-            # Inser the Tweet into the table:
-            sql_query = f"""
-                INSERT INTO Tweets (TweetID, TweetAuthorID, LocationID, TweetDate, TweetBody, TweetJSON, TweetTopic)
-                VALUES
-                    ({tweet['id']}, {tweet_author_id}, {location_id if not None else "NULL"}, {date_time}, {tweet['text']}, {tweet}, {topic})
-            """
-            self.cursor.execute(sql_query)
-            self.connection.commit()
-
-    def add_tweet_tags(self, tweet):
-        """
-        Adds to the junction table (TweetHashtags) a tweet and its corresponding hashtags.
-
-        @param tweet: The tweet that we're adding to the junction table.
-        @param tag_list: The list of Tweet Hashtag IDs.
-        @return void
-        """
-        tag_list = collect_hashtags(tweet)
-        for tag in tag_list:
-            # Verify that the Hashtag is not in the table already:
-            not_in_table = self.verify_not_in_table(
-                "Hashtags", "HashtagText", tag)
-
-            # Insert the new tag:
-            if not_in_table:
-                sql_query = f"""
-                    INSERT INTO Hashtags (HashtagText)
-                    VALUES
-                        ({tag})
-                """
-                self.cursor.execute(sql_query)
-                self.connection.commit()
-
-            # Query for the hashtag's ID from the hashtag table:
-            sql_query = f"""
-                SELECT HashtagID FROM Hashtags AS H WHERE H.HashtagText = {tag}
-            """
-            rows = self.cursor.execute(sql_query)
-            rows.fetchone()
-            hashtag_id = rows[0]
+        return key_map
 
-            # Check if this Tweet has already been mapped to this hashtag:
-            sql_query = f"""
-                SELECT COUNT(*) FROM TweetHashtags AS TH WHERE TH.TweetID = {tweet['id']} AND TH.HashtagID = {hashtag_id}
-            """
-            rows = self.cursor.execute(sql_query)
-            rows.fetchall()
-
-            # Only insert the new mapping if not already in the table:
-            if rows is None:
-                sql_query = f"""
-                    INSERT INTO TweetHashtags (TweetID, HashtagID)
-                    VALUES
-                        ({tweet['id']}, {hashtag_id})
-                """
-                self.cursor.execute(sql_query)
-                self.connection.commit()
-
-    def add_tweet_sentiment_info(self, tweet_info):
-        """
-        Adds the corresponding tweet's sentiment analysis info to the DB.
-
-        @param tweet_info: Python dictionary that contains the tweet's id, sentiment, confidence scores, and keywords.
-        @return void
-        """
-
-        # Verify that the Tweet has not already been mapped to a sentiment:
-        not_in_table = self.verify_not_in_table(
-            "TweetSentiment", "TweetID", tweet_info['id'])
-
-        if not_in_table:
-            # Convert the Tweet's sentiment to an integer:
-            sentiments = {
-                "positive": 1,
-                "neutral": 2,
-                "mixed": 3,
-                "negative": 4
-            }
-            tweet_sentiment = sentiments[tweet_info['overall_sentiment']]
-
-            # Map the Tweet to its overall sentiment:
-            sql_query = f"""
-                INSERT INTO TweetSentiment (TweetID, SentimentID)
-                VALUES
-                    ({tweet_info['id']}, {tweet_sentiment})
-            """
-            self.cursor.execute(sql_query)
-            self.connection.commit()
+    def upsert_dimension(self, table_name, rows_by_key) -> dict:
+        """
+        Makes sure every given natural key has a row in a dimension table. Does not commit.
 
-        # Verify that the Tweet has not already been mapped to its Confidence values:
-        sql_query = f"""
-            SELECT COUNT(*) FROM TweetConfidence AS TC WHERE TC.TweetID = {tweet_info['id']}
+        @param table_name: One of the DIMENSION_TABLES.
+        @param rows_by_key: Python dictionary; natural key -> tuple of values for the table's insert columns.
+        @return key_map: Python dictionary; natural key (as a string) -> surrogate key.
         """
-        rows = self.cursor.execute(sql_query)
-        rows.fetchall()
+        natural_field, _, columns = DIMENSION_TABLES[table_name]
+        rows_by_key = {str(key): row for key, row in rows_by_key.items()}
+
+        key_map = self.resolve_keys(table_name, rows_by_key.keys())
+        new_keys = [key for key in rows_by_key if key not in key_map]
 
-        # There are three confidence values to track, so check if we have them:
-        if len(rows) < 3:
-            # Insert the Tweet's confidence scores for its assigned sentiment(s):
+        if new_keys:
             sql_query = f"""
-                INSERT INTO TweetConfidence (TweetID, ConfidenceTypeID, ConfidenceScore)
-                VALUES
-                    ({tweet_info['id']}, 1, {tweet_info['confidence_scores']['positive']}),
-                    ({tweet_info['id']}, 2, {tweet_info['confidence_scores']['neutral']}),
-                    ({tweet_info['id']}, 3, {tweet_info['confidence_scores']['negative']})
+                INSERT INTO {table_name} ({", ".join(columns)})
+                VALUES ({", ".join("?" * len(columns))})
+                ON CONFLICT ({natural_field}) DO NOTHING
             """
-            self.cursor.execute(sql_query)
-            self.connection.commit()
-
-    def add_tweet_keywords(self, tweet_info, topic):
-        """
-        Adds the corresponding tweet's keywords, as given by Cognitive Services, to the DB.
-
-        @param tweet_info: Python dictionary that contains the tweet's id, sentiment, confidence scores, and keywords.
-        @return void
-        """
-        keyword_list = tweet_info['key_phrases']
-        tweet_id = tweet_info['id']
-
-        for phrase in keyword_list:
-            # We don't want the topic as a keyword. Have to filter for case here, as well.
-            if (topic not in phrase and topic.lower() not in phrase and topic.upper() not in phrase):
-
-                # Step 1: Insert Key Phrase Into DB if not already in the table:
-                not_in_table = self.verify_not_in_table(
-                    "KeyPhrases", "KeyPhraseText", phrase)
-
-                if not_in_table:
-                    sql_query = f"""
-                    INSERT INTO KeyPhrases (KeyPhraseText)
-                    VALUES
-                        ({phrase})
-                    """
-                    self.cursor.execute(sql_query)
-                    self.connection.commit()
-
-                # Get the phrase's unique identifier in the KeyPhrases table:
-                sql_query = f"""
-                SELECT KeyPhraseID FROM KeyPhrases AS KP WHERE KP.KeyPhraseText = {phrase}
-                """
-                rows = self.cursor.execute(sql_query)
-                rows.fetchone()
-                created_phrase_ID = rows[0]
-
-                # Lastly, check if the Tweet was already mapped to this phrase:
-                sql_query = f"""
-                    SELECT COUNT(*) FROM TweetKeyPhrases WHERE TweetID = {tweet_id} AND KeyPhraseID = {created_phrase_ID}
-                """
-                rows = self.cursor.execute(sql_query)
-                rows.fetchall()
-
-                if rows is None:
-                    # Map the Tweet to the Key Phrase:
-                    sql_query = f"""
-                        INSERT INTO TweetKeyPhrases (TweetID, KeyPhraseID)
-                        VALUES
-                            ({tweet_id}, {created_phrase_ID})
-                    """
-                    self.cursor.execute(sql_query)
-                    self.connection.commit()
+            self.cursor.executemany(
+                sql_query, [rows_by_key[key] for key in new_keys])
+            key_map.update(self.fetch_keys(table_name, new_keys))
+
+        return key_map
+
+    ############################################################
+    #   Stored Tweets
+    ############################################################
 
     def check_existing_tweets(self, tweet_list):
         """
         Checks if there are duplicate tweets already in the database, and returns a filtered list of those that aren't.
 
+        Tweets recently seen by this process are dropped without touching SQLite; the rest of the page is
+        checked with one (chunked) WHERE TweetID IN (...) query rather than one query per tweet.
+
         @param tweet_list: The list of tweets before filtering.
         @return list; List of tweets, not including the tweets already in the database.
         """
-        new_tweet_list = []
+        # Step 1: Drop anything we already know is stored (and any repeats within the page):
+        unique_tweets = {}
+        for tweet in self.seen_tweet_ids.filter_unseen(tweet_list):
+            unique_tweets.setdefault(str(tweet['id']), tweet)
+
+        # Step 2: Ask the DB about the rest of the page all at once:
+        with metrics.timed("db_duplicate_check_seconds"):
+            existing_ids = self.stored_tweet_ids(unique_tweets.keys())
+        self.seen_tweet_ids.add_all(existing_ids)
+
+        return [tweet for tweet_id, tweet in unique_tweets.items() if tweet_id not in existing_ids]
 
-        for tweet in tweet_list:
+    def stored_tweet_ids(self, tweet_ids) -> set:
+        """
+        @param tweet_ids: TweetIDs to look up, with one (chunked) WHERE TweetID IN (...) query.
+        @return Set of the given TweetIDs (as strings) that are already in the Tweets table.
+        """
+        existing_ids = set()
+        for id_chunk in chunk(tweet_ids, MAX_SQL_VARIABLES):
+            placeholders = ", ".join("?" * len(id_chunk))
             sql_query = f"""
-            SELECT COUNT(*) FROM Tweets AS T WHERE T.TweetID = {tweet['id']}
+                SELECT T.TweetID FROM Tweets AS T WHERE T.TweetID IN ({placeholders})
             """
-            rows = self.cursor.execute(sql_query)
-            rows.fetchall()
-            num_existing = int(rows[0][0])
+            for (tweet_id,) in self.cursor.execute(sql_query, id_chunk):
+                existing_ids.add(str(tweet_id))
+
+        return existing_ids
+
+    ############################################################
+    #   Ingest Checkpoints
+    ############################################################
+
+    def load_checkpoint(self, topic):
+        """
+        @param topic: String; the topic to look up.
+        @return Python dictionary of the topic's IngestCheckpoints row (snake_case keys), or None if the
+                topic has never been pulled.
+        """
+        row = self.cursor.execute("""
+            SELECT TopicName, Status, NextToken, SinceID, NewestTweetID, OldestTweetID, TargetCount,
+                   PassFetched, TotalFetched, TotalStored, PagesFetched
+            FROM IngestCheckpoints WHERE TopicName = ?
+        """, (topic,)).fetchone()
+
+        if row is None:
+            return None
 
-            if num_existing == 0:
-                new_tweet_list.append(tweet)
+        return dict(zip(("topic", "status", "next_token", "since_id", "newest_id", "oldest_id",
+                         "target_count", "pass_fetched", "total_fetched", "total_stored",
+                         "pages_fetched"), row))
+
+    def start_checkpoint(self, topic, num_desired) -> dict:
+        """
+        Starts (or resumes) an ingest pass for a topic. A pass that was interrupted is resumed from its
+        saved next_token; otherwise a new pass starts from the newest tweets, stopping at the newest tweet
+        already stored (since_id). A pass that reaches its target without reaching since_id leaves a gap
+        that later passes don't go back for.
+
+        @param topic: String; the topic being pulled.
+        @param num_desired: The number of tweets this pass should fetch.
+        @return Python dictionary; the checkpoint to start fetching from (see load_checkpoint).
+        """
+        checkpoint = self.load_checkpoint(topic)
+
+        if (checkpoint is not None and checkpoint['status'] == 'running'
+                and checkpoint['pass_fetched'] < num_desired):
+            logger.info("Resuming %s after %d tweets.", topic, checkpoint['pass_fetched'],
+                        extra={'topic': topic, 'pass_fetched': checkpoint['pass_fetched']})
+            with self.connection:
+                self.cursor.execute("""
+                    UPDATE IngestCheckpoints SET TargetCount = ?, UpdatedAt = CURRENT_TIMESTAMP
+                    WHERE TopicName = ?
+                """, (num_desired, topic))
+            checkpoint['target_count'] = num_desired
+            return checkpoint
+
+        with self.connection:
+            self.cursor.execute("""
+                INSERT INTO IngestCheckpoints (TopicName, Status, TargetCount)
+                VALUES (?, 'running', ?)
+                ON CONFLICT (TopicName) DO UPDATE SET
+                    Status = 'running',
+                    NextToken = NULL,
+                    SinceID = NewestTweetID,
+                    TargetCount = excluded.TargetCount,
+                    PassFetched = 0,
+                    StartedAt = CURRENT_TIMESTAMP,
+                    UpdatedAt = CURRENT_TIMESTAMP
+            """, (topic, num_desired))
+
+        checkpoint = self.load_checkpoint(topic)
+        if checkpoint['since_id'] is not None:
+            logger.info("Pulling %s tweets newer than %s.", topic, checkpoint['since_id'],
+                        extra={'topic': topic, 'since_id': checkpoint['since_id']})
+        return checkpoint
+
+    def save_checkpoint(self, topic, page, stored_count) -> None:
+        """
+        Records a page against its topic's checkpoint (does nothing if no pass was started for the topic).
+        Called inside add_tweet_pages()'s transaction, so the checkpoint never runs ahead of the data.
+
+        @param topic: String; the topic the page was pulled for.
+        @param page: The TweetPage that was written (its result_count/newest_id/oldest_id are the API's).
+        @param stored_count: How many of the page's tweets were new to the database.
+        """
+        fetched_count = page.result_count if page.result_count is not None else len(page)
+
+        self.cursor.execute("""
+            UPDATE IngestCheckpoints SET
+                NextToken = :next_token,
+                NewestTweetID = MAX(COALESCE(NewestTweetID, :newest_id), COALESCE(:newest_id, NewestTweetID)),
+                OldestTweetID = MIN(COALESCE(OldestTweetID, :oldest_id), COALESCE(:oldest_id, OldestTweetID)),
+                PassFetched = PassFetched + :fetched,
+                TotalFetched = TotalFetched + :fetched,
+                TotalStored = TotalStored + :stored,
+                PagesFetched = PagesFetched + 1,
+                UpdatedAt = CURRENT_TIMESTAMP
+            WHERE TopicName = :topic AND Status = 'running'
+        """, {'next_token': page.next_token, 'newest_id': page.newest_id, 'oldest_id': page.oldest_id,
+              'fetched': fetched_count, 'stored': stored_count, 'topic': topic})
+
+        # The pass is over once the API runs out of pages or the target has been reached:
+        self.cursor.execute("""
+            UPDATE IngestCheckpoints SET Status = 'complete', NextToken = NULL
+            WHERE TopicName = ? AND Status = 'running' AND (NextToken IS NULL OR PassFetched >= TargetCount)
+        """, (topic,))
+
+    ############################################################
+    #   Dashboard Rollups
+    ############################################################
+
+    def update_rollups(self, topic, tweets, tweet_sentiments, tag_rows, tag_keys, phrase_rows, phrase_keys):
+        """
+        Adds a page's newly stored tweets to the topic's rollup tables (see TwitterRollups.sql). Meant to be
+        called inside add_tweet_pages()'s transaction, so the rollups always match the committed tweets.
+
+        @param topic: String; the topic the page was pulled for.
+        @param tweets: The tweets being stored (none of which were stored before).
+        @param tweet_sentiments: (If given) output of analyze_tweet_sentiments() for those tweets.
+        @param tag_rows: List of (TweetID, hashtag) pairs, with tag_keys mapping each hashtag to its HashtagID.
+        @param phrase_rows: List of (TweetID, key phrase) pairs, with phrase_keys mapping them to KeyPhraseIDs.
+        """
+        # Step 1: Sum the page up per hour and sentiment, and count its hashtags and phrases:
+        tweet_hours = {str(tweet['id']): tweet['created_at'][:13] + ":00:00" for tweet in tweets}
+        hour_totals = {}
+        for tweet_info in (tweet_sentiments or []):
+            hour = tweet_hours.get(str(tweet_info['id']))
+            if hour is None:
+                continue
+            totals = hour_totals.setdefault(
+                (hour, SENTIMENT_IDS[tweet_info['overall_sentiment']]), [0, 0.0, 0.0, 0.0])
+            scores = tweet_info['confidence_scores']
+            totals[0] += 1
+            totals[1] += scores['positive']
+            totals[2] += scores['neutral']
+            totals[3] += scores['negative']
+
+        tag_counts = Counter(tag_keys[tag] for _, tag in set(tag_rows))
+        phrase_counts = Counter(phrase_keys[phrase] for _, phrase in set(phrase_rows))
+
+        # Step 2: Fold the page's totals into the running ones:
+        self.cursor.executemany("""
+            INSERT INTO TopicSentimentHourly
+                (TweetTopic, HourStart, SentimentID, TweetCount, PositiveScoreSum, NeutralScoreSum, NegativeScoreSum)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (TweetTopic, HourStart, SentimentID) DO UPDATE SET
+                TweetCount = TweetCount + excluded.TweetCount,
+                PositiveScoreSum = PositiveScoreSum + excluded.PositiveScoreSum,
+                NeutralScoreSum = NeutralScoreSum + excluded.NeutralScoreSum,
+                NegativeScoreSum = NegativeScoreSum + excluded.NegativeScoreSum
+        """, [(topic, hour, sentiment_id, *totals) for (hour, sentiment_id), totals in hour_totals.items()])
+
+        self.cursor.executemany("""
+            INSERT INTO TopicHashtagCounts (TweetTopic, HashtagID, TweetCount)
+            VALUES (?, ?, ?)
+            ON CONFLICT (TweetTopic, HashtagID) DO UPDATE SET TweetCount = TweetCount + excluded.TweetCount
+        """, [(topic, tag_id, count) for tag_id, count in tag_counts.items()])
+
+        # Phrase counts are kept in memory and upserted once per transaction (see add_tweet_pages):
+        self.keywords.record(topic, phrase_counts)
+
+    ############################################################
+    #   Topic Queries
+    ############################################################
+
+    def topic_key(self, topic) -> int:
+        """
+        @param topic: String; a topic name.
+        @return The topic's TopicID; the topic is added to the Topics table if it's new. Does not commit.
+        """
+        return self.upsert_dimension("Topics", {topic: (topic,)})[str(topic)]
+
+    def topics(self) -> list:
+        """
+        @return List of {'id', 'name'} dictionaries; every topic that tweets have been stored for.
+        """
+        rows = self.cursor.execute("SELECT TopicID, TopicName FROM Topics ORDER BY TopicName")
+        return [{'id': topic_id, 'name': name} for topic_id, name in rows]
+
+    def topic_tweets(self, topic, since=None, until=None, limit=100) -> list:
+        """
+        Fetches a topic's tweets, newest first, through the (TopicID, TweetDate) index.
+
+        @param topic: String; the topic name.
+        @param since: (If given) the earliest TweetDate to include, as "YYYY-MM-DD HH:MM:SS".
+        @param until: (If given) the latest TweetDate to include, in the same format.
+        @param limit: The most tweets to return.
+        @return List of {'id', 'created_at', 'username', 'location', 'text'} dictionaries (empty for an
+                unknown topic).
+        """
+        topic_id = self.resolve_keys("Topics", [topic]).get(str(topic))
+        if topic_id is None:
+            return []
+
+        rows = self.cursor.execute(TOPIC_TWEETS_QUERY, (topic_id, since or EARLIEST_DATE,
+                                                        until or LATEST_DATE, limit))
+        return [{'id': str(tweet_id), 'created_at': created_at, 'username': username,
+                 'location': location, 'text': text}
+                for tweet_id, created_at, username, location, text in rows]
+
+    def topic_sentiment(self, topic, since=None, until=None) -> dict:
+        """
+        Summarizes a topic's sentiment from the hourly rollups (so it doesn't touch the tweets themselves).
 
-        return new_tweet_list
+        @param topic: String; the topic name.
+        @param since: (If given) the earliest hour to include, as "YYYY-MM-DD HH:MM:SS".
+        @param until: (If given) the latest hour to include, in the same format.
+        @return Python dictionary; sentiment name -> {'tweets', 'avg_positive', 'avg_neutral', 'avg_negative'}.
+        """
+        rows = self.cursor.execute(TOPIC_SENTIMENT_QUERY, (topic, since or EARLIEST_DATE,
+                                                           until or LATEST_DATE))
+        return {name: {'tweets': count, 'avg_positive': positive / count,
+                       'avg_neutral': neutral / count, 'avg_negative': negative / count}
+                for name, count, positive, neutral, negative in rows if count}
+
+    def top_key_phrases(self, topic, limit=10) -> list:
+        """
+        @param topic: String; the topic name.
+        @param limit: How many phrases to return.
+        @return List of (key phrase, tweet count) pairs, most common first.
+        """
+        return self.cursor.execute(TOP_KEY_PHRASES_QUERY, (topic, limit)).fetchall()
+
+    def top_hashtags(self, topic, limit=10) -> list:
+        """
+        @param topic: String; the topic name.
+        @param limit: How many hashtags to return.
+        @return List of (hashtag, tweet count) pairs, most common first.
+        """
+        return self.cursor.execute(TOP_HASHTAGS_QUERY, (topic, limit)).fetchall()
+
+    ############################################################
+    #   Raw Payloads
+    ############################################################
+
+    def add_raw_page(self, topic_id, raw_payload) -> int:
+        """
+        Stores a page's compressed API response. Does not commit.
+
+        @param topic_id: The TopicID the page was fetched for.
+        @param raw_payload: raw_store.RawPayload
+        @return The new RawPageID.
+        """
+        self.cursor.execute("""
+            INSERT INTO RawPages (TopicID, Codec, RawSize, Payload) VALUES (?, ?, ?, ?)
+        """, (topic_id, raw_payload.codec, raw_payload.raw_size, raw_payload.blob))
+        return self.cursor.lastrowid
+
+    def raw_page(self, raw_page_id):
+        """
+        @param raw_page_id: The page's RawPageID.
+        @return RawPayload (decompressed on first access), or None if there is no such page.
+        """
+        row = self.cursor.execute("""
+            SELECT Codec, Payload, RawSize FROM RawPages WHERE RawPageID = ?
+        """, (raw_page_id,)).fetchone()
+        return RawPayload(*row) if row is not None else None
+
+    def raw_tweet(self, tweet_id):
+        """
+        @param tweet_id: The tweet's TweetID.
+        @return The tweet as the API returned it (from its raw page, or from TweetJSON for tweets stored
+                without one), or None if the tweet isn't stored.
+        """
+        row = self.cursor.execute("""
+            SELECT T.TweetJSON, R.Codec, R.Payload, R.RawSize
+            FROM Tweets AS T LEFT JOIN RawPages AS R ON T.RawPageID = R.RawPageID
+            WHERE T.TweetID = ?
+        """, (tweet_id,)).fetchone()
+        if row is None:
+            return None
+
+        tweet_json, codec, blob, raw_size = row
+        if codec is not None:
+            return RawPayload(codec, blob, raw_size).tweet(tweet_id)
+        return json.loads(tweet_json) if tweet_json else None
+
+    def raw_pages(self, topic=None):
+        """
+        Walks through the stored raw pages (oldest first), e.g. to re-split or re-analyze them.
+
+        @param topic: (If given) only this topic's pages.
+        @return Generator of (RawPageID, RawPayload) pairs; each payload is only decompressed if it's used.
+        """
+        if topic is None:
+            rows = self.connection.execute("""
+                SELECT RawPageID, Codec, Payload, RawSize FROM RawPages ORDER BY RawPageID
+            """)
+        else:
+            rows = self.connection.execute("""
+                SELECT R.RawPageID, R.Codec, R.Payload, R.RawSize
+                FROM RawPages AS R INNER JOIN Topics AS TP ON R.TopicID = TP.TopicID
+                WHERE TP.TopicName = ?
+                ORDER BY R.RawPageID
+            """, (topic,))
+
+        for raw_page_id, codec, blob, raw_size in rows:
+            yield raw_page_id, RawPayload(codec, blob, raw_size)
+
+    ############################################################
+    #   Bulk Loading
+    ############################################################
+
+    def add_tweet_page(self, topic, page, tweet_sentiments=None, tweet_keywords=None) -> dict:
+        """
+        Writes a whole page of tweets (and everything hanging off of them) to the DB in a single transaction.
+
+        Each table gets one parameterized executemany() call, and rows that already exist are skipped by
+        INSERT ... ON CONFLICT DO NOTHING rather than a SELECT per row. Surrogate keys come from the
+        dimension key caches, so repeat authors, places, hashtags and phrases never touch SQLite. The
+        topic's ingest checkpoint (if a pass was started) and its dashboard rollups are updated in the
+        same transaction.
+
+        @param topic: String; the topic the page was pulled for.
+        @param page: TweetPage (see split_page) holding the tweets to write and their authors/places.
+        @param tweet_sentiments: (If given) output of analyze_tweet_sentiments() for the page.
+        @param tweet_keywords: (If given) output of analyze_tweet_keywords() for the page.
+        @return stats: Python dictionary; the number of rows written (inserted or updated; rows skipped as
+                duplicates aren't counted), seconds taken, and rows per second.
+        """
+        return self.add_tweet_pages([(topic, page, tweet_sentiments, tweet_keywords)])
+
+    def add_tweet_pages(self, pages) -> dict:
+        """
+        Like add_tweet_page(), but writes several pages in one transaction (one commit, and one fsync,
+        for the lot). Pages are written in the order given, so each topic's checkpoint moves forward in
+        fetch order.
+
+        @param pages: List of (topic, page, tweet_sentiments, tweet_keywords) tuples.
+        @return stats: Python dictionary; the number of rows written, seconds taken, and rows per second.
+        """
+        start_time = time.perf_counter()
+        start_changes = self.connection.total_changes
+
+        try:
+            with self.connection:
+                page_counts = [self.write_tweet_page(*item)[1] for item in pages]
+                self.keywords.flush(self.cursor)
+                commit_start = time.perf_counter()
+            # (Leaving the with block commits.)
+            metrics.observe("db_commit_seconds", time.perf_counter() - commit_start)
+        except sqlite3.Error:
+            # Keys cached during the rolled-back transaction may no longer exist, and nothing counted in it
+            # was stored:
+            self.clear_key_caches()
+            self.keywords.discard()
+            metrics.inc("db_rollbacks_total")
+            raise
+
+        for _, page, _, _ in pages:
+            self.seen_tweet_ids.add_all(page.ids)
+
+        # Report how quickly the pages went in:
+        elapsed = time.perf_counter() - start_time
+        num_rows = self.connection.total_changes - start_changes
+        stats = {
+            'rows': num_rows,
+            'seconds': elapsed,
+            'rows_per_second': (num_rows / elapsed) if elapsed > 0 else float(num_rows)
+        }
+
+        metrics.observe("db_page_write_seconds", elapsed)
+        metrics.inc("db_pages_written_total", len(pages))
+        metrics.inc("db_rows_written_total", num_rows)
+        for (topic, _, _, _), stored_count in zip(pages, page_counts):
+            metrics.inc("db_tweets_stored_total", stored_count, topic=topic)
+
+        logger.debug("Bulk-loaded %d rows from %d pages in %.3fs (%.0f rows/s).", num_rows, len(pages),
+                     elapsed, stats['rows_per_second'],
+                     extra={'topics': sorted({item[0] for item in pages}), **stats})
+        return stats
+
+    def write_tweet_page(self, topic, page, tweet_sentiments=None, tweet_keywords=None) -> tuple:
+        """
+        Writes one page's rows (see add_tweet_page). Does not commit; callers run it inside a transaction.
+
+        @return (rows written, tweets that were new to the DB); rows skipped by ON CONFLICT DO NOTHING
+                aren't counted as written.
+        """
+        start_changes = self.connection.total_changes
+
+        # Step 1: Build the parameter lists for every table up front (authors/places are joined by ID):
+        user_rows = {}
+        location_rows = {}
+        tag_rows = []
+        missing_authors = 0
+        tweets = page.tweets
+        page_entities = extract_page_entities(tweets, ("hashtags",))
+        for tweet in tweets:
+            author = page.author_of(tweet)
+            if author is not None:
+                user_rows[author['id']] = (
+                    author['id'], author['username'], author['name'])
+            elif tweet['author_id'] not in user_rows:
+                # The API leaves withheld and suspended accounts out of includes.users. Tweets.TweetAuthorID
+                # can't be NULL, so the author gets a placeholder row (an existing row is left as it is):
+                user_rows[tweet['author_id']] = (tweet['author_id'], "", "")
+                missing_authors += 1
+
+            place = page.place_of(tweet)
+            if place is not None:
+                location_rows[place['id']] = (place['id'], place['full_name'])
+
+            for tag in page_entities[tweet['id']]['hashtags']:
+                tag_rows.append((tweet['id'], tag))
+
+        sentiment_rows = []
+        confidence_rows = []
+        for tweet_info in (tweet_sentiments or []):
+            sentiment_rows.append(
+                (tweet_info['id'], SENTIMENT_IDS[tweet_info['overall_sentiment']]))
+            for label, type_id in CONFIDENCE_TYPE_IDS.items():
+                confidence_rows.append(
+                    (tweet_info['id'], type_id, tweet_info['confidence_scores'][label]))
+
+        # Near-duplicate clusters (see sentiment_analyzer.analyze_clustered):
+        cluster_ids = {str(tweet_info['id']): tweet_info['cluster_id']
+                       for tweet_info in (tweet_sentiments or []) if 'cluster_id' in tweet_info}
+
+        # We don't want the topic (in any case) or stop phrases as keywords:
+        phrase_rows = [(tweet_info['id'], phrase) for tweet_info in (tweet_keywords or [])
+                       for phrase in self.keywords.filter_phrases(topic, tweet_info['key_phrases'])]
+
+        # Step 2: Write everything. Tweets that are already stored keep the rows they were first stored
+        # with (and aren't counted twice in the rollups), and results for tweets that aren't on the page
+        # (e.g. ones a caller's duplicate check already dropped) are left out too:
+        stored_ids = self.stored_tweet_ids(tweet['id'] for tweet in tweets)
+        tweets = [tweet for tweet in tweets if str(tweet['id']) not in stored_ids]
+        new_ids = {str(tweet['id']) for tweet in tweets}
+        tweet_sentiments = [tweet_info for tweet_info in (tweet_sentiments or [])
+                            if str(tweet_info['id']) in new_ids]
+        tag_rows, sentiment_rows, confidence_rows, phrase_rows = (
+            [row for row in rows if str(row[0]) in new_ids]
+            for rows in (tag_rows, sentiment_rows, confidence_rows, phrase_rows))
+
+        if missing_authors:
+            logger.warning("%d authors missing from a %s page; stored as placeholders.", missing_authors, topic,
+                           extra={'topic': topic, 'missing_authors': missing_authors})
+        user_keys = self.upsert_dimension("Users", user_rows)
+        location_keys = self.upsert_dimension(
+            "Locations", location_rows)
+        tag_keys = self.upsert_dimension(
+            "Hashtags", {tag: (tag,) for _, tag in tag_rows})
+        phrase_keys = self.upsert_dimension(
+            "KeyPhrases", {phrase: (phrase,) for _, phrase in phrase_rows})
+        topic_id = self.topic_key(topic)
+
+        # The page's raw response (if kept) holds every API field, so TweetJSON can stay empty:
+        raw_page_id = None
+        if page.raw_payload is not None and tweets:
+            raw_page_id = self.add_raw_page(topic_id, page.raw_payload)
+
+        tweet_rows = [(tweet['id'],
+                       user_keys.get(str(tweet['author_id'])),
+                       location_keys.get(str(tweet['location'])),
+                       tweet['created_at'], tweet['text'],
+                       "" if raw_page_id is not None else json.dumps(dict(tweet)),
+                       topic, topic_id, raw_page_id, cluster_ids.get(str(tweet['id'])))
+                      for tweet in tweets]
+
+        self.cursor.executemany("""
+            INSERT INTO Tweets (TweetID, TweetAuthorID, LocationID, TweetDate, TweetBody, TweetJSON,
+                                TweetTopic, TopicID, RawPageID, ClusterID)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (TweetID) DO NOTHING
+        """, tweet_rows)
+        stored_count = max(self.cursor.rowcount, 0)
+
+        self.cursor.executemany("""
+            INSERT INTO TweetHashtags (TweetID, HashtagID)
+            VALUES (?, ?)
+            ON CONFLICT (TweetID, HashtagID) DO NOTHING
+        """, [(tweet_id, tag_keys[tag]) for tweet_id, tag in tag_rows])
+
+        self.cursor.executemany("""
+            INSERT INTO TweetSentiment (TweetID, SentimentID)
+            VALUES (?, ?)
+            ON CONFLICT (TweetID, SentimentID) DO NOTHING
+        """, sentiment_rows)
+
+        self.cursor.executemany("""
+            INSERT INTO TweetConfidence (TweetID, ConfidenceTypeID, ConfidenceScore)
+            VALUES (?, ?, ?)
+            ON CONFLICT (TweetID, ConfidenceTypeID) DO NOTHING
+        """, confidence_rows)
+
+        self.cursor.executemany("""
+            INSERT INTO TweetKeyPhrases (TweetID, KeyPhraseID)
+            VALUES (?, ?)
+            ON CONFLICT (TweetID, KeyPhraseID) DO NOTHING
+        """, [(tweet_id, phrase_keys[phrase]) for tweet_id, phrase in phrase_rows])
+
+        self.update_rollups(topic, tweets, tweet_sentiments,
+                            tag_rows, tag_keys, phrase_rows, phrase_keys)
+        self.save_checkpoint(topic, page, stored_count)
+
+        return self.connection.total_changes - start_changes, stored_count
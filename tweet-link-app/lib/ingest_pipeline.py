@@ -0,0 +1,188 @@
+"""
+ingest_pipeline: runs the fetch, analysis, and DB-write stages of an import at the same time.
+
+Each topic gets a fetch thread that follows the search API's pagination and prefetches pages into a
+bounded queue, while the topic's analysis stage works through earlier pages. Several topics run at
+once in a thread pool, and every analyzed page is handed to a single writer thread that owns the
+SQLite connection.
+
+@author Abigail Goodwin <abby.goodwin@outlook.com>
+Copyright 2024, Abigail Goodwin, All rights reserved.
+"""
+
+import json
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import lib.twitter_importer as twitter_importer
+from lib.tweet_splitter import split_page
+from lib.raw_store import RawPayload
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of a stage's output on a queue:
+_DONE = object()
+
+
+############################################################
+#   Pipeline
+############################################################
+
+class IngestPipeline:
+    """
+    Runs the fetch -> analyze -> store stages for many topics concurrently.
+    """
+
+    def __init__(self, analyze_page, open_store, client=None, prefetch_pages=2, max_topics=3):
+        """
+        Constructor.
+
+        @param analyze_page: Callable(topic, page) -> (page, tweet_sentiments, tweet_keywords); run per topic.
+        @param open_store: Callable() -> store_page(topic, page, tweet_sentiments, tweet_keywords). Called once
+                           on the writer thread, so the store may own a SQLite connection.
+        @param client: (If given) the twitter_importer.XClient to fetch with; the shared default otherwise.
+        @param prefetch_pages: How many fetched pages may wait for analysis per topic.
+        @param max_topics: How many topics are fetched and analyzed at the same time.
+        """
+        self.analyze_page = analyze_page
+        self.open_store = open_store
+        self.client = client or twitter_importer.default_client()
+        self.prefetch_pages = prefetch_pages
+        self.max_topics = max_topics
+
+        self.write_queue = queue.Queue(maxsize=max(1, max_topics * prefetch_pages))
+        self.errors = []
+
+        # Set once the writer fails, so no topic fetches or analyzes (and pays for) pages it can't store:
+        self.stop_event = threading.Event()
+
+    def fetch_stage(self, topic, num_desired, page_queue, stop_event, checkpoint=None) -> None:
+        """
+        Follows the topic's pagination, pushing each page onto page_queue until enough tweets are fetched
+        (or stop_event is set because the analysis stage finished early, or the pipeline was stopped).
+
+        @param checkpoint: (If given) the topic's checkpoint (see DataExporter.start_checkpoint); fetching
+                           picks up at its next_token and count, and stops at its since_id.
+        """
+        try:
+            checkpoint = checkpoint or {}
+            tweet_count = checkpoint.get('pass_fetched', 0)
+            next_token = checkpoint.get('next_token')
+            since_id = checkpoint.get('since_id')
+            while tweet_count < num_desired and not stop_event.is_set() and not self.stop_event.is_set():
+                query_params = twitter_importer.build_search_params(
+                    topic, next_token, max_results=min(100, max(10, num_desired - tweet_count)),
+                    since_id=since_id)
+                raw_bytes = self.client.fetch_raw_page(query_params)
+                page = split_page(json.loads(raw_bytes))
+                # Compressed here, so the writer only has to store the blob:
+                page.raw_payload = RawPayload.pack(raw_bytes)
+
+                tweet_count += len(page)
+                page_queue.put(page)
+
+                next_token = page.next_token
+                if next_token is None or len(page) == 0:
+                    break
+        except Exception as error:
+            page_queue.put(error)
+        finally:
+            page_queue.put(_DONE)
+
+    def run_topic(self, topic, num_desired, checkpoint=None) -> int:
+        """
+        Fetches (on a background thread) and analyzes (on this thread) every page for one topic.
+
+        @param checkpoint: (If given) where to resume the topic from (see fetch_stage).
+        @return The number of tweets handed to the writer.
+        """
+        page_queue = queue.Queue(maxsize=self.prefetch_pages)
+        stop_event = threading.Event()
+        fetcher = threading.Thread(target=self.fetch_stage,
+                                   args=(topic, num_desired, page_queue, stop_event, checkpoint),
+                                   name=f"fetch-{topic}", daemon=True)
+        fetcher.start()
+
+        tweet_count = 0
+        try:
+            while True:
+                page = page_queue.get()
+                if page is _DONE:
+                    break
+                if isinstance(page, Exception):
+                    raise page
+                if self.stop_event.is_set():
+                    break
+
+                page, tweet_sentiments, tweet_keywords = self.analyze_page(
+                    topic, page)
+                self.write_queue.put(
+                    (topic, page, tweet_sentiments, tweet_keywords))
+                tweet_count += len(page)
+        finally:
+            # Drain whatever is left so the fetch thread can never block on a full queue:
+            stop_event.set()
+            while fetcher.is_alive() or not page_queue.empty():
+                try:
+                    page_queue.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            fetcher.join()
+
+        logger.info("Finished %s; %d tweets sent to the writer.", topic, tweet_count,
+                    extra={'topic': topic, 'tweets': tweet_count})
+        return tweet_count
+
+    def write_stage(self) -> None:
+        """
+        Owns the store and writes every analyzed page handed to it, until the pipeline finishes. If a write
+        fails, the rest of the pipeline is stopped and the error is raised by run().
+        """
+        store_page = None
+        while True:
+            item = self.write_queue.get()
+            if item is _DONE:
+                break
+
+            # Once the writer has failed, keep draining so producers never block:
+            if self.errors:
+                continue
+
+            try:
+                if store_page is None:
+                    store_page = self.open_store()
+                store_page(*item)
+            except Exception as error:
+                self.errors.append(error)
+                self.stop_event.set()
+                logger.error("Writing a page of %s failed; stopping the import.", item[0],
+                             extra={'topic': item[0]})
+
+    def run(self, topics, num_desired, checkpoints=None) -> dict:
+        """
+        Pulls num_desired tweets for every topic, max_topics at a time.
+
+        @param topics: List of topic strings.
+        @param num_desired: The number of tweets we want for each topic.
+        @param checkpoints: (If given) Python dictionary; topic -> checkpoint to resume from.
+        @return Python dictionary; topic -> the number of tweets written.
+        """
+        checkpoints = checkpoints or {}
+        writer = threading.Thread(
+            target=self.write_stage, name="db-writer", daemon=True)
+        writer.start()
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_topics) as pool:
+                counts = dict(zip(topics, pool.map(
+                    lambda topic: self.run_topic(topic, num_desired, checkpoints.get(topic)), topics)))
+        finally:
+            self.write_queue.put(_DONE)
+            writer.join()
+
+        if self.errors:
+            raise self.errors[0]
+
+        return counts
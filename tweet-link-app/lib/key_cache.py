@@ -0,0 +1,157 @@
+"""
+key_cache: small in-process caches that let the exporter skip SQLite round trips. KeyCache maps a
+dimension table's natural key (AuthorID, LocationCode, etc.) to its surrogate key (UserID, LocationID,
+etc.), and RecentIds remembers which TweetIDs have recently been seen in the database.
+
+@author Abigail Goodwin <abby.goodwin@outlook.com>
+Copyright 2024, Abigail Goodwin, All rights reserved.
+"""
+
+import threading
+from collections import OrderedDict
+
+
+class KeyCache:
+    """
+    Least-recently-used map of natural key -> surrogate key for a single dimension table.
+    """
+
+    def __init__(self, capacity=10000):
+        """
+        Constructor.
+
+        @param capacity: The most keys the cache will hold before evicting the least recently used one.
+        """
+        self.capacity = capacity
+        self.entries = OrderedDict()
+
+        # Counters used to size the cache for a given topic mix:
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, natural_key):
+        return natural_key in self.entries
+
+    def get(self, natural_key):
+        """
+        Looks up the surrogate key for the given natural key, counting the hit or miss.
+
+        @param natural_key: The table's natural key (as a string).
+        @return The surrogate key, or None if the key isn't cached.
+        """
+        surrogate_key = self.entries.get(natural_key)
+
+        if surrogate_key is None:
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(natural_key)
+        self.hits += 1
+        return surrogate_key
+
+    def put(self, natural_key, surrogate_key) -> None:
+        """
+        Adds (or refreshes) a natural key -> surrogate key mapping, evicting the oldest entry if full.
+
+        @param natural_key: The table's natural key (as a string).
+        @param surrogate_key: The table's primary key for that row.
+        """
+        if self.capacity <= 0:
+            return
+
+        self.entries[natural_key] = surrogate_key
+        self.entries.move_to_end(natural_key)
+
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        """
+        Drops every cached key (used when a transaction rolls back and the cached IDs may not exist).
+        """
+        self.entries.clear()
+
+    def stats(self) -> dict:
+        """
+        @return Python dictionary; the cache's hits, misses, hit rate, evictions, size and capacity.
+        """
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits / lookups) if lookups > 0 else 0.0,
+            'evictions': self.evictions,
+            'size': len(self.entries),
+            'capacity': self.capacity
+        }
+
+
+class RecentIds:
+    """
+    Bounded, thread-safe set of recently seen IDs (oldest forgotten first). Used to drop tweets that are
+    already stored without asking SQLite, e.g. when consecutive searches return overlapping windows.
+    """
+
+    def __init__(self, capacity=100000):
+        """
+        Constructor.
+
+        @param capacity: The most IDs to remember; 0 turns the set off.
+        """
+        self.capacity = capacity
+        self.ids = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, id):
+        with self.lock:
+            return str(id) in self.ids
+
+    def add_all(self, ids) -> None:
+        """
+        Remembers every given ID, forgetting the oldest ones once over capacity.
+
+        @param ids: Iterable of IDs.
+        """
+        if self.capacity <= 0:
+            return
+
+        with self.lock:
+            for id in ids:
+                self.ids[str(id)] = None
+                self.ids.move_to_end(str(id))
+
+            while len(self.ids) > self.capacity:
+                self.ids.popitem(last=False)
+
+    def filter_unseen(self, tweet_list):
+        """
+        @param tweet_list: List of tweet dictionaries.
+        @return list; the tweets whose IDs haven't been seen, counting hits (seen) and misses (unseen).
+        """
+        with self.lock:
+            unseen = [tweet for tweet in tweet_list if str(tweet['id']) not in self.ids]
+            self.hits += len(tweet_list) - len(unseen)
+            self.misses += len(unseen)
+            return unseen
+
+    def stats(self) -> dict:
+        """
+        @return Python dictionary; the set's hits, misses, size and capacity.
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self.ids),
+            'capacity': self.capacity
+        }
@@ -0,0 +1,133 @@
+"""
+keyword_engine: decides which key phrases are kept for a topic, and keeps each topic's running phrase counts
+in memory until they're flushed to the TopicKeyPhraseCounts rollup (see TwitterRollups.sql) in one batch.
+
+A phrase is dropped if it mentions the topic itself (matched case-insensitively, and ignoring spacing and
+punctuation between the topic's words, so "Gun Control", "gun-control" and "#GunControl" all match "gun
+control"), or if it's a stop phrase: filler Azure and the local analyzer tend to pick up from tweets, like
+link fragments and "RT".
+
+@author Abigail Goodwin <abby.goodwin@outlook.com>
+Copyright 2024, Abigail Goodwin, All rights reserved.
+"""
+
+import re
+from collections import Counter
+from functools import lru_cache
+
+# Phrases that say nothing about a topic (compared case-insensitively):
+DEFAULT_STOP_PHRASES = frozenset({
+    "rt", "amp", "http", "https", "t.co", "https t.co", "via", "lol", "lmao", "omg", "smh", "tbh", "imo",
+    "people", "thing", "things", "today", "time", "day", "way", "lot", "guys", "everyone", "someone",
+    "anyone", "thread", "tweet", "tweets", "twitter", "retweet", "link", "video", "pic", "post"
+})
+
+# Phrases made only of links, mentions, numbers or punctuation are junk. Links and mentions are removed
+# first, so JUNK_PATTERN is a single character class: alternating between overlapping repeated groups
+# backtracks exponentially on long runs of punctuation or numbers followed by a word.
+LINK_PATTERN = re.compile(r"https?://\S*|t\.co/\S*|@\w+")
+JUNK_PATTERN = re.compile(r"[\d\W_]*")
+
+# Stop phrases used by new KeywordEngines (see add_stop_phrases):
+_stop_phrases = set(DEFAULT_STOP_PHRASES)
+
+
+def add_stop_phrases(phrases) -> None:
+    """
+    Adds to the stop phrases every KeywordEngine created from now on uses.
+
+    @param phrases: Iterable of phrases.
+    """
+    _stop_phrases.update(phrase.strip().casefold() for phrase in phrases if phrase.strip())
+
+
+def read_stop_phrases(path) -> list:
+    """
+    @param path: A file with one stop phrase per line (blank lines and lines starting with "#" are skipped).
+    @return List of the file's phrases.
+    """
+    with open(path) as file:
+        return [line.strip() for line in file if line.strip() and not line.lstrip().startswith("#")]
+
+
+@lru_cache(maxsize=256)
+def topic_matcher(topic):
+    """
+    @param topic: String; a topic.
+    @return Compiled pattern matching the topic anywhere in a phrase, case-insensitively, with any spacing or
+            punctuation (or none) between its words.
+    """
+    words = re.findall(r"\w+", topic)
+    if not words:
+        return re.compile(re.escape(topic.strip()), re.IGNORECASE)
+    return re.compile(r"[\W_]*".join(re.escape(word) for word in words), re.IGNORECASE)
+
+
+class KeywordEngine:
+    """
+    Filters key phrases and batches their per-topic counts. Used by one DataExporter, on its own thread.
+    """
+
+    def __init__(self, stop_phrases=None):
+        """
+        Constructor.
+
+        @param stop_phrases: (If given) the stop phrases to use; DEFAULT_STOP_PHRASES (plus any added with
+                             add_stop_phrases) otherwise.
+        """
+        if stop_phrases is None:
+            stop_phrases = _stop_phrases
+        self.stop_phrases = frozenset(phrase.strip().casefold() for phrase in stop_phrases)
+        self.pending = {}           # Topic -> Counter of KeyPhraseID -> new tweets, since the last flush
+
+    def is_kept(self, topic, phrase) -> bool:
+        """
+        @param topic: String; the topic the phrase's tweet was pulled for (None to skip the topic check).
+        @param phrase: A key phrase.
+        @return Whether the phrase should be stored.
+        """
+        folded = phrase.strip().casefold()
+        if not folded or folded in self.stop_phrases or JUNK_PATTERN.fullmatch(LINK_PATTERN.sub(" ", folded)):
+            return False
+        return topic is None or topic_matcher(topic).search(phrase) is None
+
+    def filter_phrases(self, topic, phrases) -> list:
+        """
+        @param topic: String; the topic the tweet was pulled for (None to skip the topic check).
+        @param phrases: A tweet's key phrases.
+        @return The phrases worth storing, without repeats, in their original order.
+        """
+        return [phrase for phrase in dict.fromkeys(phrases) if self.is_kept(topic, phrase)]
+
+    def record(self, topic, phrase_counts) -> None:
+        """
+        Adds to a topic's pending phrase counts.
+
+        @param topic: String; the topic.
+        @param phrase_counts: Mapping of KeyPhraseID -> how many newly stored tweets have the phrase.
+        """
+        self.pending.setdefault(topic, Counter()).update(phrase_counts)
+
+    def flush(self, cursor) -> int:
+        """
+        Folds every pending count into TopicKeyPhraseCounts with one batched upsert. Doesn't commit; call it
+        inside the transaction that stored the counted tweets.
+
+        @param cursor: Cursor on the database to write to.
+        @return The number of rows upserted.
+        """
+        rows = [(topic, phrase_id, count) for topic, phrase_counts in self.pending.items()
+                for phrase_id, count in phrase_counts.items()]
+        cursor.executemany("""
+            INSERT INTO TopicKeyPhraseCounts (TweetTopic, KeyPhraseID, TweetCount)
+            VALUES (?, ?, ?)
+            ON CONFLICT (TweetTopic, KeyPhraseID) DO UPDATE SET TweetCount = TweetCount + excluded.TweetCount
+        """, rows)
+        self.pending.clear()
+        return len(rows)
+
+    def discard(self) -> None:
+        """
+        Drops the pending counts (e.g. when their transaction was rolled back).
+        """
+        self.pending.clear()
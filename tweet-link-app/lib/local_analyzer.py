@@ -0,0 +1,261 @@
+"""
+local_analyzer: an offline, CPU-only stand-in for Azure's sentiment analysis and key-phrase extraction.
+
+Sentiment comes from a word-valence lexicon (with simple negation handling) and key phrases from a
+RAKE-style statistical extractor. Both score a whole batch of tweets at once with NumPy, and return
+the same overall_sentiment / confidence_scores / key_phrases shape as the Azure backend.
+
+@author Abigail Goodwin <abby.goodwin@outlook.com>
+Copyright 2024, Abigail Goodwin, All rights reserved.
+"""
+
+import re
+
+import numpy as np
+
+from lib.near_duplicates import URL_PATTERN
+from lib.sentiment_analyzer import TweetAnalyzer
+
+# Tokens: words (with inner apostrophes), hashtags, mentions and URLs (the last two get dropped). [^\W_] is
+# any Unicode letter or digit, so accented and non-Latin words stay whole:
+TOKEN_PATTERN = re.compile(URL_PATTERN.pattern + r"|@\w+|#?[^\W_]+(?:'[^\W_]+)?")
+
+# Phrase boundaries for key-phrase extraction (URLs end a phrase too, so they're dropped first):
+BOUNDARY_PATTERN = re.compile(r"[.!?,;:()\[\]\"\n]+")
+
+NEGATORS = frozenset([
+    "not", "no", "never", "neither", "nor", "none", "nothing", "nobody", "cannot", "can't", "don't",
+    "doesn't", "didn't", "isn't", "aren't", "wasn't", "weren't", "won't", "wouldn't", "shouldn't",
+    "couldn't", "hardly", "barely"
+])
+
+STOPWORDS = frozenset([
+    "a", "about", "above", "after", "again", "against", "all", "am", "an", "and", "any", "are", "as", "at",
+    "be", "because", "been", "before", "being", "below", "between", "both", "but", "by", "can", "could",
+    "did", "do", "does", "doing", "down", "during", "each", "few", "for", "from", "further", "get", "got",
+    "had", "has", "have", "having", "he", "her", "here", "hers", "herself", "him", "himself", "his", "how",
+    "i", "if", "in", "into", "is", "it", "it's", "its", "itself", "just", "let", "like", "me", "more",
+    "most", "my", "myself", "now", "of", "off", "on", "once", "only", "or", "other", "our", "ours",
+    "ourselves", "out", "over", "own", "rt", "same", "she", "should", "so", "some", "such", "than",
+    "that", "the", "their", "theirs", "them", "themselves", "then", "there", "these", "they", "this",
+    "those", "through", "to", "too", "under", "until", "up", "very", "was", "we", "were", "what", "when",
+    "where", "which", "while", "who", "whom", "why", "will", "with", "would", "you", "your", "yours",
+    "yourself", "yourselves", "also", "amp", "im", "i'm", "you're", "we're", "they're", "that's",
+    "there's", "what's", "via", "yet", "still", "even", "much", "many", "really", "one", "two", "said"
+]) | NEGATORS
+
+# Word valence in [-1, 1]. Deliberately small; pass a bigger lexicon (e.g. VADER's) to LocalAnalyzer.
+DEFAULT_LEXICON = {
+    # Positive:
+    "good": 0.5, "great": 0.8, "excellent": 0.9, "amazing": 0.8, "awesome": 0.8, "love": 0.8,
+    "loved": 0.8, "loving": 0.7, "like": 0.3, "liked": 0.3, "best": 0.8, "better": 0.4, "happy": 0.7,
+    "glad": 0.6, "nice": 0.5, "wonderful": 0.8, "fantastic": 0.8, "beautiful": 0.7, "win": 0.6,
+    "won": 0.6, "winning": 0.6, "success": 0.7, "successful": 0.7, "support": 0.4, "supports": 0.4,
+    "safe": 0.5, "safety": 0.4, "protect": 0.4, "protected": 0.4, "hope": 0.5, "hopeful": 0.6,
+    "thank": 0.6, "thanks": 0.6, "grateful": 0.7, "proud": 0.6, "agree": 0.4, "right": 0.2,
+    "effective": 0.6, "benefit": 0.5, "benefits": 0.5, "positive": 0.6, "free": 0.3, "freedom": 0.5,
+    "fair": 0.4, "helpful": 0.6, "help": 0.3, "helps": 0.3, "important": 0.3, "progress": 0.5,
+    "strong": 0.4, "care": 0.4, "kind": 0.5, "respect": 0.5, "celebrate": 0.7, "excited": 0.7,
+    "fun": 0.6, "healthy": 0.6, "improve": 0.5, "improved": 0.5, "recommend": 0.5, "yes": 0.2,
+    "perfect": 0.9, "brilliant": 0.8, "enjoy": 0.6, "enjoyed": 0.6, "peace": 0.6, "trust": 0.5,
+    # Negative:
+    "bad": -0.6, "terrible": -0.9, "awful": -0.9, "horrible": -0.9, "worst": -0.9, "worse": -0.6,
+    "hate": -0.8, "hated": -0.8, "hates": -0.8, "sad": -0.6, "angry": -0.7, "anger": -0.6,
+    "kill": -0.8, "killed": -0.8, "killing": -0.8, "death": -0.7, "dead": -0.7, "die": -0.7,
+    "dying": -0.7, "danger": -0.6, "dangerous": -0.7, "unsafe": -0.6, "fear": -0.6, "scared": -0.6,
+    "afraid": -0.6, "wrong": -0.5, "fail": -0.6, "failed": -0.6, "failure": -0.7, "lie": -0.6,
+    "lies": -0.6, "liar": -0.7, "corrupt": -0.7, "evil": -0.8, "stupid": -0.7, "disgusting": -0.8,
+    "shame": -0.6, "shameful": -0.7, "violence": -0.7, "violent": -0.7, "attack": -0.6,
+    "crisis": -0.6, "problem": -0.4, "problems": -0.4, "harm": -0.6, "harmful": -0.6, "sick": -0.5,
+    "disease": -0.5, "against": -0.2, "ban": -0.4, "banned": -0.4, "oppose": -0.4, "crazy": -0.4,
+    "ridiculous": -0.6, "pathetic": -0.7, "cruel": -0.8, "tragic": -0.7, "tragedy": -0.7,
+    "murder": -0.9, "abuse": -0.8, "threat": -0.6, "worried": -0.5, "worry": -0.4, "unfair": -0.6,
+    "disappointed": -0.6, "useless": -0.7, "sucks": -0.6, "no": -0.2, "damn": -0.4, "scam": -0.7
+}
+
+# Scores below this (in absolute valence mass) leave a tweet mostly neutral:
+NEUTRAL_PRIOR = 0.6
+
+# A tweet is "mixed" when both its positive and negative confidence reach this:
+MIXED_THRESHOLD = 0.3
+
+
+class LocalAnalyzer(TweetAnalyzer):
+    """
+    Lexicon-based sentiment and RAKE-style key phrases, scored for a whole batch with NumPy.
+    """
+
+    def __init__(self, lexicon=None, max_key_phrases=5):
+        """
+        Constructor.
+
+        @param lexicon: (If given) Python dictionary of word -> valence in [-1, 1]; DEFAULT_LEXICON otherwise.
+        @param max_key_phrases: The most key phrases returned per tweet.
+        """
+        self.lexicon = dict(lexicon or DEFAULT_LEXICON)
+        self.max_key_phrases = max_key_phrases
+
+        # Vocabulary shared across batches; index 0 is reserved for "not in the lexicon":
+        self.vocabulary = {}
+        self.valences = [0.0]
+        for word, valence in self.lexicon.items():
+            self.word_index(word, valence)
+
+    def word_index(self, word, valence=0.0) -> int:
+        """
+        @return The word's index in the shared vocabulary (adding it if needed).
+        """
+        index = self.vocabulary.get(word)
+        if index is None:
+            index = len(self.valences)
+            self.vocabulary[word] = index
+            self.valences.append(valence)
+        return index
+
+    def analyze(self, tweet_list):
+        """
+        Analyzes a list of tweets for their sentiment and key phrases.
+
+        @param tweet_list: A list of tweets.
+        @return tweet_results: List of Python dictionaries, in the same order as tweet_list.
+        """
+        if not tweet_list:
+            return []
+
+        sentiments, confidence_scores = self.score_sentiments(
+            [tweet['text'] for tweet in tweet_list])
+        key_phrases = self.extract_key_phrases(
+            [tweet['text'] for tweet in tweet_list])
+
+        tweet_results = []
+        for index, tweet in enumerate(tweet_list):
+            tweet_info = {}
+            tweet_info['id'] = str(tweet['id'])
+            tweet_info['overall_sentiment'] = sentiments[index]
+            tweet_info['confidence_scores'] = {
+                'positive': float(confidence_scores[index, 0]),
+                'neutral': float(confidence_scores[index, 1]),
+                'negative': float(confidence_scores[index, 2])
+            }
+            tweet_info['key_phrases'] = key_phrases[index]
+            tweet_results.append(tweet_info)
+
+        return tweet_results
+
+    ############################################################
+    #   Sentiment
+    ############################################################
+
+    def score_sentiments(self, texts):
+        """
+        Scores every text's sentiment at once.
+
+        @param texts: List of tweet texts.
+        @return (sentiments, confidence_scores); a list of labels and an (n, 3) array of
+                positive/neutral/negative confidences (each row sums to 1, rounded to 2 places).
+        """
+        # Step 1: Flatten every tweet's tokens into parallel arrays (document number, word index, negator):
+        doc_ids = []
+        word_ids = []
+        negators = []
+        for doc_id, text in enumerate(texts):
+            for token in TOKEN_PATTERN.findall(text.lower()):
+                if token.startswith(("http", "@")):
+                    continue
+                token = token.lstrip("#")
+                doc_ids.append(doc_id)
+                word_ids.append(self.vocabulary.get(token, 0))
+                negators.append(token in NEGATORS)
+
+        doc_ids = np.asarray(doc_ids, dtype=np.int64)
+        word_ids = np.asarray(word_ids, dtype=np.int64)
+        negators = np.asarray(negators, dtype=bool)
+        valences = np.asarray(self.valences)[word_ids] if len(word_ids) else np.zeros(0)
+
+        # Step 2: A negator flips the word right after it (within the same tweet):
+        if len(valences) > 1:
+            negated = np.zeros(len(valences), dtype=bool)
+            negated[1:] = negators[:-1] & (doc_ids[1:] == doc_ids[:-1])
+            valences = np.where(negated, -valences, valences)
+
+        # Step 3: Sum positive and negative valence per tweet:
+        num_docs = len(texts)
+        positive = np.bincount(doc_ids, weights=np.clip(valences, 0, None), minlength=num_docs)
+        negative = np.bincount(doc_ids, weights=np.clip(-valences, 0, None), minlength=num_docs)
+        neutral = np.full(num_docs, NEUTRAL_PRIOR)
+
+        masses = np.stack([positive, neutral, negative], axis=1)
+        confidence_scores = np.round(masses / masses.sum(axis=1, keepdims=True), 2)
+
+        # Step 4: Label each tweet by its strongest score (or "mixed" if it's strongly both ways):
+        labels = np.array(["positive", "neutral", "negative"])
+        sentiments = labels[np.argmax(confidence_scores, axis=1)].astype(object)
+        mixed = (confidence_scores[:, 0] >= MIXED_THRESHOLD) & (
+            confidence_scores[:, 2] >= MIXED_THRESHOLD)
+        sentiments[mixed] = "mixed"
+
+        return list(sentiments), confidence_scores
+
+    ############################################################
+    #   Key Phrases
+    ############################################################
+
+    def extract_key_phrases(self, texts):
+        """
+        RAKE-style key-phrase extraction: candidate phrases are runs of non-stopwords, each word is
+        scored by degree / frequency over the whole batch, and a phrase scores the sum of its words.
+
+        @param texts: List of tweet texts.
+        @return List of key-phrase lists (best first), one per text.
+        """
+        # Step 1: Split every tweet into candidate phrases, tracking which phrase each word is in:
+        phrases = []            # (doc id, phrase text)
+        phrase_ids = []         # per word
+        word_ids = []           # per word
+        phrase_lengths = []     # per phrase
+        words = {}
+        for doc_id, text in enumerate(texts):
+            for fragment in BOUNDARY_PATTERN.split(URL_PATTERN.sub(".", text.lower())):
+                current = []
+                for token in TOKEN_PATTERN.findall(fragment) + [None]:
+                    if token is not None and token.startswith(("http", "@")):
+                        token = None
+                    if token is not None:
+                        token = token.lstrip("#")
+                    if token is None or token in STOPWORDS or token.isdigit():
+                        if current:
+                            phrase_id = len(phrases)
+                            phrases.append((doc_id, " ".join(current)))
+                            phrase_lengths.append(len(current))
+                            for word in current:
+                                phrase_ids.append(phrase_id)
+                                word_ids.append(words.setdefault(word, len(words)))
+                            current = []
+                        continue
+                    current.append(token)
+
+        key_phrases = [[] for _ in texts]
+        if not phrases:
+            return key_phrases
+
+        phrase_ids = np.asarray(phrase_ids, dtype=np.int64)
+        word_ids = np.asarray(word_ids, dtype=np.int64)
+        phrase_lengths = np.asarray(phrase_lengths, dtype=np.float64)
+
+        # Step 2: Word frequency and degree (co-occurrence within phrases) across the batch:
+        frequency = np.bincount(word_ids, minlength=len(words)).astype(np.float64)
+        degree = np.bincount(word_ids, weights=phrase_lengths[phrase_ids], minlength=len(words))
+        word_scores = degree / frequency
+
+        # Step 3: Phrase score = sum of its words' scores:
+        phrase_scores = np.bincount(phrase_ids, weights=word_scores[word_ids], minlength=len(phrases))
+
+        # Step 4: Best phrases per tweet (sorted by tweet, then score descending):
+        doc_ids = np.asarray([doc_id for doc_id, _ in phrases], dtype=np.int64)
+        for phrase_id in np.lexsort((-phrase_scores, doc_ids)):
+            doc_id, phrase = phrases[phrase_id]
+            tweet_phrases = key_phrases[doc_id]
+            if len(tweet_phrases) < self.max_key_phrases and phrase not in tweet_phrases:
+                tweet_phrases.append(phrase)
+
+        return key_phrases
@@ -0,0 +1,311 @@
+"""
+metrics: counters, latency histograms and in-flight gauges for each stage of an import (X API requests,
+analysis, SQLite writes), exportable as a Prometheus text file or a JSON snapshot. Also has a cProfile hook.
+
+Metrics are off until enable() is called; until then every instrumentation call (inc, observe, timed,
+in_flight, ...) returns straight away, so instrumented code pays about one function call.
+
+@author Abigail Goodwin <abby.goodwin@outlook.com>
+Copyright 2024, Abigail Goodwin, All rights reserved.
+"""
+
+import cProfile
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+
+logger = logging.getLogger(__name__)
+
+# Every metric the app records: name -> (type, help text). Histograms are in seconds.
+METRICS = {
+    "x_api_requests_total": ("counter", "X API requests made, by HTTP status."),
+    "x_api_request_errors_total": ("counter", "X API requests that failed without a response, by error."),
+    "x_api_retries_total": ("counter", "X API requests retried after a 429, 5xx or connection error."),
+    "x_api_request_seconds": ("histogram", "X API request latency."),
+    "x_api_response_bytes_total": ("counter", "Bytes of X API responses received."),
+    "x_api_requests_in_flight": ("gauge", "X API requests currently waiting on a response."),
+    "x_api_rate_limit_wait_seconds_total": ("counter", "Time spent waiting for the X rate-limit window."),
+    "analysis_seconds": ("histogram", "Time to analyze one list of tweets, by backend."),
+    "analysis_tweets_total": ("counter", "Tweets analyzed, by backend."),
+    "analysis_cache_hits_total": ("counter", "Tweets whose analysis came from the cache."),
+    "analysis_cache_misses_total": ("counter", "Tweets that had to be analyzed."),
+    "azure_batch_seconds": ("histogram", "Azure analyze-actions request latency (one batch)."),
+    "azure_batches_in_flight": ("gauge", "Azure batches currently being analyzed."),
+    "azure_documents_total": ("counter", "Documents sent to Azure."),
+    "azure_document_errors_total": ("counter", "Documents Azure could not analyze."),
+    "worker_pages_in_flight": ("gauge", "Pages queued on or being processed by worker processes."),
+    "worker_pool_restarts_total": ("counter", "Times the worker process pool was rebuilt after a crash."),
+    "db_page_write_seconds": ("histogram", "Time to write one page of tweets (one transaction)."),
+    "db_commit_seconds": ("histogram", "Time spent committing a page's transaction."),
+    "db_duplicate_check_seconds": ("histogram", "Time to check a page for already-stored tweets."),
+    "db_pages_written_total": ("counter", "Pages written to SQLite."),
+    "db_rows_written_total": ("counter", "Rows inserted or updated in SQLite (all tables)."),
+    "db_tweets_stored_total": ("counter", "New tweets stored, by topic."),
+    "db_rollbacks_total": ("counter", "Page transactions rolled back after an SQLite error.")
+}
+
+# Histogram bucket upper bounds, in seconds:
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Whether instrumentation records anything (see enable/disable):
+enabled = False
+
+
+def label_key(labels) -> tuple:
+    """
+    @return The labels as a hashable, ordered key.
+    """
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def format_labels(key, extra=()) -> str:
+    """
+    @return Prometheus label syntax, e.g. {status="200"} (empty for no labels).
+    """
+    pairs = [(name, value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n"))
+             for name, value in tuple(key) + tuple(extra)]
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}" if pairs else ""
+
+
+############################################################
+#   Registry
+############################################################
+
+class MetricsRegistry:
+    """
+    Holds the current value of every metric (per label set). Safe to update from any thread.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """
+        Constructor.
+
+        @param buckets: Histogram bucket upper bounds, in seconds.
+        """
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.values = {}            # (name, label key) -> number, or [bucket counts, sum, count] for histograms
+        self.started_at = time.time()
+
+    def add(self, name, value, labels) -> None:
+        """
+        Adds value to a counter or gauge.
+        """
+        key = (name, label_key(labels))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+    def set(self, name, value, labels) -> None:
+        """
+        Sets a gauge.
+        """
+        key = (name, label_key(labels))
+        with self.lock:
+            self.values[key] = value
+
+    def observe(self, name, value, labels) -> None:
+        """
+        Records one observation in a histogram.
+        """
+        key = (name, label_key(labels))
+        bucket_index = bisect_left(self.buckets, value)
+        with self.lock:
+            histogram = self.values.get(key)
+            if histogram is None:
+                histogram = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            histogram[0][bucket_index] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def snapshot(self) -> dict:
+        """
+        @return Python dictionary; metric name -> {'type', 'help', 'values'}. Each value has its 'labels',
+                and either a 'value' or a histogram's 'count', 'sum' and cumulative 'buckets'.
+        """
+        with self.lock:
+            values = {key: ([list(value[0]), value[1], value[2]] if isinstance(value, list) else value)
+                      for key, value in self.values.items()}
+
+        metrics = {}
+        for (name, key), value in sorted(values.items()):
+            metric_type, help_text = METRICS.get(name, ("untyped", ""))
+            metric = metrics.setdefault(name, {'type': metric_type, 'help': help_text, 'values': []})
+            if metric_type == "histogram":
+                bucket_counts, total, count = value
+                cumulative = 0
+                buckets = {}
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), bucket_counts):
+                    cumulative += bucket_count
+                    buckets["+Inf" if bound == float("inf") else repr(bound)] = cumulative
+                metric['values'].append({'labels': dict(key), 'count': count, 'sum': total, 'buckets': buckets})
+            else:
+                metric['values'].append({'labels': dict(key), 'value': value})
+
+        return metrics
+
+    def to_json(self) -> dict:
+        """
+        @return A JSON-ready snapshot, with the time it was taken and when recording started.
+        """
+        return {'timestamp': time.time(), 'started_at': self.started_at, 'metrics': self.snapshot()}
+
+    def to_prometheus(self) -> str:
+        """
+        @return The metrics in Prometheus' text exposition format.
+        """
+        lines = []
+        for name, metric in self.snapshot().items():
+            lines.append(f"# HELP {name} {metric['help']}")
+            lines.append(f"# TYPE {name} {metric['type']}")
+            for value in metric['values']:
+                key = tuple(value['labels'].items())
+                if metric['type'] == "histogram":
+                    for bound, count in value['buckets'].items():
+                        lines.append(f"{name}_bucket{format_labels(key, [('le', bound)])} {count}")
+                    lines.append(f"{name}_sum{format_labels(key)} {value['sum']}")
+                    lines.append(f"{name}_count{format_labels(key)} {value['count']}")
+                else:
+                    lines.append(f"{name}{format_labels(key)} {value['value']}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path) -> None:
+        """
+        Writes the metrics to a file (atomically, so collectors never read half a file): JSON for a .json
+        path, Prometheus text (e.g. for node_exporter's textfile collector) otherwise.
+        """
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w") as metrics_file:
+            if str(path).endswith(".json"):
+                json.dump(self.to_json(), metrics_file, indent=2)
+            else:
+                metrics_file.write(self.to_prometheus())
+        os.replace(temp_path, path)
+
+
+_default_registry = None
+
+
+def default_registry() -> MetricsRegistry:
+    """
+    @return The registry instrumentation records into (created on first use).
+    """
+    global _default_registry
+    if _default_registry is None:
+        _default_registry = MetricsRegistry()
+    return _default_registry
+
+
+def enable(registry=None) -> MetricsRegistry:
+    """
+    Turns recording on.
+
+    @param registry: (If given) the registry to record into from now on.
+    @return The registry being recorded into.
+    """
+    global enabled, _default_registry
+    if registry is not None:
+        _default_registry = registry
+    enabled = True
+    return default_registry()
+
+
+def disable() -> None:
+    """
+    Turns recording off (recorded values are kept).
+    """
+    global enabled
+    enabled = False
+
+
+############################################################
+#   Instrumentation
+############################################################
+
+def inc(name, value=1, **labels) -> None:
+    """
+    Adds to a counter (or gauge).
+    """
+    if enabled:
+        default_registry().add(name, value, labels)
+
+
+def set_gauge(name, value, **labels) -> None:
+    """
+    Sets a gauge.
+    """
+    if enabled:
+        default_registry().set(name, value, labels)
+
+
+def observe(name, seconds, **labels) -> None:
+    """
+    Records a duration in a histogram.
+    """
+    if enabled:
+        default_registry().observe(name, seconds, labels)
+
+
+@contextmanager
+def _timer(name, labels):
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        default_registry().observe(name, time.perf_counter() - start_time, labels)
+
+
+@contextmanager
+def _in_flight(name, labels):
+    registry = default_registry()
+    registry.add(name, 1, labels)
+    try:
+        yield
+    finally:
+        registry.add(name, -1, labels)
+
+
+_NULL_CONTEXT = nullcontext()
+
+
+def timed(name, **labels):
+    """
+    @return Context manager recording how long its block takes in histogram `name`.
+    """
+    return _timer(name, labels) if enabled else _NULL_CONTEXT
+
+
+def in_flight(name, **labels):
+    """
+    @return Context manager counting its block in gauge `name` while it runs.
+    """
+    return _in_flight(name, labels) if enabled else _NULL_CONTEXT
+
+
+############################################################
+#   Profiling
+############################################################
+
+@contextmanager
+def profiled(path=None):
+    """
+    Runs the block under cProfile (current thread only) and saves the stats to path, for pstats or
+    snakeviz. Does nothing without a path.
+
+    @param path: (If given) where to write the profile.
+    """
+    if path is None:
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        logger.info("Profile written to %s.", path)
@@ -0,0 +1,246 @@
+"""
+near_duplicates: MinHash signatures and a locality-sensitive index for spotting near-duplicate tweets
+(quote spam, copies with a word, hashtag or link changed), so each cluster of them is only analyzed once.
+
+A tweet's signature is a MinHash of its normalized words and word pairs, which estimates how much two
+tweets' wording overlaps (Jaccard similarity). The index splits signatures into bands and only compares
+tweets that share a band, which near-duplicates almost always do and unrelated tweets almost never do.
+
+@author Abigail Goodwin <abby.goodwin@outlook.com>
+Copyright 2024, Abigail Goodwin, All rights reserved.
+"""
+
+import hashlib
+import re
+from functools import lru_cache
+
+import numpy as np
+
+# Links (t.co links differ on every copy of a tweet) and mentions vary between copies of the same spam,
+# so they're masked out. URL_PATTERN is shared with analysis_cache's keys and local_analyzer's phrases:
+URL_PATTERN = re.compile(r"https?://\S+")
+MENTION_PATTERN = re.compile(r"@\w+")
+TOKEN_PATTERN = re.compile(r"\w+")
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+# Tweets whose wording overlaps at least this much are near-duplicates. Changing one word of a typical
+# tweet leaves ~0.8, adding a hashtag ~0.95; unrelated tweets on the same topic are well under 0.2:
+MIN_SIMILARITY = 0.7
+
+# Signature length, and how it's split into bands (NUM_BANDS * BAND_ROWS == NUM_PERMUTATIONS). Pairs at
+# MIN_SIMILARITY share a band 99% of the time; pairs at 0.2 only 2.5% of the time:
+NUM_PERMUTATIONS = 64
+NUM_BANDS = 16
+BAND_ROWS = 4
+
+# One seed per permutation, fixed so signatures stay comparable across runs:
+_SEEDS = np.random.default_rng(20240301).integers(0, 1 << 63, NUM_PERMUTATIONS, dtype=np.uint64)
+
+
+def _mix(values):
+    """
+    @return The splitmix64 finalizer applied to an array of uint64s (multiplications wrap, as intended).
+    """
+    values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+def normalize_text(text) -> str:
+    """
+    Normalizes a tweet's text for cache lookups and exact-duplicate grouping: URLs are masked, whitespace
+    collapsed, and case folded.
+
+    @param text: The tweet's text.
+    """
+    text = URL_PATTERN.sub("http", text)
+    text = WHITESPACE_PATTERN.sub(" ", text)
+    return text.strip().casefold()
+
+
+def normalize_for_matching(text) -> list:
+    """
+    @param text: The tweet's text.
+    @return The text's words, case-folded, without links or mentions.
+    """
+    return TOKEN_PATTERN.findall(MENTION_PATTERN.sub(" ", URL_PATTERN.sub(" ", text.casefold())))
+
+
+def shingles(text) -> set:
+    """
+    @param text: The tweet's text.
+    @return The set of the text's normalized words and pairs of adjacent words.
+    """
+    words = normalize_for_matching(text)
+    return set(words) | {f"{first} {second}" for first, second in zip(words, words[1:])}
+
+
+@lru_cache(maxsize=8192)
+def signature(text) -> bytes:
+    """
+    @param text: The tweet's text.
+    @return Its MinHash signature (NUM_PERMUTATIONS 64-bit values, packed).
+    """
+    features = shingles(text) or {""}
+    hashes = np.frombuffer(b"".join(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+                                    for feature in features), dtype=np.uint64)
+    # Each seed gives an independent ordering of the features; the signature keeps each one's minimum:
+    return _mix(hashes[:, np.newaxis] ^ _SEEDS).min(axis=0).tobytes()
+
+
+def similarity(first, second) -> float:
+    """
+    @return Two signatures' estimated Jaccard similarity (the share of their values that agree).
+    """
+    return float(np.mean(np.frombuffer(first, dtype=np.uint64) == np.frombuffer(second, dtype=np.uint64)))
+
+
+def bands(signature_bytes) -> list:
+    """
+    @return List of (band number, band value) pairs for a signature; band values are signed 64-bit hashes.
+    """
+    width = BAND_ROWS * 8
+    return [(band, int.from_bytes(hashlib.blake2b(signature_bytes[band * width:(band + 1) * width],
+                                                  digest_size=8).digest(), "big", signed=True))
+            for band in range(NUM_BANDS)]
+
+
+def cluster(signatures, min_similarity=MIN_SIMILARITY) -> list:
+    """
+    Greedily groups signatures: each joins the first earlier representative it's similar enough to, or
+    becomes a representative itself.
+
+    @param signatures: List of signatures.
+    @return List; the index of each signature's representative (its own index for representatives).
+    """
+    buckets = {}
+    representatives = []
+    for index, signature_bytes in enumerate(signatures):
+        signature_bands = bands(signature_bytes)
+        representative = next((candidate for band in signature_bands for candidate in buckets.get(band, ())
+                               if similarity(signature_bytes, signatures[candidate]) >= min_similarity), None)
+        if representative is None:
+            representative = index
+            for band in signature_bands:
+                buckets.setdefault(band, []).append(index)
+        representatives.append(representative)
+    return representatives
+
+
+def phrases_in_text(key_phrases, text) -> list:
+    """
+    Near-duplicates share a result, but not necessarily every word, so key phrases copied from another
+    text are only kept if they appear in this one.
+
+    @param key_phrases: List of key phrases (e.g. a cluster representative's).
+    @param text: The tweet's text.
+    @return The key phrases that occur in the text (ignoring case), in their original order.
+    """
+    folded_text = text.casefold()
+    return [key_phrase for key_phrase in key_phrases if key_phrase.casefold() in folded_text]
+
+
+def cluster_id(text_hash) -> int:
+    """
+    @param text_hash: The analysis cache key of a cluster's representative text.
+    @return A signed 64-bit ID for the cluster (e.g. for Tweets.ClusterID).
+    """
+    return int.from_bytes(bytes.fromhex(text_hash[:16]), "big", signed=True)
+
+
+############################################################
+#   Persistent Index
+############################################################
+
+class NearDuplicateIndex:
+    """
+    Signatures of already-analyzed texts, kept in SQLite (next to the analysis cache) so near-duplicates
+    are recognized across runs. Expects its caller to hold the connection's lock and to commit.
+    """
+
+    def __init__(self, connection, min_similarity=MIN_SIMILARITY):
+        """
+        Constructor; creates the index's tables if needed.
+
+        @param connection: The SQLite connection to keep the index in.
+        @param min_similarity: How much two texts' wording must overlap to count as near-duplicates.
+        """
+        self.connection = connection
+        self.min_similarity = min_similarity
+
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS MinHashes
+            (
+                TextHash char(64) PRIMARY KEY NOT NULL,
+                Signature blob NOT NULL
+            )
+        """)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS MinHashBands
+            (
+                Band int NOT NULL,
+                BandValue int NOT NULL,
+                TextHash char(64) NOT NULL,
+                PRIMARY KEY (Band, BandValue, TextHash)
+            ) WITHOUT ROWID
+        """)
+
+    def find(self, signature_bytes):
+        """
+        @param signature_bytes: A text's signature.
+        @return The TextHash of the most similar indexed text (at least min_similarity), or None.
+        """
+        # One query for all of the signature's bands (a text sharing several comes back once). The bands are
+        # joined from a VALUES list, which SQLite looks up through the primary key; "(Band, BandValue) IN
+        # (VALUES ...)" would scan the whole table instead:
+        signature_bands = bands(signature_bytes)
+        placeholders = ", ".join(["(?, ?)"] * len(signature_bands))
+        best = None
+        for text_hash, indexed in self.connection.execute(f"""
+            WITH SignatureBands (Band, BandValue) AS (VALUES {placeholders})
+            SELECT DISTINCT M.TextHash, M.Signature
+            FROM SignatureBands AS S
+                INNER JOIN MinHashBands AS B
+                    ON B.Band = S.Band AND B.BandValue = S.BandValue
+                INNER JOIN MinHashes AS M
+                    ON B.TextHash = M.TextHash
+        """, [value for band in signature_bands for value in band]):
+            score = similarity(signature_bytes, indexed)
+            if score >= self.min_similarity and (best is None or score > best[0]):
+                best = (score, text_hash)
+        return best[1] if best is not None else None
+
+    def add(self, rows) -> None:
+        """
+        @param rows: Iterable of (TextHash, signature) pairs to index.
+        """
+        rows = list(rows)
+        self.connection.executemany("""
+            INSERT INTO MinHashes (TextHash, Signature) VALUES (?, ?)
+            ON CONFLICT (TextHash) DO NOTHING
+        """, rows)
+        self.connection.executemany("""
+            INSERT INTO MinHashBands (Band, BandValue, TextHash) VALUES (?, ?, ?)
+            ON CONFLICT (Band, BandValue, TextHash) DO NOTHING
+        """, [(band, band_value, text_hash) for text_hash, signature_bytes in rows
+              for band, band_value in bands(signature_bytes)])
+
+    def remove(self, text_hashes) -> None:
+        """
+        @param text_hashes: Iterable of TextHashes to drop from the index (e.g. evicted cache entries).
+        """
+        text_hashes = list(text_hashes)
+        rows = []
+        for index in range(0, len(text_hashes), 500):
+            hash_chunk = text_hashes[index:index + 500]
+            placeholders = ", ".join("?" * len(hash_chunk))
+            rows.extend(self.connection.execute(f"""
+                SELECT TextHash, Signature FROM MinHashes WHERE TextHash IN ({placeholders})
+            """, hash_chunk))
+
+        self.connection.executemany("""
+            DELETE FROM MinHashBands WHERE Band = ? AND BandValue = ? AND TextHash = ?
+        """, [(band, band_value, text_hash) for text_hash, signature_bytes in rows
+              for band, band_value in bands(signature_bytes)])
+        self.connection.executemany("DELETE FROM MinHashes WHERE TextHash = ?",
+                                    [(text_hash,) for text_hash, _ in rows])
@@ -0,0 +1,268 @@
+"""
+process_pipeline: a multi-process variant of ingest_pipeline for large backfills.
+
+Fetching stays on threads in this process (it's I/O bound, and the rate limit and keep-alive connections
+are per process), but every fetched page is handed, still as raw bytes, to a pool of worker processes that
+decode, split, compress and analyze it - the CPU-bound part of an import, which threads can't spread over
+more than one core. This process stays the only writer: it owns the SQLite connection, tells the workers
+which of each page's tweets are already stored (so they're never analyzed), puts each topic's pages back
+into fetch order, and commits them several pages per transaction.
+
+If a worker process dies, the pool is rebuilt and the pages it had in flight are resubmitted; a page that
+keeps killing workers ends the run after everything before it has been written, so the topic's checkpoint
+resumes at that page.
+
+@author Abigail Goodwin <abby.goodwin@outlook.com>
+Copyright 2024, Abigail Goodwin, All rights reserved.
+"""
+
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import lib.twitter_importer as twitter_importer
+from lib.tweet_splitter import split_page
+from lib.raw_store import RawPayload
+from lib.sentiment_analyzer import analyze_tweets, use_backend
+from lib import metrics
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of a topic's pages on the fetch queue:
+_DONE = object()
+
+
+############################################################
+#   Worker Processes
+############################################################
+
+def init_worker(backend) -> None:
+    """
+    Runs once in each worker process.
+
+    @param backend: The analysis backend to use (see sentiment_analyzer.ANALYZER_BACKENDS).
+    """
+    # Ctrl-C is the parent's to handle; it shuts the pool down itself:
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    use_backend(backend)
+
+
+def process_page(raw_bytes, stored_ids=frozenset()):
+    """
+    Worker side of the pipeline: everything between fetching a page and writing it.
+
+    @param raw_bytes: A search response body, as fetched.
+    @param stored_ids: TweetIDs (as strings) that are already stored; they're dropped from the page unanalyzed.
+    @return (page, tweet_results, seconds spent analyzing)
+    """
+    page = split_page(json.loads(raw_bytes))
+    page.raw_payload = RawPayload.pack(raw_bytes)
+    if stored_ids:
+        page = page.with_tweets([tweet for tweet in page.tweets if str(tweet['id']) not in stored_ids])
+
+    start_time = time.perf_counter()
+    tweet_results = analyze_tweets(page.tweets)
+    return page, tweet_results, time.perf_counter() - start_time
+
+
+############################################################
+#   Pipeline
+############################################################
+
+class ProcessIngestPipeline:
+    """
+    Runs fetch threads, a pool of analysis processes and a single batching writer for many topics.
+    """
+
+    def __init__(self, open_store, backend="azure", client=None, processes=None, max_topics=3,
+                 prefetch_pages=2, batch_pages=8, max_attempts=3):
+        """
+        Constructor.
+
+        @param open_store: Callable() -> (store_pages, stored_tweet_ids). Called once, in this process, which
+                           then owns the store's SQLite connection. store_pages(list of (topic, page,
+                           tweet_sentiments, tweet_keywords)) writes pages; stored_tweet_ids(tweet IDs)
+                           returns the set of those IDs (as strings) that are already stored.
+        @param backend: The analysis backend the workers use.
+        @param client: (If given) the twitter_importer.XClient to fetch with; the shared default otherwise.
+        @param processes: How many worker processes to run (default: one per CPU).
+        @param max_topics: How many topics are fetched at the same time.
+        @param prefetch_pages: How many pages may be queued or in flight per worker process.
+        @param batch_pages: The most pages committed in one transaction.
+        @param max_attempts: How many times a page is tried before a worker crash is treated as fatal.
+        """
+        self.open_store = open_store
+        self.backend = backend
+        self.client = client or twitter_importer.default_client()
+        self.processes = processes or os.cpu_count() or 1
+        self.max_topics = max_topics
+        self.max_pending = max(1, self.processes * prefetch_pages)
+        self.batch_pages = max(1, batch_pages)
+        self.max_attempts = max_attempts
+
+        self.fetch_queue = queue.Queue(maxsize=self.max_pending)
+        self.stop_event = threading.Event()
+
+    def new_pool(self) -> ProcessPoolExecutor:
+        """
+        @return A fresh pool of worker processes. They're spawned rather than forked, since this process
+                has fetch threads and SQLite connections open.
+        """
+        return ProcessPoolExecutor(max_workers=self.processes, mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=init_worker, initargs=(self.backend,))
+
+    def fetch_topic(self, topic, num_desired, checkpoint=None) -> None:
+        """
+        Follows the topic's pagination, queueing (topic, sequence number, raw page, its TweetIDs) for the
+        workers until enough tweets are fetched or the run is stopped.
+
+        @param checkpoint: (If given) the topic's checkpoint (see DataExporter.start_checkpoint); fetching
+                           picks up at its next_token and count, and stops at its since_id.
+        """
+        try:
+            checkpoint = checkpoint or {}
+            tweet_count = checkpoint.get('pass_fetched', 0)
+            next_token = checkpoint.get('next_token')
+            since_id = checkpoint.get('since_id')
+            sequence = 0
+            while tweet_count < num_desired and not self.stop_event.is_set():
+                query_params = twitter_importer.build_search_params(
+                    topic, next_token, max_results=min(100, max(10, num_desired - tweet_count)),
+                    since_id=since_id)
+                raw_bytes = self.client.fetch_raw_page(query_params)
+
+                # Only the pagination and tweet IDs are read here; the workers do the real parsing:
+                response = json.loads(raw_bytes)
+                tweet_ids = [tweet['id'] for tweet in response.get('data', [])]
+                result_count = len(tweet_ids)
+                next_token = response.get('meta', {}).get('next_token')
+
+                self.fetch_queue.put((topic, sequence, raw_bytes, tweet_ids))
+                sequence += 1
+                tweet_count += result_count
+                if next_token is None or result_count == 0:
+                    break
+        except Exception as error:
+            self.fetch_queue.put((topic, None, error, None))
+        finally:
+            self.fetch_queue.put((topic, None, _DONE, None))
+
+    def run(self, topics, num_desired, checkpoints=None) -> dict:
+        """
+        Pulls num_desired tweets for every topic.
+
+        @param topics: List of topic strings.
+        @param num_desired: The number of tweets we want for each topic.
+        @param checkpoints: (If given) Python dictionary; topic -> checkpoint to resume from.
+        @return Python dictionary; topic -> the number of tweets written.
+        """
+        checkpoints = checkpoints or {}
+        store_pages, stored_tweet_ids = self.open_store()
+
+        pool = self.new_pool()
+        fetchers = ThreadPoolExecutor(max_workers=self.max_topics, thread_name_prefix="fetch")
+        fetch_futures = [fetchers.submit(self.fetch_topic, topic, num_desired, checkpoints.get(topic))
+                         for topic in topics]
+
+        fetching = set(topics)
+        pending = {}                                    # Future -> (topic, sequence, raw bytes, stored IDs, attempt)
+        finished = {topic: {} for topic in topics}      # Topic -> sequence -> (page, tweet_results)
+        next_sequence = dict.fromkeys(topics, 0)        # Topic -> the next page to write
+        batch = []
+        counts = dict.fromkeys(topics, 0)
+        try:
+            while fetching or pending or any(finished.values()):
+                # Step 1: Hand fetched pages to the workers (waiting for one only if nothing is in flight):
+                crashed = []
+                while len(pending) < self.max_pending:
+                    try:
+                        topic, sequence, item, tweet_ids = self.fetch_queue.get(block=not pending, timeout=0.1)
+                    except queue.Empty:
+                        break
+                    if item is _DONE:
+                        fetching.discard(topic)
+                    elif isinstance(item, Exception):
+                        raise item
+                    else:
+                        # Tweets that are already stored are never sent for analysis:
+                        with metrics.timed("db_duplicate_check_seconds"):
+                            stored_ids = frozenset(stored_tweet_ids(tweet_ids))
+                        try:
+                            pending[pool.submit(process_page, item, stored_ids)] = (topic, sequence, item,
+                                                                                     stored_ids, 1)
+                        except BrokenProcessPool:
+                            # A worker died while nothing was in flight:
+                            crashed.append((topic, sequence, item, stored_ids, 0))
+                            break
+
+                # Step 2: Collect finished pages; if a worker died, rebuild the pool and resubmit:
+                done, _ = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+                for future in done:
+                    topic, sequence, raw_bytes, stored_ids, attempt = pending.pop(future)
+                    try:
+                        page, tweet_results, seconds = future.result()
+                    except BrokenProcessPool:
+                        crashed.append((topic, sequence, raw_bytes, stored_ids, attempt))
+                        continue
+                    finished[topic][sequence] = (page, tweet_results)
+                    metrics.observe("analysis_seconds", seconds, backend=self.backend)
+                    metrics.inc("analysis_tweets_total", len(page), backend=self.backend)
+
+                if crashed:
+                    # Every page still in flight went down with the pool:
+                    crashed.extend(pending.values())
+                    pending.clear()
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    metrics.inc("worker_pool_restarts_total")
+                    logger.warning("A worker process died; restarting the pool and retrying %d pages.",
+                                   len(crashed), extra={'pages': len(crashed)})
+
+                    pool = self.new_pool()
+                    for topic, sequence, raw_bytes, stored_ids, attempt in crashed:
+                        if attempt >= self.max_attempts:
+                            raise BrokenProcessPool(
+                                f"Page {sequence} of {topic} was in flight for {attempt} worker crashes.")
+                        pending[pool.submit(process_page, raw_bytes, stored_ids)] = (topic, sequence, raw_bytes,
+                                                                                     stored_ids, attempt + 1)
+
+                # Step 3: Queue each topic's pages for the writer in fetch order, so checkpoints never skip one:
+                for topic, pages in finished.items():
+                    while next_sequence[topic] in pages:
+                        page, tweet_results = pages.pop(next_sequence[topic])
+                        batch.append((topic, page, tweet_results, tweet_results))
+                        counts[topic] += len(page)
+                        next_sequence[topic] += 1
+
+                metrics.set_gauge("worker_pages_in_flight", len(pending))
+
+                # Step 4: Commit whole batches, plus whatever is left once the workers are idle:
+                if len(batch) >= self.batch_pages or (batch and not pending):
+                    write_batch, batch = batch, []
+                    store_pages(write_batch)
+        except BaseException:
+            # Everything already in order is still worth keeping:
+            if batch:
+                store_pages(batch)
+            raise
+        finally:
+            self.stop_event.set()
+            pool.shutdown(wait=True, cancel_futures=True)
+            # Drain the queue so no fetch thread stays blocked on it:
+            while not all(future.done() for future in fetch_futures):
+                try:
+                    self.fetch_queue.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            fetchers.shutdown()
+
+        for topic, tweet_count in counts.items():
+            logger.info("Finished %s; %d tweets sent to the writer.", topic, tweet_count,
+                        extra={'topic': topic, 'tweets': tweet_count})
+        return counts
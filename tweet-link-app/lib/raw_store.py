@@ -0,0 +1,110 @@
+"""
+raw_store: compressed copies of the X API's raw search responses. Each fetched page's JSON is kept as one
+zstd (or, without the zstandard package, zlib) blob in the RawPages table, and each stored tweet points at
+its page, so pages can be re-split or re-analyzed later without calling the API again.
+
+@author Abigail Goodwin <abby.goodwin@outlook.com>
+Copyright 2024, Abigail Goodwin, All rights reserved.
+"""
+
+# Python libs:
+import json
+import zlib
+
+# zstd (optional; zlib is used without it):
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Codec used for new payloads:
+DEFAULT_CODEC = "zstd" if zstandard is not None else "zlib"
+
+# Compression levels; both favor speed, since pages are compressed as they're fetched:
+ZSTD_LEVEL = 3
+ZLIB_LEVEL = 6
+
+
+def compress(raw_bytes, codec=DEFAULT_CODEC) -> bytes:
+    """
+    @param raw_bytes: The response body.
+    @param codec: "zstd" or "zlib".
+    @return The compressed blob.
+    """
+    if codec == "zstd":
+        if zstandard is None:
+            raise ImportError("zstandard is not installed; use the \"zlib\" codec.")
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw_bytes)
+    if codec == "zlib":
+        return zlib.compress(raw_bytes, ZLIB_LEVEL)
+    raise ValueError(f"Unknown payload codec {codec!r}.")
+
+
+def decompress(codec, blob) -> bytes:
+    """
+    @param codec: The codec the blob was compressed with.
+    @param blob: The compressed blob.
+    @return The original response body.
+    """
+    if codec == "zstd":
+        if zstandard is None:
+            raise ImportError("zstandard is not installed; it's needed to read zstd payloads.")
+        return zstandard.ZstdDecompressor().decompress(blob)
+    if codec == "zlib":
+        return zlib.decompress(blob)
+    raise ValueError(f"Unknown payload codec {codec!r}.")
+
+
+class RawPayload:
+    """
+    One compressed API response. It's only decompressed and parsed when its contents are first asked for.
+    """
+
+    __slots__ = ("codec", "blob", "raw_size", "decoded")
+
+    def __init__(self, codec, blob, raw_size):
+        """
+        Constructor.
+
+        @param codec: The codec the blob was compressed with.
+        @param blob: The compressed response.
+        @param raw_size: The response's size before compression, in bytes.
+        """
+        self.codec = codec
+        self.blob = blob
+        self.raw_size = raw_size
+        self.decoded = None
+
+    @classmethod
+    def pack(cls, raw_bytes, codec=DEFAULT_CODEC):
+        """
+        @param raw_bytes: A response body, as fetched.
+        @return RawPayload
+        """
+        return cls(codec, compress(raw_bytes, codec), len(raw_bytes))
+
+    def raw_bytes(self) -> bytes:
+        """
+        @return The response body, as fetched.
+        """
+        return decompress(self.codec, self.blob)
+
+    @property
+    def data(self) -> dict:
+        """
+        The decoded response (what fetch_tweets() returns; see split_page). Parsed once, on first access.
+        """
+        if self.decoded is None:
+            self.decoded = json.loads(self.raw_bytes())
+        return self.decoded
+
+    def tweet(self, tweet_id):
+        """
+        @param tweet_id: The tweet to look for.
+        @return The tweet exactly as the API returned it (every field), or None if it isn't in this page.
+        """
+        tweet_id = str(tweet_id)
+        for tweet in self.data.get('data', []):
+            if tweet['id'] == tweet_id:
+                return tweet
+        return None
@@ -1,5 +1,6 @@
 """
-sentiment_analyzer: the file in charge of analyzing tweet sentiment and keywords using Azure Cog Services.
+sentiment_analyzer: the file in charge of analyzing tweet sentiment and keywords using Azure Cog Services
+(or, with use_backend("local"), the offline analyzer in local_analyzer).
 
 @author Abigail Goodwin <abby.goodwin@outlook.com>
 Copyright 2024, Abigail Goodwin, All rights reserved.
@@ -9,20 +10,52 @@ Copyright 2024, Abigail Goodwin, All rights reserved.
 import os
 from pathlib import Path
 import json
+import logging
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 
-# Azure libs:
-from azure.core.credentials import AzureKeyCredential
-from azure.ai.textanalytics import TextAnalyticsClient
+# Azure libs (optional; only the "azure" backend needs them):
+try:
+    from azure.core.credentials import AzureKeyCredential
+    from azure.ai.textanalytics import TextAnalyticsClient, AnalyzeSentimentAction, ExtractKeyPhrasesAction
+except ImportError:
+    AzureKeyCredential = TextAnalyticsClient = AnalyzeSentimentAction = ExtractKeyPhrasesAction = None
+
+# Project libs:
+from lib.analysis_cache import AnalysisCache, normalize_text, text_key
+from lib.near_duplicates import MIN_SIMILARITY, cluster, cluster_id, phrases_in_text, signature
+from lib import metrics
+
+logger = logging.getLogger(__name__)
+
+# Most documents the service accepts per request (v3.1 data limits):
+MAX_SYNC_BATCH_SIZE = 10        # analyze_sentiment / extract_key_phrases
+MAX_ACTIONS_BATCH_SIZE = 25     # begin_analyze_actions (several actions in one request)
+
+# Analysis backends default_engine() can build (see use_backend):
+ANALYZER_BACKENDS = ("azure", "local")
+
+cog_services = None
+_default_cache = None
+_backend = "azure"
 
 ############################################################
 #   Analyze Tweets
 ############################################################
 
-def init_cog_services() -> None:
+def init_cog_services() -> TextAnalyticsClient:
     """
     Initializes the Azure Cognitive Services connection with the user-provided endpoint
-    and credentials.
+    and credentials (once; later calls reuse the same client).
     """
+    global cog_services
+    if cog_services is not None:
+        return cog_services
+
+    if TextAnalyticsClient is None:
+        raise ImportError(
+            "azure-ai-textanalytics is not installed; install it or use the \"local\" analysis backend.")
+
     current_path = os.path.dirname(os.path.realpath(__file__))
     config_file_path = Path(current_path).parent.parent.absolute()
 
@@ -31,12 +64,13 @@ def init_cog_services() -> None:
 
         # Grab endpoint + key:
         azure_endpoint = config_json['azure-info']['endpoint']
-        auth_key = AzureKeyCredential(config_json['azure_info']['key'])
+        auth_key = AzureKeyCredential(config_json['azure-info']['key'])
 
         # Create a global that's used in the rest of this module:
-        global cog_services
         cog_services = TextAnalyticsClient(endpoint=azure_endpoint, credential=auth_key)
 
+    return cog_services
+
 
 def analyze_tweet(tweet):
     """
@@ -54,9 +88,8 @@ def analyze_tweet(tweet):
     )
 
     raw_results = {}
-    raw_results['sentiment'] = cog_services.analyze_sentiment(
-        api_document, show_opinion_mining=True)
-    raw_results['key_words'] = cog_services.extract_key_phrases(api_document)
+    raw_results['sentiment'] = init_cog_services().analyze_sentiment(api_document)
+    raw_results['key_words'] = init_cog_services().extract_key_phrases(api_document)
 
     # Gives an atrocious output.... time to clean it up.
     sentiment_info = raw_results['sentiment'][0]
@@ -82,7 +115,136 @@ def batch(iterable, n=1):
         yield iterable[ndx:min(ndx + n, l)]
 
 
+def default_cache() -> AnalysisCache:
+    """
+    @return The AnalysisCache (sql/analysis_cache.db) shared by this module (opened on first use).
+    """
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = AnalysisCache()
+    return _default_cache
+
+
+def analyze_with_cache(tweet_list, analyze_function, cache, need_sentiment=True, need_key_phrases=True):
+    """
+    Only sends cache misses to Azure. Tweets with the same normalized text, or near-duplicate text (see
+    AnalysisCache.cluster), are analyzed once, and the result is copied to each of them (a near-duplicate only
+    gets the key phrases that appear in its own text).
+
+    @param tweet_list: A list of tweets.
+    @param analyze_function: Callable(tweet_list) -> results; does the actual (uncached) analysis.
+    @param cache: The AnalysisCache to use, or None to always call analyze_function.
+    @param need_sentiment: Whether results must include sentiment (see AnalysisCache.lookup).
+    @param need_key_phrases: Whether results must include key phrases (see AnalysisCache.lookup).
+    @return tweet_results: List of result dictionaries, in the same order as tweet_list. Each carries the
+            'cluster_id' of the text that was actually analyzed for it (see near_duplicates.cluster_id).
+    """
+    if cache is None:
+        return analyze_function(tweet_list)
+
+    hits, misses = cache.lookup(tweet_list, need_sentiment, need_key_phrases)
+    metrics.inc("analysis_cache_hits_total", len(hits))
+    metrics.inc("analysis_cache_misses_total", len(misses))
+
+    # One representative tweet per distinct text (or cluster of near-duplicates):
+    representative_of = cache.cluster(misses)
+    representatives = {str(tweet['id']): tweet for tweet in representative_of.values()}
+
+    new_results = analyze_function(list(representatives.values())) if representatives else []
+    cache.store(representatives.values(), new_results)
+
+    # Fan each representative's result back out to every tweet in its cluster:
+    new_results_by_id = {str(tweet_info['id']): tweet_info for tweet_info in new_results}
+    results_by_id = {tweet_info['id']: tweet_info for tweet_info in hits}
+    for tweet in misses:
+        representative = representative_of[str(tweet['id'])]
+        tweet_info = new_results_by_id.get(str(representative['id']))
+        if tweet_info is not None:
+            representative_key = text_key(representative['text'], cache.model_version)
+            tweet_info = dict(tweet_info, id=str(tweet['id']), cluster_id=cluster_id(representative_key))
+            # Near-duplicates only keep the representative's key phrases that appear in their own text:
+            if 'key_phrases' in tweet_info and representative_key != text_key(tweet['text'], cache.model_version):
+                tweet_info['key_phrases'] = phrases_in_text(tweet_info['key_phrases'], tweet['text'])
+            results_by_id[str(tweet['id'])] = tweet_info
+
+    return [results_by_id[str(tweet['id'])] for tweet in tweet_list if str(tweet['id']) in results_by_id]
+
+
+def analyze_clustered(tweet_list, analyze_function, model_version, min_similarity=MIN_SIMILARITY):
+    """
+    The near-duplicate clustering stage, run in front of every backend: tweets with the same normalized
+    text, or near-duplicate text (see near_duplicates.cluster), are analyzed once, and the result is copied
+    to each of them with a 'cluster_id' (so Tweets.ClusterID is filled in whichever backend is used).
+
+    @param tweet_list: A list of tweets.
+    @param analyze_function: Callable(tweet_list) -> results; the backend's analysis.
+    @param model_version: What the results come from (e.g. the backend's name); part of the cluster IDs.
+            Results that already carry a 'cluster_id' (e.g. from the analysis cache) keep it.
+    @param min_similarity: How much near-duplicates' wording must overlap; None to only group identical
+            (normalized) texts.
+    @return tweet_results: List of result dictionaries, in the same order as tweet_list (tweets whose
+            representative couldn't be analyzed are left out).
+    """
+    # Step 1: One representative tweet per distinct text, then per cluster of near-duplicate texts:
+    by_text = {}
+    for tweet in tweet_list:
+        by_text.setdefault(normalize_text(tweet['text']), tweet)
+    distinct = list(by_text.values())
+
+    if min_similarity is None:
+        representative_of_text = by_text
+    else:
+        representative_indexes = cluster([signature(tweet['text']) for tweet in distinct], min_similarity)
+        representative_of_text = {text: distinct[representative_index] for text, representative_index
+                                  in zip(by_text, representative_indexes)}
+
+    # Step 2: Analyze the representatives:
+    representatives = {str(tweet['id']): tweet for tweet in representative_of_text.values()}
+    new_results = analyze_function(list(representatives.values())) if representatives else []
+    results_by_id = {str(tweet_info['id']): tweet_info for tweet_info in new_results}
+
+    # Step 3: Fan each representative's result back out to every tweet in its cluster:
+    tweet_results = []
+    for tweet in tweet_list:
+        text = normalize_text(tweet['text'])
+        representative = representative_of_text[text]
+        tweet_info = results_by_id.get(str(representative['id']))
+        if tweet_info is None:
+            continue
+
+        tweet_info = dict(tweet_info, id=str(tweet['id']))
+        tweet_info.setdefault('cluster_id', cluster_id(text_key(representative['text'], model_version)))
+        # Near-duplicates only keep the representative's key phrases that appear in their own text:
+        if 'key_phrases' in tweet_info and text != normalize_text(representative['text']):
+            tweet_info['key_phrases'] = phrases_in_text(tweet_info['key_phrases'], tweet['text'])
+        tweet_results.append(tweet_info)
+
+    return tweet_results
+
+
 def analyze_tweet_sentiments(tweet_list):
+    """
+    Analyzes a list of tweets using Azure's Cognitive Services for sentiment (cached results are reused).
+
+    @param tweet_list: A list of tweet text.
+    @return tweet_sentiments: A Python dictionary of the tweet's overall sentiment and confidence levels (pos, neut, neg).
+    """
+    return analyze_with_cache(tweet_list, request_tweet_sentiments, default_cache(),
+                              need_key_phrases=False)
+
+
+def analyze_tweet_keywords(tweet_list):
+    """
+    Analyzes a list of tweets for their keywords (cached results are reused).
+
+    @param tweet_list: A list of tweet text.
+    @return tweet_keywords: A Python dictionary of each tweet's keywords.
+    """
+    return analyze_with_cache(tweet_list, request_tweet_keywords, default_cache(),
+                              need_sentiment=False)
+
+
+def request_tweet_sentiments(tweet_list):
     """
     Analyzes a list of tweets using Azure's Cognitive Services for sentiment.
 
@@ -103,9 +265,8 @@ def analyze_tweet_sentiments(tweet_list):
 
     # Step 2: Calling Azure in Batches
     raw_results = []
-    for tweets in batch(api_document, 10):
-        raw_results.append(cog_services.analyze_sentiment(
-            tweets, show_opinion_mining=True))
+    for tweets in batch(api_document, MAX_SYNC_BATCH_SIZE):
+        raw_results.append(init_cog_services().analyze_sentiment(tweets))
 
     # Step 3: Cleaning & Separating Data
     tweet_sentiments = []
@@ -120,7 +281,7 @@ def analyze_tweet_sentiments(tweet_list):
     return tweet_sentiments
 
 
-def analyze_tweet_keywords(tweet_list):
+def request_tweet_keywords(tweet_list):
     """
     Analyzes a list of tweets for their keywords.
 
@@ -128,7 +289,7 @@ def analyze_tweet_keywords(tweet_list):
     @return tweet_keywords: A Python dictionary of each tweet's keywords.
     """
     # Not sure if there's a guarantee that a tweet has keywords, so made another function.
-    # @TODO: Filter down key phrases (opaquelist)
+    # Stop phrases and the topic itself are filtered out when the phrases are stored (see keyword_engine).
     api_document = []
 
     # Step 1: Adding all of the tweets to the API call.
@@ -142,8 +303,8 @@ def analyze_tweet_keywords(tweet_list):
         )
 
     raw_results = []
-    for tweets in batch(api_document, 10):
-        raw_results.append(cog_services.extract_key_phrases(tweets))
+    for tweets in batch(api_document, MAX_SYNC_BATCH_SIZE):
+        raw_results.append(init_cog_services().extract_key_phrases(tweets))
 
     tweet_keywords = []
     for group in raw_results:
@@ -154,3 +315,169 @@ def analyze_tweet_keywords(tweet_list):
             tweet_keywords.append(tweet_info)
 
     return tweet_keywords
+
+
+############################################################
+#   Combined Analysis
+############################################################
+
+class TweetAnalyzer(ABC):
+    """
+    Interface shared by the analysis backends. analyze() takes a list of tweets and returns one
+    {'id', 'overall_sentiment', 'confidence_scores', 'key_phrases'} dictionary per tweet, in order.
+    """
+
+    @abstractmethod
+    def analyze(self, tweet_list):
+        """
+        Analyzes a list of tweets for their sentiment and key phrases.
+
+        @param tweet_list: A list of tweets.
+        @return tweet_results: List of Python dictionaries, in the same order as tweet_list.
+        """
+
+
+class AnalysisEngine(TweetAnalyzer):
+    """
+    Azure backend. Sends each tweet to Azure once, asking for its sentiment and key phrases in the same multi-action
+    request, with several full-size batches in flight at a time.
+    """
+
+    def __init__(self, client=None, batch_size=MAX_ACTIONS_BATCH_SIZE, max_workers=4, polling_interval=1,
+                 cache=None):
+        """
+        Constructor.
+
+        @param client: (If given) the TextAnalyticsClient to use; the one from init_cog_services() otherwise.
+        @param cache: (If given) an AnalysisCache; only tweets it misses are sent to Azure.
+        @param batch_size: Documents per request (capped at the service's MAX_ACTIONS_BATCH_SIZE).
+        @param max_workers: How many batches may be in flight at once.
+        @param polling_interval: Seconds between polls of each long-running analyze request.
+        """
+        self.client = client
+        self.batch_size = min(batch_size, MAX_ACTIONS_BATCH_SIZE)
+        self.max_workers = max_workers
+        self.polling_interval = polling_interval
+        self.cache = cache
+
+    def analyze_batch(self, api_document):
+        """
+        Runs sentiment analysis and key-phrase extraction over one batch in a single request.
+
+        @param api_document: List of {'id', 'language', 'text'} documents.
+        @return tweet_results: List of Python dictionaries (see analyze_tweets).
+        """
+        client = self.client or init_cog_services()
+        metrics.inc("azure_documents_total", len(api_document))
+        with metrics.in_flight("azure_batches_in_flight"), metrics.timed("azure_batch_seconds"):
+            poller = client.begin_analyze_actions(
+                api_document,
+                actions=[AnalyzeSentimentAction(), ExtractKeyPhrasesAction()],
+                polling_interval=self.polling_interval)
+            action_results = poller.result()
+
+        tweet_results = []
+        for sentiment_info, keyword_info in action_results:
+            if sentiment_info.is_error or keyword_info.is_error:
+                error = sentiment_info if sentiment_info.is_error else keyword_info
+                logger.warning("Azure could not analyze tweet %s: %s", error.id, error.error.message)
+                metrics.inc("azure_document_errors_total")
+                continue
+
+            tweet_info = {}
+            tweet_info['id'] = sentiment_info['id']
+            tweet_info['overall_sentiment'] = sentiment_info['sentiment']
+            tweet_info['confidence_scores'] = sentiment_info['confidence_scores']
+            tweet_info['key_phrases'] = keyword_info['key_phrases']
+            tweet_results.append(tweet_info)
+
+        return tweet_results
+
+    def analyze(self, tweet_list):
+        """
+        Analyzes a list of tweets for their sentiment and key phrases, skipping Azure for cached text.
+
+        @param tweet_list: A list of tweets.
+        @return tweet_results: List of Python dictionaries, in the same order as tweet_list.
+        """
+        return analyze_with_cache(tweet_list, self.analyze_uncached, self.cache)
+
+    def analyze_uncached(self, tweet_list):
+        """
+        Analyzes a list of tweets for their sentiment and key phrases (always calling Azure).
+
+        @param tweet_list: A list of tweets.
+        @return tweet_results: List of Python dictionaries, in the same order as tweet_list.
+        """
+        api_document = [{'id': str(tweet['id']), 'language': 'en', 'text': tweet['text']}
+                        for tweet in tweet_list]
+        batches = list(batch(api_document, self.batch_size))
+        if not batches:
+            return []
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(batches))) as pool:
+            raw_results = list(pool.map(self.analyze_batch, batches))
+
+        return [tweet_info for group in raw_results for tweet_info in group]
+
+
+_default_engine = None
+
+
+def make_analyzer(backend="azure", **kwargs) -> TweetAnalyzer:
+    """
+    Builds an analyzer for the given backend.
+
+    @param backend: "azure" (Cognitive Services, cached) or "local" (offline; see local_analyzer).
+    @param kwargs: Passed on to the backend's constructor.
+    @return TweetAnalyzer
+    """
+    if backend == "azure":
+        kwargs.setdefault('cache', default_cache())
+        return AnalysisEngine(**kwargs)
+
+    if backend == "local":
+        # Imported here since local_analyzer builds on this module:
+        from lib.local_analyzer import LocalAnalyzer
+        return LocalAnalyzer(**kwargs)
+
+    raise ValueError(f"Unknown analysis backend {backend!r}; expected one of {ANALYZER_BACKENDS}.")
+
+
+def use_backend(backend) -> None:
+    """
+    Switches the backend used by analyze_tweets() (the shared analyzer is rebuilt on next use).
+
+    @param backend: One of ANALYZER_BACKENDS.
+    """
+    global _backend, _default_engine
+    if backend not in ANALYZER_BACKENDS:
+        raise ValueError(f"Unknown analysis backend {backend!r}; expected one of {ANALYZER_BACKENDS}.")
+    _backend = backend
+    _default_engine = None
+
+
+def default_engine() -> TweetAnalyzer:
+    """
+    @return The analyzer shared by calls to analyze_tweets() (created on first use).
+    """
+    global _default_engine
+    if _default_engine is None:
+        _default_engine = make_analyzer(_backend)
+    return _default_engine
+
+
+def analyze_tweets(tweet_list):
+    """
+    Analyzes a list of tweets for both sentiment and keywords with the current backend (for Azure,
+    uploading each tweet only once). Near-duplicates are clustered first (see analyze_clustered), so only
+    one tweet per cluster is analyzed, whatever the backend.
+
+    @param tweet_list: A list of tweets.
+    @return tweet_results: List of Python dictionaries; each tweet's id, overall_sentiment,
+            confidence_scores (pos, neut, neg) and key_phrases. Usable wherever the output of
+            analyze_tweet_sentiments() or analyze_tweet_keywords() is expected.
+    """
+    metrics.inc("analysis_tweets_total", len(tweet_list), backend=_backend)
+    with metrics.timed("analysis_seconds", backend=_backend):
+        return analyze_clustered(tweet_list, default_engine().analyze, _backend)
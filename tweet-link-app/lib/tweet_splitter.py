@@ -1,11 +1,278 @@
 """
 tweet_splitter is in charge of taking raw JSON and converting it into a list of separated tweets.
-The "list of separated tweets" will be a list of dictionaries.
-    
+The "list of separated tweets" is a compact, column-oriented TweetPage (or, from split_json, a list of
+dictionaries).
+
 @author Abigail Goodwin <abby.goodwin@outlook.com>
 Copyright 2024, Abigail Goodwin, All rights reserved.
 """
 
+import re
+from array import array
+from datetime import datetime, timezone
+
+# One pattern per entity type, each starting with its trigger character so the regex engine can jump
+# straight to candidates (and each only runs when its trigger appears in the text at all). \w is
+# Unicode-aware, so any other character (including Unicode punctuation like "…" or "。") ends an entity.
+HASHTAG_PATTERN = re.compile(r"#(?<![\w&#]#)(\w*[^\W\d]\w*)")
+MENTION_PATTERN = re.compile(r"@(?<![\w@]@)(\w{1,15})(?!\w)")
+CASHTAG_PATTERN = re.compile(r"\$(?<![\w$]\$)([A-Za-z]{1,6}(?:[._][A-Za-z]{1,2})?)(?!\w)")
+URL_PATTERN = re.compile(r"https?://[^\s<>\"]*[^\s<>\".,;:!?\]'\u2019\u201d\u2026]")
+
+# Punctuation that ends a sentence rather than a URL:
+URL_TRAILING_PUNCTUATION = ".,;:!?]'\u2019\u201d\u2026"
+
+ENTITY_TYPES = ("hashtags", "mentions", "urls", "cashtags")
+
+
+class TweetRecord:
+    """
+    A read-only view of one row of a TweetPage. Reads like the tweet dictionaries split_json() builds
+    (tweet['id'], tweet.get('entities'), dict(tweet), ...) without storing a dictionary per tweet.
+    """
+
+    __slots__ = ("page", "row")
+
+    FIELDS = ("id", "author_id", "created_at", "location", "text")
+
+    def __init__(self, page, row):
+        """
+        Constructor.
+
+        @param page: The TweetPage holding the tweet.
+        @param row: The tweet's row number within the page.
+        """
+        self.page = page
+        self.row = row
+
+    @property
+    def id(self):
+        return str(self.page.ids[self.row])
+
+    @property
+    def author_id(self):
+        return str(self.page.author_ids[self.row])
+
+    @property
+    def created_at(self):
+        return format_timestamp(self.page.timestamps[self.row])
+
+    @property
+    def location(self):
+        location_index = self.page.location_indexes[self.row]
+        return self.page.place_ids[location_index] if location_index >= 0 else None
+
+    @property
+    def text(self):
+        return self.page.text_buffer[self.page.text_offsets[self.row]:self.page.text_offsets[self.row + 1]]
+
+    @property
+    def entities(self):
+        return self.page.entities.get(self.row)
+
+    def keys(self):
+        return self.FIELDS + (("entities",) if self.row in self.page.entities else ())
+
+    def __getitem__(self, key):
+        if key not in self.FIELDS and (key != "entities" or self.row not in self.page.entities):
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in self.keys()
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __repr__(self):
+        return f"TweetRecord({dict(self)!r})"
+
+
+class TweetPage:
+    """
+    One page of search results, stored column by column: tweet IDs, author IDs, timestamps and place
+    indexes in typed arrays, and every tweet's text in one string buffer. Authors and places are indexed
+    by their IDs, so that joining a tweet to its author or place is a dictionary lookup.
+
+    Iterating over the page (or reading page.tweets) yields TweetRecord views of its rows.
+    """
+
+    def __init__(self, authors, places, next_token=None, result_count=None, newest_id=None, oldest_id=None):
+        """
+        Constructor; creates an empty page (see split_page, TweetPage.from_tweets and append).
+
+        @param authors: Python dictionary; author ID -> author dictionary (see split_authors).
+        @param places: Python dictionary; place ID -> place dictionary (see split_locations).
+        @param next_token: (If given) the pagination token for the page after this one.
+        @param result_count: (If given) how many tweets the API returned for the page; kept when the page
+                             is filtered down with with_tweets(), like newest_id and oldest_id.
+        @param newest_id: (If given) the newest tweet ID the API returned for the page.
+        @param oldest_id: (If given) the oldest tweet ID the API returned for the page.
+        """
+        self.authors = authors
+        self.places = places
+        self.next_token = next_token
+        self.result_count = result_count
+        self.newest_id = newest_id
+        self.oldest_id = oldest_id
+
+        self.ids = array('q')
+        self.author_ids = array('q')
+        self.timestamps = array('q')            # Seconds since the epoch (UTC)
+        self.location_indexes = array('l')      # Index into place_ids, or -1 if not geo-tagged
+        self.place_ids = list(places)
+        self.place_indexes = {place_id: index for index, place_id in enumerate(self.place_ids)}
+        self.text_offsets = array('q', [0])     # Tweet i's text is text_buffer[offsets[i]:offsets[i + 1]]
+        self.text_buffer = ""
+        self.entities = {}                      # Row -> the API's entities (only for tweets that had them)
+        self.raw_payload = None                 # The compressed API response (a raw_store.RawPayload), if kept
+
+        self.pending_text = []
+
+    @classmethod
+    def from_tweets(cls, tweets, authors, places, next_token=None):
+        """
+        Builds a page from tweet dictionaries (see split_json) or other pages' TweetRecords.
+
+        @return TweetPage
+        """
+        page = cls(authors, places, next_token)
+        for tweet in tweets:
+            page.append(tweet['id'], tweet['author_id'], tweet['created_at'], tweet['location'],
+                        tweet['text'], tweet.get('entities'))
+        page.seal()
+        return page
+
+    def append(self, id, author_id, created_at, location, text, entities=None) -> None:
+        """
+        Adds a tweet to the page. Call seal() once every tweet has been added.
+
+        @param created_at: The tweet's time, as the API's ISO-8601 string or "YYYY-MM-DD HH:MM:SS".
+        @param location: The tweet's place ID, or None.
+        """
+        if location is not None and location not in self.place_indexes:
+            self.place_indexes[location] = len(self.place_ids)
+            self.place_ids.append(location)
+
+        if entities is not None:
+            self.entities[len(self.ids)] = entities
+
+        self.ids.append(int(id))
+        self.author_ids.append(int(author_id))
+        self.timestamps.append(parse_timestamp(created_at))
+        self.location_indexes.append(self.place_indexes[location] if location is not None else -1)
+        self.text_offsets.append(self.text_offsets[-1] + len(text))
+        self.pending_text.append(text)
+
+    def seal(self) -> None:
+        """
+        Joins the text of every appended tweet into the page's text buffer.
+        """
+        if self.pending_text:
+            self.text_buffer += "".join(self.pending_text)
+            self.pending_text = []
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return (TweetRecord(self, row) for row in range(len(self.ids)))
+
+    @property
+    def tweets(self):
+        """
+        @return List of TweetRecords; one per row.
+        """
+        return list(self)
+
+    def texts(self):
+        """
+        @return List of every tweet's text, in row order.
+        """
+        return [self.text_buffer[self.text_offsets[row]:self.text_offsets[row + 1]]
+                for row in range(len(self.ids))]
+
+    def author_of(self, tweet):
+        """
+        @param tweet: A tweet from this page.
+        @return The tweet's author dictionary, or None if the page didn't include it.
+        """
+        return self.authors.get(tweet['author_id'])
+
+    def place_of(self, tweet):
+        """
+        @param tweet: A tweet from this page.
+        @return The tweet's place dictionary, or None if the tweet isn't geo-tagged.
+        """
+        if tweet['location'] is None:
+            return None
+        return self.places.get(tweet['location'])
+
+    def with_tweets(self, tweets):
+        """
+        Creates a copy of this page that only holds the given tweets (e.g. after filtering out duplicates).
+
+        @param tweets: The tweets to keep (this page's TweetRecords, or tweet dictionaries).
+        @return TweetPage; the authors, places and raw payload are shared with this page.
+        """
+        tweets = list(tweets)
+        if not all(isinstance(tweet, TweetRecord) and tweet.page is self for tweet in tweets):
+            page = TweetPage.from_tweets(tweets, self.authors, self.places, self.next_token)
+            page.result_count, page.newest_id, page.oldest_id = self.result_count, self.newest_id, self.oldest_id
+            page.raw_payload = self.raw_payload
+            return page
+
+        # Rows of this page; copy the columns directly:
+        page = TweetPage(self.authors, self.places, self.next_token,
+                         self.result_count, self.newest_id, self.oldest_id)
+        page.place_ids = self.place_ids
+        page.place_indexes = self.place_indexes
+        page.raw_payload = self.raw_payload
+        rows = [tweet.row for tweet in tweets]
+        page.ids = array('q', [self.ids[row] for row in rows])
+        page.author_ids = array('q', [self.author_ids[row] for row in rows])
+        page.timestamps = array('q', [self.timestamps[row] for row in rows])
+        page.location_indexes = array('l', [self.location_indexes[row] for row in rows])
+        page.entities = {new_row: self.entities[row]
+                         for new_row, row in enumerate(rows) if row in self.entities}
+
+        texts = [tweet.text for tweet in tweets]
+        page.text_buffer = "".join(texts)
+        for text in texts:
+            page.text_offsets.append(page.text_offsets[-1] + len(text))
+
+        return page
+
+
+def split_page(raw_json):
+    """
+    split_page will take in raw JSON and convert it into a (columnar) TweetPage.
+
+    @param raw_json: A super long JSON string. Contains 10 or more tweets.
+    @return TweetPage; the page's tweets, plus its authors and places indexed by ID.
+    """
+    authors = {author['id']: author for author in split_authors(raw_json)}
+    places = {place['id']: place for place in split_locations(raw_json)}
+    meta = raw_json.get('meta', {})
+
+    page = TweetPage(authors, places, meta.get('next_token'))
+    for tweet in raw_json.get('data', []):
+        location = tweet['geo'].get('place_id') if 'geo' in tweet else None
+        page.append(tweet['id'], tweet['author_id'], tweet['created_at'], location, tweet['text'],
+                    tweet.get('entities'))
+    page.seal()
+
+    # What the API returned, before any filtering (used for ingest checkpoints):
+    page.result_count = len(page)
+    page.newest_id = int(meta['newest_id']) if 'newest_id' in meta else max(page.ids, default=None)
+    page.oldest_id = int(meta['oldest_id']) if 'oldest_id' in meta else min(page.ids, default=None)
+
+    return page
+
+
 def split_json(raw_json):
     """
     split_json will take in raw JSON and convert it into a list of dictionaries.
@@ -16,7 +283,7 @@ def split_json(raw_json):
     tweet_list = []
 
     # Converts each tweet into a dictionary and then adds it to the list
-    for tweet in raw_json['data']:
+    for tweet in raw_json.get('data', []):
         location = None
 
         # If the tweet comes with location data.
@@ -24,13 +291,17 @@ def split_json(raw_json):
             location = tweet['geo']
             location = location['place_id']
 
-        tweet_list.append(
-            {'id': tweet['id'],
-             'author_id': tweet['author_id'],
-             'created_at': get_date_time(tweet),
-             'location': location,  # Searched for Geo data; if it doesn't exist, then 'None'
-             'text': tweet['text']}
-        )
+        tweet_info = {'id': tweet['id'],
+                      'author_id': tweet['author_id'],
+                      'created_at': get_date_time(tweet),
+                      'location': location,  # Searched for Geo data; if it doesn't exist, then 'None'
+                      'text': tweet['text']}
+
+        # Entities the API already parsed out (only if asked for in tweet.fields):
+        if 'entities' in tweet:
+            tweet_info['entities'] = tweet['entities']
+
+        tweet_list.append(tweet_info)
 
     return tweet_list
 
@@ -44,7 +315,7 @@ def split_authors(raw_json):
 
     author_list = []
 
-    for user in raw_json['includes']['users']:
+    for user in raw_json.get('includes', {}).get('users', []):
         author_list.append(
             {'id': user['id'],
              'name': user['name'],
@@ -62,11 +333,10 @@ def split_locations(raw_json):
     """
     location_list = []
 
-    if (len((raw_json['includes'])) > 2):
-        for place in raw_json['includes']['places']:
-            location_list.append(
-                {'id': place['id'],
-                 'full_name': place['full_name']})
+    for place in raw_json.get('includes', {}).get('places', []):
+        location_list.append(
+            {'id': place['id'],
+             'full_name': place['full_name']})
 
     return location_list
 
@@ -88,32 +358,102 @@ def get_date_time(tweet):
     return datetime
 
 
-def collect_hashtags(tweet):
+def parse_timestamp(created_at) -> int:
     """
-    Creates a list of the hashtags associated with the given Tweet.
+    @param created_at: The API's "2024-03-01T12:00:05.000Z" or get_date_time()'s "2024-03-01 12:00:05".
+    @return Seconds since the epoch (UTC).
+    """
+    return int(datetime.fromisoformat(created_at[:19]).replace(tzinfo=timezone.utc).timestamp())
+
+
+def format_timestamp(timestamp) -> str:
+    """
+    @param timestamp: Seconds since the epoch (UTC).
+    @return The time in get_date_time()'s "YYYY-MM-DD HH:MM:SS" format.
+    """
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+############################################################
+#   Entity Extraction
+############################################################
+
+def extract_entities(tweet, entity_types=ENTITY_TYPES) -> dict:
+    """
+    Pulls the hashtags, mentions, URLs and cashtags out of a tweet. The API's own 'entities' field is used
+    when present; otherwise the text is scanned. Hashtags and mentions are case-folded, cashtags
+    upper-cased, and each list is de-duplicated (in order of appearance).
 
     @param tweet: The given Tweet.
+    @param entity_types: Which of ENTITY_TYPES to extract (skipping the rest saves a scan each).
+    @return Python dictionary; 'hashtags' ("#tag"), 'mentions' ("@user"), 'urls' and 'cashtags' ("$TAG").
     """
+    entities = {}
+
+    api_entities = tweet.get('entities')
+    if api_entities is not None:
+        if "hashtags" in entity_types:
+            entities['hashtags'] = list(dict.fromkeys(
+                ["#" + hashtag['tag'].casefold() for hashtag in api_entities.get('hashtags', [])]))
+        if "mentions" in entity_types:
+            entities['mentions'] = list(dict.fromkeys(
+                ["@" + mention['username'].casefold() for mention in api_entities.get('mentions', [])]))
+        if "urls" in entity_types:
+            entities['urls'] = list(dict.fromkeys(
+                [url.get('expanded_url') or url['url'] for url in api_entities.get('urls', [])]))
+        if "cashtags" in entity_types:
+            entities['cashtags'] = list(dict.fromkeys(
+                ["$" + cashtag['tag'].upper() for cashtag in api_entities.get('cashtags', [])]))
+        return entities
+
+    # Full-width "＃" and "＠" start hashtags/mentions too:
+    text = tweet['text']
+    if "\uff03" in text or "\uff20" in text:
+        text = text.replace("\uff03", "#").replace("\uff20", "@")
+
+    if "hashtags" in entity_types:
+        entities['hashtags'] = list(dict.fromkeys(
+            ["#" + tag.casefold() for tag in HASHTAG_PATTERN.findall(text)])) if "#" in text else []
+    if "mentions" in entity_types:
+        entities['mentions'] = list(dict.fromkeys(
+            ["@" + name.casefold() for name in MENTION_PATTERN.findall(text)])) if "@" in text else []
+    if "urls" in entity_types:
+        entities['urls'] = list(dict.fromkeys(
+            [trim_url(url) for url in URL_PATTERN.findall(text)])) if "http" in text else []
+    if "cashtags" in entity_types:
+        entities['cashtags'] = list(dict.fromkeys(
+            ["$" + tag.upper() for tag in CASHTAG_PATTERN.findall(text)])) if "$" in text else []
 
-    hashtag_list = []  # List of hashtags per tweet.
-    tweet_text = tweet['text']
+    return entities
 
-    tag_start = 0
-    while (tag_start < len(tweet_text) and tag_start >= 0):
-        tag_start = tweet_text.find("#", tag_start)
 
-        if (tag_start >= 0):  # If the tag exists, find its end
-            for char_index in range(tag_start+1, len(tweet_text)):
-                current_char = tweet_text[char_index]
-                if (current_char in [' ', '#', ',', '!', '.', '?', '\n', '\"', ':', ';']):
-                    tag_end = char_index
-                    break
+def trim_url(url) -> str:
+    """
+    @param url: A URL matched by URL_PATTERN.
+    @return The URL without closing parentheses that don't close one of its own (so "(see https://x.co/a)"
+            loses its ")", but "https://en.wikipedia.org/wiki/Foo_(bar)" keeps it).
+    """
+    while url.endswith(")") and url.count(")") > url.count("("):
+        url = url[:-1].rstrip(URL_TRAILING_PUNCTUATION)
+    return url
+
 
-                tag_end = len(tweet_text)
+def extract_page_entities(tweet_list, entity_types=ENTITY_TYPES) -> dict:
+    """
+    Extracts the entities of a whole page of tweets.
 
-            hashtag = tweet_text[tag_start:tag_end]
-            hashtag_list.append(hashtag)
+    @param tweet_list: List of tweet dictionaries (see split_json).
+    @param entity_types: Which of ENTITY_TYPES to extract.
+    @return Python dictionary; tweet ID -> that tweet's entities (see extract_entities).
+    """
+    return {tweet['id']: extract_entities(tweet, entity_types) for tweet in tweet_list}
 
-            tag_start = tag_end
 
-    return hashtag_list
+def collect_hashtags(tweet):
+    """
+    Creates a list of the hashtags associated with the given Tweet.
+
+    @param tweet: The given Tweet.
+    @return List of unique, case-folded hashtags (with their leading "#").
+    """
+    return extract_entities(tweet, ("hashtags",))['hashtags']
@@ -1,28 +1,360 @@
 """
-twitter_importer is a module that simply contains the function used to fetch Tweets from the Twitter API.
+twitter_importer is the module used to fetch Tweets from the Twitter API.
 
 @author Abigail Goodwin <abby.goodwin@outlook.com>
 Copyright 2024, Abigail Goodwin, All rights reserved.
 """
 
 import requests
+from requests.adapters import HTTPAdapter
 import json
+import logging
 from pathlib import Path
 import os
+import random
+import threading
+import time
+from collections import Counter, namedtuple
+from functools import lru_cache
+
+from lib import metrics
+
+logger = logging.getLogger(__name__)
+
+# X API v2 recent-search endpoint:
+SEARCH_URL = "https://api.x.com/2/tweets/search/recent"
+
+# One row per HTTP request made by an XClient:
+RequestRecord = namedtuple(
+    "RequestRecord", ["url", "status", "latency", "bytes", "wire_bytes", "attempt"])
+
+
+class RateLimitError(Exception):
+    """
+    Raised when the search API keeps refusing requests after every retry.
+    """
+
+
+class XApiError(Exception):
+    """
+    Raised when the search API rejects a request outright (a 4xx other than 429, e.g. 401 for invalid
+    credentials), which no retry would fix.
+    """
+
+    def __init__(self, status_code, detail):
+        """
+        Constructor.
+
+        @param status_code: The response's HTTP status.
+        @param detail: What the API said was wrong.
+        """
+        super().__init__(f"X API returned {status_code}: {detail}")
+        self.status_code = status_code
+
 
 ############################################################
-#   Fetching Tweets
+#   Configuration
 ############################################################
-def grab_bearer_token() -> str:
+
+@lru_cache(maxsize=None)
+def load_config() -> dict:
     """
-    Attempts to grab the user's X API Bearer token from the project_config.json file.
+    Reads and parses the project_config.json file (only once per process).
     """
     current_path = os.path.dirname(os.path.realpath(__file__))
     config_file_path = Path(current_path).parent.parent.absolute()
 
     with open(f"{config_file_path}/project_config.json") as config_file:
-        config_json = json.load(config_file)
-        return config_json['twitter-api-info']['bearer-token']
+        return json.load(config_file)
+
+
+def grab_bearer_token() -> str:
+    """
+    Attempts to grab the user's X API Bearer token from the project_config.json file.
+    """
+    return load_config()['twitter-api-info']['bearer-token']
+
+
+def build_search_params(topic, next_token=None, max_results=100, since_id=None) -> dict:
+    """
+    Builds the recent-search query parameters used to pull tweets for a topic.
+
+    @param topic: String; the topic that we want to pull tweets for.
+    @param next_token: (If given) the next page of results to pull tweets from.
+    @param max_results: The number of tweets to ask for (X allows 10-100 per page).
+    @param since_id: (If given) only tweets newer than this tweet ID are returned.
+    @return query_params: Python dictionary of query parameters.
+    """
+    query_params = {'query': (topic + ' -is:retweet lang:en'),
+                    'tweet.fields': 'created_at,geo,entities',
+                    'max_results': max_results,
+                    'expansions': 'author_id,geo.place_id'}
+
+    if (next_token != None):
+        query_params['next_token'] = next_token
+
+    if (since_id != None):
+        query_params['since_id'] = str(since_id)
+
+    return query_params
+
+
+############################################################
+#   Rate Limiting
+############################################################
+
+class RateLimiter:
+    """
+    Tracks the X API's x-rate-limit-remaining/x-rate-limit-reset headers and holds requests back
+    once the window is used up. Shared by every fetch thread, since the limit is per bearer token.
+    """
+
+    def __init__(self, max_backoff=900.0):
+        """
+        Constructor.
+
+        @param max_backoff: The longest single wait, in seconds.
+        """
+        self.max_backoff = max_backoff
+
+        self.lock = threading.Lock()
+        self.remaining = None
+        self.reset_at = None
+
+    def update(self, headers) -> None:
+        """
+        Records the rate-limit window from a response's headers.
+
+        @param headers: The response's headers.
+        """
+        with self.lock:
+            if 'x-rate-limit-remaining' in headers:
+                self.remaining = int(headers['x-rate-limit-remaining'])
+            if 'x-rate-limit-reset' in headers:
+                self.reset_at = float(headers['x-rate-limit-reset'])
+
+    def wait_for_window(self) -> None:
+        """
+        Blocks until a request may be made (i.e. until the window resets if no requests remain).
+        """
+        with self.lock:
+            if self.remaining is None or self.remaining > 0 or self.reset_at is None:
+                if self.remaining is not None:
+                    self.remaining -= 1
+                return
+            delay = min(self.reset_at - time.time(), self.max_backoff)
+
+        if delay > 0:
+            logger.info("X rate limit reached; waiting %.0fs for the window to reset.", delay)
+            metrics.inc("x_api_rate_limit_wait_seconds_total", delay)
+            time.sleep(delay)
+
+    def reset_delay(self, headers):
+        """
+        @param headers: A refused response's headers.
+        @return Seconds until the rate-limit window resets, or None if the API didn't say.
+        """
+        if 'x-rate-limit-reset' in headers:
+            delay = float(headers['x-rate-limit-reset']) - time.time()
+            if delay > 0:
+                return min(delay, self.max_backoff)
+        return None
+
+
+############################################################
+#   Fetching Tweets
+############################################################
+
+def error_detail(response) -> str:
+    """
+    @param response: An error response from the X API.
+    @return The API's explanation of the error (its JSON 'detail' or 'title'), or the HTTP reason.
+    """
+    try:
+        body = response.json()
+    except ValueError:
+        body = None
+    if isinstance(body, dict) and (body.get('detail') or body.get('title')):
+        return str(body.get('detail') or body.get('title'))
+    return response.reason or "no details given"
+
+
+class XClient:
+    """
+    Client for the X search API. Keeps one keep-alive connection pool and the bearer token for its
+    whole lifetime, and records the latency, size and status of every request it makes.
+    """
+
+    def __init__(self, bearer_token=None, search_url=SEARCH_URL, connect_timeout=5.0, read_timeout=30.0,
+                 max_retries=5, base_backoff=1.0, max_backoff=900.0, pool_size=10, rate_limiter=None):
+        """
+        Constructor.
+
+        @param bearer_token: (If given) the X API Bearer token; read from project_config.json otherwise.
+        @param search_url: The recent-search endpoint (overridable so a local stub server can be used).
+        @param connect_timeout: Seconds to wait for a connection to open.
+        @param read_timeout: Seconds to wait for the server to send a response.
+        @param max_retries: How many times a failed request (429, 5xx, timeout, dropped connection) is retried.
+        @param base_backoff: Seconds to wait after the first failure; doubled (plus jitter) every retry.
+        @param max_backoff: The longest single wait, in seconds.
+        @param pool_size: How many keep-alive connections to hold open (one per concurrent fetch thread).
+        @param rate_limiter: (If given) a RateLimiter shared with other clients; one is created otherwise.
+        """
+        self.search_url = search_url
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.rate_limiter = rate_limiter or RateLimiter(max_backoff)
+
+        # Persistent session, so every page reuses an open TCP/TLS connection:
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size,
+                              pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self.session.headers.update({
+            'Authorization': f'Bearer {bearer_token or grab_bearer_token()}',
+            'Accept-Encoding': 'gzip'
+        })
+        user_agent = load_config().get('twitter-api-info', {}).get('user-agent')
+        if user_agent:
+            self.session.headers['User-Agent'] = user_agent
+
+        self.records_lock = threading.Lock()
+        self.records = []
+
+    def close(self) -> None:
+        """
+        Closes the client's pooled connections.
+        """
+        self.session.close()
+
+    def get(self, in_query_params, attempt=0):
+        """
+        Makes a single search request and records how it went.
+
+        @param in_query_params: The query parameters to use.
+        @param attempt: Zero-based retry number (only used for the request record).
+        @return requests.Response
+        """
+        start_time = time.perf_counter()
+        with metrics.in_flight("x_api_requests_in_flight"):
+            response = self.session.get(
+                self.search_url, params=in_query_params, timeout=self.timeout)
+        latency = time.perf_counter() - start_time
+        metrics.observe("x_api_request_seconds", latency)
+        metrics.inc("x_api_requests_total", status=response.status_code)
+        metrics.inc("x_api_response_bytes_total", len(response.content))
+
+        record = RequestRecord(self.search_url, response.status_code, latency, len(response.content),
+                               int(response.headers.get('Content-Length', len(response.content))), attempt)
+        with self.records_lock:
+            self.records.append(record)
+
+        return response
+
+    def backoff_delay(self, attempt) -> float:
+        """
+        @param attempt: Zero-based retry number.
+        @return Seconds to wait; exponential backoff with jitter.
+        """
+        delay = self.base_backoff * (2 ** attempt)
+        return min(delay + random.uniform(0, delay), self.max_backoff)
+
+    def fetch_page(self, in_query_params) -> dict:
+        """
+        Fetches one page of search results, respecting the rate limit and retrying failed requests.
+
+        @param in_query_params: The query parameters to use (see build_search_params).
+        @return The decoded JSON response.
+        """
+        return json.loads(self.fetch_raw_page(in_query_params))
+
+    def fetch_raw_page(self, in_query_params) -> bytes:
+        """
+        Like fetch_page(), but returns the response body undecoded (e.g. to keep a copy of it).
+
+        @param in_query_params: The query parameters to use (see build_search_params).
+        @return The JSON response body.
+        """
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.wait_for_window()
+
+            try:
+                response = self.get(in_query_params, attempt)
+            except (requests.ConnectionError, requests.Timeout) as error:
+                metrics.inc("x_api_request_errors_total", error=type(error).__name__)
+                if attempt == self.max_retries:
+                    raise
+                metrics.inc("x_api_retries_total")
+                delay = self.backoff_delay(attempt)
+                logger.warning("X API request failed (%s); retrying in %.1fs.", error, delay)
+                time.sleep(delay)
+                continue
+
+            self.rate_limiter.update(response.headers)
+
+            if response.status_code < 400:
+                return response.content
+            if response.status_code != 429 and response.status_code < 500:
+                raise XApiError(response.status_code, error_detail(response))
+
+            if attempt < self.max_retries:
+                delay = self.rate_limiter.reset_delay(
+                    response.headers) if response.status_code == 429 else None
+                if delay is None:
+                    delay = self.backoff_delay(attempt)
+                logger.warning("X API returned %d; retrying in %.1fs.", response.status_code, delay,
+                               extra={'status': response.status_code})
+                metrics.inc("x_api_retries_total")
+                time.sleep(delay)
+
+        raise RateLimitError(
+            f"X API still returning {response.status_code} after {self.max_retries} retries.")
+
+    def request_stats(self) -> dict:
+        """
+        Summarizes every request made so far.
+
+        @return Python dictionary; request count, latency (total/mean/p50/p95/max), bytes, and status counts.
+        """
+        with self.records_lock:
+            records = list(self.records)
+
+        latencies = sorted(record.latency for record in records)
+        count = len(latencies)
+
+        def percentile(fraction):
+            return latencies[min(count - 1, int(fraction * count))] if count else 0.0
+
+        return {
+            'requests': count,
+            'retries': sum(1 for record in records if record.attempt > 0),
+            'latency_total': sum(latencies),
+            'latency_mean': (sum(latencies) / count) if count else 0.0,
+            'latency_p50': percentile(0.50),
+            'latency_p95': percentile(0.95),
+            'latency_max': latencies[-1] if count else 0.0,
+            'bytes': sum(record.bytes for record in records),
+            'wire_bytes': sum(record.wire_bytes for record in records),
+            'statuses': dict(Counter(record.status for record in records))
+        }
+
+
+_default_client = None
+
+
+def default_client() -> XClient:
+    """
+    @return The XClient shared by calls to fetch_tweets() (created on first use).
+    """
+    global _default_client
+    if _default_client is None:
+        _default_client = XClient()
+    return _default_client
+
 
 def fetch_tweets(in_query_params):
     """
@@ -30,10 +362,13 @@ def fetch_tweets(in_query_params):
 
     @param in_query_params: The query parameters to use.
     """
-    search_url = "https://api.x.com/2/tweets/search/recent"
-    auth_header = {
-        'Authorization': f'Bearer {grab_bearer_token()}'
-    }
-    response = requests.get(search_url, headers=auth_header, params=in_query_params)
-    response = json.loads(response.content.decode('utf-8'))
-    return response
+    return default_client().fetch_page(in_query_params)
+
+
+def fetch_raw_tweets(in_query_params) -> bytes:
+    """
+    Like fetch_tweets(), but returns the undecoded response body.
+
+    @param in_query_params: The query parameters to use.
+    """
+    return default_client().fetch_raw_page(in_query_params)
@@ -0,0 +1,58 @@
+"""
+Shared fixtures: a DataExporter on a temporary database, page/result builders, and an XClient talking to
+a stub X API on localhost (see fakes).
+
+Run from the repository root: python -m pytest tweet-link-app/tests
+
+@author Abigail Goodwin <abby.goodwin@outlook.com>
+Copyright 2024, Abigail Goodwin, All rights reserved.
+"""
+
+import pytest
+
+from lib.data_exporter import DataExporter
+from lib.twitter_importer import XClient
+from lib.tweet_splitter import split_page
+from tests.fakes import StubXApi, build_response, build_results
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "twitter_test.db")
+
+
+@pytest.fixture
+def exporter(db_path):
+    data_uploader = DataExporter(db_path)
+    yield data_uploader
+    data_uploader.connection.close()
+    data_uploader.connection = None
+
+
+@pytest.fixture
+def make_page():
+    """
+    @return Callable(tweet_ids, next_token=None, **kwargs) -> TweetPage (see build_response).
+    """
+    def make(tweet_ids, next_token=None, **kwargs):
+        return split_page(build_response(tweet_ids, next_token, **kwargs))
+    return make
+
+
+@pytest.fixture
+def make_results():
+    return build_results
+
+
+@pytest.fixture
+def stub_x_api():
+    stub = StubXApi()
+    yield stub
+    stub.close()
+
+
+@pytest.fixture
+def x_client(stub_x_api):
+    client = XClient(bearer_token="test-token", search_url=stub_x_api.url, max_retries=1, base_backoff=0.01)
+    yield client
+    client.close()
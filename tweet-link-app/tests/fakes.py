@@ -0,0 +1,153 @@
+"""
+Stand-ins for the app's outside world in tests: search responses shaped like the X API's (and a local HTTP
+server that serves them), and analysis results shaped like the analyzers' output.
+
+@author Abigail Goodwin <abby.goodwin@outlook.com>
+Copyright 2024, Abigail Goodwin, All rights reserved.
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from lib.data_exporter import DataExporter
+
+# Tweet IDs in the tests count down from here (newest first, like the search API returns them):
+FIRST_TWEET_ID = 1760000000000000000
+SENTIMENTS = ["positive", "neutral", "negative", "mixed"]
+
+
+def build_response(tweet_ids, next_token=None, text="tweet {id} about #Vaccines and more"):
+    """
+    @param tweet_ids: The page's tweet IDs.
+    @param next_token: (If given) the token for the following page.
+    @param text: Format string for each tweet's text ({id} is replaced by the tweet's ID).
+    @return Python dictionary shaped like one X recent-search response.
+    """
+    data = [{'id': str(tweet_id), 'author_id': str(100 + index % 3),
+             'created_at': f"2024-03-01T{10 + index % 3:02d}:00:00.000Z", 'text': text.format(id=tweet_id)}
+            for index, tweet_id in enumerate(tweet_ids)]
+    users = [{'id': str(author_id), 'name': f"User {author_id}", 'username': f"user{author_id}"}
+             for author_id in range(100, 103)]
+    meta = {'result_count': len(data)}
+    if data:
+        meta.update(newest_id=data[0]['id'], oldest_id=data[-1]['id'])
+    if next_token is not None:
+        meta['next_token'] = next_token
+    return {'data': data, 'includes': {'users': users}, 'meta': meta}
+
+
+def build_results(tweets, key_phrases=("local news", "senate vote")):
+    """
+    @param tweets: Tweets (or TweetRecords) to make analysis results for.
+    @return List of results shaped like analyze_tweets() output, derived from each tweet's ID.
+    """
+    results = []
+    for tweet in tweets:
+        seed = int(tweet['id']) % 4
+        scores = {'positive': 0.25 * seed, 'neutral': 1 - 0.25 * seed, 'negative': 0.0}
+        results.append({'id': str(tweet['id']), 'overall_sentiment': SENTIMENTS[seed],
+                        'confidence_scores': scores, 'key_phrases': list(key_phrases)})
+    return results
+
+
+def analyze_page(topic, page):
+    """
+    An IngestPipeline analyze_page stage that makes results with build_results (no analysis backend).
+    """
+    results = build_results(page.tweets)
+    return page, results, results
+
+
+def open_store(db_path):
+    """
+    @return Callable() opening a store_page on db_path, like the app's open_page_store.
+    """
+    def open_page_store():
+        data_uploader = DataExporter(db_path)
+
+        def store_page(topic, page, tweet_sentiments, tweet_keywords):
+            page = page.with_tweets(data_uploader.check_existing_tweets(page.tweets))
+            data_uploader.add_tweet_page(topic, page, tweet_sentiments, tweet_keywords)
+
+        return store_page
+    return open_page_store
+
+
+############################################################
+#   Stub X API
+############################################################
+
+class StubXApi:
+    """
+    Serves the recent-search endpoint on localhost from an in-memory corpus per topic: newest tweets first,
+    paginated with next_token, honoring max_results and since_id.
+    """
+
+    def __init__(self, page_size=100):
+        """
+        Constructor; starts serving on a free port.
+
+        @param page_size: The most tweets per page, whatever max_results asks for.
+        """
+        self.page_size = page_size
+        self.corpus = {}            # Topic -> tweet IDs, newest first
+        self.next_id = FIRST_TWEET_ID
+        self.requests = []          # Query parameters of every request, in order
+        self.statuses = []          # Error statuses to answer the next requests with, one each, before pages
+        self.lock = threading.Lock()
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                params = {name: values[0] for name, values in parse_qs(urlparse(self.path).query).items()}
+                status, body = stub.respond(params)
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True)
+        self.thread.start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/2/tweets/search/recent"
+
+    def add(self, topic, num_tweets) -> None:
+        """
+        Posts num_tweets new tweets about a topic (IDs are unique across topics).
+        """
+        with self.lock:
+            new_ids = list(range(self.next_id + num_tweets - 1, self.next_id - 1, -1))
+            self.next_id += num_tweets
+            self.corpus[topic] = new_ids + self.corpus.get(topic, [])
+
+    def respond(self, params):
+        """
+        @return (status, body) for one request.
+        """
+        with self.lock:
+            self.requests.append(params)
+            if self.statuses:
+                status = self.statuses.pop(0)
+                return status, {'title': f"Error {status}", 'status': status, 'detail': f"Stub error {status}."}
+
+            topic = params['query'].split(" -is:retweet")[0]
+            since_id = int(params.get('since_id', 0))
+            offset = int(params.get('next_token', 0))
+            max_results = min(int(params['max_results']), self.page_size)
+
+            matching = [tweet_id for tweet_id in self.corpus.get(topic, []) if tweet_id > since_id]
+            page_ids = matching[offset:offset + max_results]
+            next_offset = offset + len(page_ids)
+            return 200, build_response(page_ids, str(next_offset) if next_offset < len(matching) else None)
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,127 @@
+"""
+Tests for AnalysisCache's exact-text results (lookup/store/evict) and analyze_with_cache.
+
+@author Abigail Goodwin <abby.goodwin@outlook.com>
+Copyright 2024, Abigail Goodwin, All rights reserved.
+"""
+
+import itertools
+
+import pytest
+
+from lib import analysis_cache
+from lib.analysis_cache import AnalysisCache, normalize_text
+from lib.sentiment_analyzer import analyze_with_cache
+
+SCORES = {'positive': 0.75, 'neutral': 0.2, 'negative': 0.05}
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / "analysis_cache.db")
+
+
+@pytest.fixture
+def cache(cache_path):
+    # Near-duplicate sharing is left off, so only identical (normalized) texts share a result:
+    result_cache = AnalysisCache(cache_path, min_similarity=None)
+    yield result_cache
+    result_cache.close()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # A clock that ticks once per call, so least-recently-used order never depends on timer resolution:
+    ticks = itertools.count(1)
+    monkeypatch.setattr(analysis_cache.time, "time", lambda: float(next(ticks)))
+
+
+def result(tweet_id, sentiment="positive", key_phrases=("local news",)):
+    return {'id': str(tweet_id), 'overall_sentiment': sentiment, 'confidence_scores': SCORES,
+            'key_phrases': list(key_phrases)}
+
+
+def test_normalize_text_ignores_links_case_and_spacing():
+    assert normalize_text("Get  your #Vaccines\nhttps://t.co/AbC123") \
+        == normalize_text("get your #vaccines https://t.co/XyZ789 ")
+
+
+def test_stored_results_are_returned_for_the_same_text(cache, cache_path):
+    cache.store([{'id': "1", 'text': "Get your #Vaccines https://t.co/AbC123"}], [result(1)])
+
+    hits, misses = cache.lookup([{'id': "2", 'text': "get your #vaccines https://t.co/XyZ789"},
+                                 {'id': "3", 'text': "Something else entirely"}])
+
+    assert [tweet['id'] for tweet in misses] == ["3"]
+    assert len(hits) == 1
+    assert (hits[0]['id'], hits[0]['overall_sentiment'], hits[0]['confidence_scores'], hits[0]['key_phrases']) \
+        == ("2", "positive", SCORES, ["local news"])
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+    # Results outlive the cache object:
+    reopened = AnalysisCache(cache_path, min_similarity=None)
+    try:
+        assert len(reopened.lookup([{'id': "4", 'text': "Get your #Vaccines https://t.co/AbC123"}])[0]) == 1
+    finally:
+        reopened.close()
+
+
+def test_results_from_another_model_version_are_ignored(cache, cache_path):
+    cache.store([{'id': "1", 'text': "Get your #Vaccines"}], [result(1)])
+
+    newer = AnalysisCache(cache_path, model_version="2024-03-01", min_similarity=None)
+    try:
+        hits, misses = newer.lookup([{'id': "1", 'text': "Get your #Vaccines"}])
+    finally:
+        newer.close()
+
+    assert hits == [] and len(misses) == 1
+
+
+def test_partial_results_only_hit_when_they_are_enough(cache):
+    tweet = {'id': "1", 'text': "Get your #Vaccines"}
+    cache.store([tweet], [{'id': "1", 'overall_sentiment': "negative", 'confidence_scores': SCORES}])
+
+    assert len(cache.lookup([tweet], need_key_phrases=False)[0]) == 1
+    assert len(cache.lookup([tweet])[1]) == 1
+
+    # Key phrases stored later are merged with the cached sentiment:
+    cache.store([tweet], [{'id': "1", 'key_phrases': ["vaccines"]}])
+    hits, _ = cache.lookup([tweet])
+    assert (hits[0]['overall_sentiment'], hits[0]['key_phrases']) == ("negative", ["vaccines"])
+
+
+def test_least_recently_used_results_are_evicted(cache_path, clock):
+    cache = AnalysisCache(cache_path, max_bytes=350, min_similarity=None)
+    try:
+        tweets = [{'id': str(tweet_id), 'text': f"tweet number {tweet_id} about vaccines"} for tweet_id in range(4)]
+        cache.store(tweets[:2], [result(0), result(1)])
+        cache.lookup(tweets[:1])                    # tweet 1 is now the least recently used
+
+        cache.store(tweets[2:], [result(2), result(3)])
+
+        hits, misses = cache.lookup(tweets)
+        assert [tweet['id'] for tweet in misses] == ["1"]
+        assert [tweet_info['id'] for tweet_info in hits] == ["0", "2", "3"]
+        assert cache.stats()['evictions'] == 1
+    finally:
+        cache.close()
+
+
+def test_analyze_with_cache_only_analyzes_each_text_once(cache):
+    analyzed = []
+
+    def analyze(tweet_list):
+        analyzed.extend(tweet['id'] for tweet in tweet_list)
+        return [result(tweet['id']) for tweet in tweet_list]
+
+    tweets = [{'id': "1", 'text': "Get your #Vaccines"}, {'id': "2", 'text': "A different tweet"},
+              {'id': "3", 'text': "get your  #vaccines"}]
+
+    first = analyze_with_cache(tweets, analyze, cache)
+    second = analyze_with_cache(tweets, analyze, cache)
+
+    assert analyzed == ["1", "2"]
+    assert [tweet_info['id'] for tweet_info in first] == ["1", "2", "3"]
+    assert [tweet_info['id'] for tweet_info in second] == ["1", "2", "3"]
+    assert first[0]['cluster_id'] == first[2]['cluster_id'] != first[1]['cluster_id']
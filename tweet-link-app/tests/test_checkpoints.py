@@ -0,0 +1,110 @@
+"""
+Tests for the per-topic ingest checkpoints (DataExporter.start_checkpoint/save_checkpoint), and for
+IngestPipeline resuming an interrupted pass from one.
+
+@author Abigail Goodwin <abby.goodwin@outlook.com>
+Copyright 2024, Abigail Goodwin, All rights reserved.
+"""
+
+import pytest
+
+from lib.ingest_pipeline import IngestPipeline
+from tests.fakes import FIRST_TWEET_ID, analyze_page, open_store
+
+
+def page_ids(start, n):
+    return range(FIRST_TWEET_ID - start, FIRST_TWEET_ID - start - n, -1)
+
+
+def test_new_pass_starts_running_from_the_newest_tweets(exporter):
+    checkpoint = exporter.start_checkpoint("vaccines", 20)
+
+    assert (checkpoint['status'], checkpoint['next_token'], checkpoint['since_id'], checkpoint['target_count']) \
+        == ("running", None, None, 20)
+
+
+def test_pages_advance_the_checkpoint_with_their_data(exporter, make_page, make_results):
+    exporter.start_checkpoint("vaccines", 20)
+    page = make_page(page_ids(0, 10), next_token="10")
+
+    exporter.add_tweet_page("vaccines", page, make_results(page.tweets), None)
+
+    checkpoint = exporter.load_checkpoint("vaccines")
+    assert (checkpoint['status'], checkpoint['next_token'], checkpoint['pass_fetched']) == ("running", "10", 10)
+    assert (checkpoint['newest_id'], checkpoint['oldest_id']) == (FIRST_TWEET_ID, FIRST_TWEET_ID - 9)
+    assert (checkpoint['pages_fetched'], checkpoint['total_stored']) == (1, 10)
+
+
+def test_interrupted_pass_is_resumed_where_it_stopped(exporter, make_page, make_results):
+    exporter.start_checkpoint("vaccines", 20)
+    page = make_page(page_ids(0, 10), next_token="10")
+    exporter.add_tweet_page("vaccines", page, make_results(page.tweets), None)
+
+    checkpoint = exporter.start_checkpoint("vaccines", 30)
+
+    assert (checkpoint['status'], checkpoint['next_token'], checkpoint['pass_fetched']) == ("running", "10", 10)
+    assert exporter.load_checkpoint("vaccines")['target_count'] == 30
+
+
+@pytest.mark.parametrize("next_token", [None, "10"])
+def test_pass_completes_at_the_last_page_or_the_target(exporter, make_page, make_results, next_token):
+    exporter.start_checkpoint("vaccines", 10)
+    page = make_page(page_ids(0, 10), next_token=next_token)
+
+    exporter.add_tweet_page("vaccines", page, make_results(page.tweets), None)
+
+    checkpoint = exporter.load_checkpoint("vaccines")
+    assert (checkpoint['status'], checkpoint['next_token']) == ("complete", None)
+
+
+def test_next_pass_stops_at_the_newest_stored_tweet(exporter, make_page, make_results):
+    exporter.start_checkpoint("vaccines", 10)
+    page = make_page(page_ids(0, 10))
+    exporter.add_tweet_page("vaccines", page, make_results(page.tweets), None)
+
+    checkpoint = exporter.start_checkpoint("vaccines", 10)
+
+    assert (checkpoint['status'], checkpoint['since_id'], checkpoint['pass_fetched']) \
+        == ("running", FIRST_TWEET_ID, 0)
+    assert checkpoint['total_fetched'] == 10
+
+
+def test_pages_without_a_running_pass_leave_checkpoints_alone(exporter, make_page, make_results):
+    page = make_page(page_ids(0, 10), next_token="10")
+
+    exporter.add_tweet_page("vaccines", page, make_results(page.tweets), None)
+
+    assert exporter.load_checkpoint("vaccines") is None
+
+
+def test_pipeline_resumes_an_interrupted_pass(exporter, db_path, stub_x_api, x_client):
+    stub_x_api.page_size = 10
+    stub_x_api.add("vaccines", 50)
+    stored_pages = []
+
+    def open_store_that_stops():
+        store_page = open_store(db_path)()
+
+        def store_page_then_stop(topic, page, tweet_sentiments, tweet_keywords):
+            if len(stored_pages) == 2:
+                raise RuntimeError("interrupted")
+            store_page(topic, page, tweet_sentiments, tweet_keywords)
+            stored_pages.append(page)
+
+        return store_page_then_stop
+
+    pipeline = IngestPipeline(analyze_page, open_store_that_stops, client=x_client)
+    with pytest.raises(RuntimeError, match="interrupted"):
+        pipeline.run(["vaccines"], 40, {"vaccines": exporter.start_checkpoint("vaccines", 40)})
+    interrupted = exporter.load_checkpoint("vaccines")
+    assert (interrupted['status'], interrupted['pass_fetched'], interrupted['next_token']) == ("running", 20, "20")
+
+    stub_x_api.requests.clear()
+    pipeline = IngestPipeline(analyze_page, open_store(db_path), client=x_client)
+    counts = pipeline.run(["vaccines"], 40, {"vaccines": exporter.start_checkpoint("vaccines", 40)})
+
+    assert counts == {"vaccines": 20}
+    assert stub_x_api.requests[0]['next_token'] == "20"
+    checkpoint = exporter.load_checkpoint("vaccines")
+    assert (checkpoint['status'], checkpoint['pass_fetched'], checkpoint['total_stored']) == ("complete", 40, 40)
+    assert exporter.cursor.execute("SELECT COUNT(*) FROM Tweets").fetchone()[0] == 40
@@ -0,0 +1,151 @@
+"""
+Tests for tweet-scan-app.py's command line: its flags, the topics file, and the --interval (daemon) loop.
+
+@author Abigail Goodwin <abby.goodwin@outlook.com>
+Copyright 2024, Abigail Goodwin, All rights reserved.
+"""
+
+import importlib.util
+import os
+
+import pytest
+
+import lib.sentiment_analyzer as sentiment_analyzer
+import lib.twitter_importer as twitter_importer
+from lib.twitter_importer import XApiError
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), "tweet-scan-app.py")
+
+
+@pytest.fixture
+def app(monkeypatch):
+    spec = importlib.util.spec_from_file_location("tweet_scan_app", APP_PATH)
+    app_module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(app_module)
+    # Leave the process's logging, signal handlers and analysis backend as they were:
+    monkeypatch.setattr(app_module, "configure_logging", lambda level, log_format: None)
+    monkeypatch.setattr(app_module.signal, "signal", lambda signal_number, handler: None)
+    monkeypatch.setattr(sentiment_analyzer, "_backend", sentiment_analyzer._backend)
+    monkeypatch.setattr(sentiment_analyzer, "_default_engine", None)
+    return app_module
+
+
+############################################################
+#   Arguments
+############################################################
+
+def test_defaults(app):
+    args = app.parse_args([])
+
+    assert args.topics == [] and args.topics_file is None
+    assert (args.count, args.interval, args.workers, args.processes) == (500, 0, None, 0)
+    assert (args.backend, args.db, args.storage_profile) == ("azure", None, "balanced")
+    assert (args.stop_phrases, args.export_dir, args.metrics_file, args.cprofile) == (None, None, None, None)
+    assert (args.log_level, args.log_format) == ("INFO", "text")
+
+
+def test_every_flag(app):
+    args = app.parse_args(["vaccines", "gun control", "--topics-file", "topics.txt", "--count", "1000",
+                           "--interval", "900", "--workers", "2", "--processes", "4", "--backend", "local",
+                           "--db", "tweets.db", "--storage-profile", "bulk", "--stop-phrases", "stop.txt",
+                           "--export-dir", "exports", "--metrics-file", "metrics.prom", "--cprofile", "pull.prof",
+                           "--log-level", "DEBUG", "--log-format", "json"])
+
+    assert args.topics == ["vaccines", "gun control"] and args.topics_file == "topics.txt"
+    assert (args.count, args.interval, args.workers, args.processes) == (1000, 900.0, 2, 4)
+    assert (args.backend, args.db, args.storage_profile) == ("local", "tweets.db", "bulk")
+    assert (args.stop_phrases, args.export_dir, args.metrics_file, args.cprofile) \
+        == ("stop.txt", "exports", "metrics.prom", "pull.prof")
+    assert (args.log_level, args.log_format) == ("DEBUG", "json")
+
+
+@pytest.mark.parametrize("argv", [
+    ["--count", "0"],
+    ["--workers", "0"],
+    ["--processes", "-1"],
+    ["--interval", "-1"],
+    ["--count", "many"],
+    ["--backend", "openai"],
+    ["--storage-profile", "fastest"],
+    ["--log-format", "xml"],
+])
+def test_invalid_flags_are_rejected(app, argv, capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        app.parse_args(argv)
+
+    assert exit_info.value.code == 2
+    assert argv[0] in capsys.readouterr().err
+
+
+def test_topics_file(app, tmp_path):
+    topics_file = tmp_path / "topics.txt"
+    topics_file.write_text("# Weekly topics\nvaccines\n\n  climate  \n   # indented comment\nvaccines\nelections\n")
+
+    assert app.read_topics(["elections", " ", "gun control"], str(topics_file)) \
+        == ["elections", "gun control", "vaccines", "climate"]
+    assert app.read_topics(["vaccines", "vaccines "]) == ["vaccines"]
+
+
+def test_no_topics_without_a_terminal(app, monkeypatch):
+    monkeypatch.setattr(app.sys.stdin, "isatty", lambda: False, raising=False)
+
+    assert app.main(["--backend", "local"]) == 2
+
+
+def test_missing_stop_phrases_file(app, tmp_path):
+    assert app.main(["vaccines", "--backend", "local", "--stop-phrases", str(tmp_path / "missing.txt")]) == 2
+
+
+############################################################
+#   Passes
+############################################################
+
+def test_single_pass(app, db_path, monkeypatch):
+    passes = []
+    monkeypatch.setattr(app, "run_pass", lambda topics, args, columnar_exporter=None: passes.append(topics))
+
+    assert app.main(["vaccines", "climate", "--backend", "local", "--db", db_path]) == 0
+    assert passes == [["vaccines", "climate"]]
+
+
+def test_daemon_loop_retries_failed_passes_until_stopped(app, db_path, monkeypatch):
+    passes = []
+
+    def run_pass(topics, args, columnar_exporter=None):
+        passes.append(topics)
+        if len(passes) == 1:
+            raise ValueError("X API response for vaccines has no 'meta'")
+        app.stop_requested.set()
+
+    monkeypatch.setattr(app, "run_pass", run_pass)
+
+    assert app.main(["vaccines", "--backend", "local", "--db", db_path, "--interval", "0.01"]) == 0
+    assert len(passes) == 2
+
+
+def test_daemon_loop_stops_on_rejected_requests(app, db_path, monkeypatch):
+    passes = []
+
+    def run_pass(topics, args, columnar_exporter=None):
+        passes.append(topics)
+        raise XApiError(401, "Unauthorized")
+
+    monkeypatch.setattr(app, "run_pass", run_pass)
+
+    assert app.main(["vaccines", "--backend", "local", "--db", db_path, "--interval", "0.01"]) == 1
+    assert len(passes) == 1
+
+
+def test_pages_without_meta_raise(app, exporter, monkeypatch):
+    monkeypatch.setattr(twitter_importer, "fetch_raw_tweets", lambda query_params: b'{"title": "Unauthorized"}')
+
+    with pytest.raises(ValueError, match="Unauthorized"):
+        app.pull_topic_tweets("vaccines", None, exporter)
+
+
+def test_single_pass_reports_pages_without_meta(app, db_path, tmp_path, monkeypatch):
+    monkeypatch.setattr(twitter_importer, "fetch_raw_tweets", lambda query_params: b'{"errors": []}')
+
+    # --cprofile pulls through pull_topic_tweets rather than the pipeline:
+    assert app.main(["vaccines", "--backend", "local", "--db", db_path,
+                     "--cprofile", str(tmp_path / "pull.prof")]) == 1
@@ -0,0 +1,103 @@
+"""
+Tests for ColumnarExporter's incremental Parquet exports: the rowid watermark, and recovery from an export
+that was interrupted while publishing its files.
+
+@author Abigail Goodwin <abby.goodwin@outlook.com>
+Copyright 2024, Abigail Goodwin, All rights reserved.
+"""
+
+import glob
+import json
+import os
+
+import pytest
+
+pyarrow_parquet = pytest.importorskip("pyarrow.parquet")
+
+from lib import columnar_export
+from lib.columnar_export import STATE_FILE_NAME, ColumnarExporter
+from tests.fakes import FIRST_TWEET_ID
+
+
+@pytest.fixture
+def out_dir(tmp_path):
+    return str(tmp_path / "exports")
+
+
+def store_page(exporter, make_page, make_results, start, n, with_results=True):
+    page = make_page(range(FIRST_TWEET_ID - start, FIRST_TWEET_ID - start - n, -1))
+    results = make_results(page.tweets) if with_results else None
+    exporter.add_tweet_page("vaccines", page, results, results)
+
+
+def exported_tweet_ids(out_dir, dataset_name="tweets"):
+    paths = glob.glob(os.path.join(out_dir, dataset_name, "topic=*", "date=*", "*.parquet"))
+    return sorted(tweet_id for path in paths
+                  for tweet_id in pyarrow_parquet.read_table(path).column("tweet_id").to_pylist())
+
+
+def test_each_export_only_writes_tweets_stored_since_the_last(exporter, db_path, out_dir, make_page, make_results):
+    columnar_exporter = ColumnarExporter(out_dir, db_path, chunk_size=4)
+    store_page(exporter, make_page, make_results, 0, 6)
+
+    first = columnar_exporter.export()
+    unchanged = columnar_exporter.export()
+    store_page(exporter, make_page, make_results, 6, 3)
+    second = columnar_exporter.export()
+
+    assert (first['rows']['tweets'], first['rows']['hashtags'], first['rows']['key_phrases']) == (6, 6, 12)
+    assert (unchanged['rows']['tweets'], unchanged['files']) == (0, 0)
+    assert second['rows']['tweets'] == 3 and second['watermark'] == 9
+    assert exported_tweet_ids(out_dir) == list(range(FIRST_TWEET_ID - 8, FIRST_TWEET_ID + 1))
+    # Tweets are partitioned by topic and day:
+    assert {os.path.basename(os.path.dirname(path)) for path in
+            glob.glob(os.path.join(out_dir, "tweets", "topic=vaccines", "*", "*.parquet"))} == {"date=2024-03-01"}
+    with open(os.path.join(out_dir, STATE_FILE_NAME)) as state_file:
+        assert json.load(state_file)['watermark'] == 9
+
+
+def test_later_results_for_exported_tweets_are_not_stored(exporter, db_path, out_dir, make_page, make_results):
+    # The watermark only covers each tweet's rows because they're never added to after it's stored:
+    store_page(exporter, make_page, make_results, 0, 3, with_results=False)
+    ColumnarExporter(out_dir, db_path).export()
+
+    store_page(exporter, make_page, make_results, 0, 3)
+
+    assert exporter.cursor.execute("SELECT COUNT(*) FROM TweetSentiment").fetchone()[0] == 0
+    assert exporter.cursor.execute("SELECT COUNT(*) FROM TweetKeyPhrases").fetchone()[0] == 0
+
+
+def test_interrupted_publish_is_finished_by_the_next_export(exporter, db_path, out_dir, make_page, make_results,
+                                                           monkeypatch):
+    store_page(exporter, make_page, make_results, 0, 5)
+    replace = os.replace
+
+    def replace_state_only(source, destination):
+        if destination.endswith(".parquet"):
+            raise OSError("interrupted")
+        replace(source, destination)
+
+    monkeypatch.setattr(columnar_export.os, "replace", replace_state_only)
+    with pytest.raises(OSError, match="interrupted"):
+        ColumnarExporter(out_dir, db_path).export()
+    monkeypatch.setattr(columnar_export.os, "replace", replace)
+    assert exported_tweet_ids(out_dir) == []
+
+    stats = ColumnarExporter(out_dir, db_path).export()
+
+    assert stats['rows']['tweets'] == 0 and stats['watermark'] == 5
+    assert len(exported_tweet_ids(out_dir)) == 5
+    assert glob.glob(os.path.join(out_dir, "**", ".*.tmp"), recursive=True) == []
+
+
+def test_files_of_a_failed_export_are_removed_and_rewritten(exporter, db_path, out_dir, make_page, make_results):
+    store_page(exporter, make_page, make_results, 0, 5)
+    stale_folder = os.path.join(out_dir, "tweets", "topic=vaccines", "date=2024-03-01")
+    os.makedirs(stale_folder)
+    with open(os.path.join(stale_folder, ".part-000000000001-000000000005.parquet.tmp"), "w") as stale_file:
+        stale_file.write("half-written")
+
+    stats = ColumnarExporter(out_dir, db_path).export()
+
+    assert stats['rows']['tweets'] == 5
+    assert os.listdir(stale_folder) == ["part-000000000001-000000000005.parquet"]
@@ -0,0 +1,99 @@
+"""
+Tests for DataExporter's bulk page loading (add_tweet_page / add_tweet_pages).
+
+@author Abigail Goodwin <abby.goodwin@outlook.com>
+Copyright 2024, Abigail Goodwin, All rights reserved.
+"""
+
+import sqlite3
+
+import pytest
+
+from lib.tweet_splitter import split_page
+from tests.fakes import FIRST_TWEET_ID, build_response
+
+
+def count(exporter, table_name):
+    return exporter.cursor.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+
+
+def test_add_tweet_page_stores_every_table(exporter, make_page, make_results):
+    page = make_page(range(FIRST_TWEET_ID, FIRST_TWEET_ID - 10, -1))
+    results = make_results(page.tweets)
+
+    exporter.add_tweet_page("vaccines", page, results, results)
+
+    assert count(exporter, "Tweets") == 10
+    assert count(exporter, "Users") == 3
+    assert count(exporter, "TweetSentiment") == 10
+    assert count(exporter, "TweetConfidence") == 30
+    assert count(exporter, "TweetKeyPhrases") == 20
+    assert count(exporter, "TweetHashtags") == 10
+    assert exporter.cursor.execute("SELECT DISTINCT TweetTopic FROM Tweets").fetchall() == [("vaccines",)]
+
+
+def test_add_tweet_page_counts_only_rows_actually_written(exporter, make_page, make_results):
+    page = make_page(range(FIRST_TWEET_ID, FIRST_TWEET_ID - 10, -1))
+    results = make_results(page.tweets)
+
+    first = exporter.add_tweet_page("vaccines", page, results, results)
+    second = exporter.add_tweet_page("vaccines", page, results, results)
+
+    # 10 tweets, 3 users, 1 topic, 1 hashtag, 2 phrases, 10 + 30 + 20 + 10 junction rows, and the rollups:
+    assert first['rows'] > 87
+    # Every row of the repeat is skipped as a duplicate, so nothing is counted as written:
+    assert second['rows'] == 0
+    assert count(exporter, "Tweets") == 10
+
+
+def test_add_tweet_pages_writes_every_page_in_one_transaction(exporter, make_page, make_results):
+    pages = [make_page(range(FIRST_TWEET_ID - offset, FIRST_TWEET_ID - offset - 5, -1))
+             for offset in (0, 5, 10)]
+
+    exporter.add_tweet_pages([("vaccines", page, make_results(page.tweets), make_results(page.tweets))
+                              for page in pages])
+
+    assert count(exporter, "Tweets") == 15
+    assert not exporter.connection.in_transaction
+
+
+def test_failed_page_rolls_back_the_whole_batch(exporter, make_page, make_results):
+    good_page = make_page(range(FIRST_TWEET_ID, FIRST_TWEET_ID - 5, -1))
+    bad_page = make_page(range(FIRST_TWEET_ID - 5, FIRST_TWEET_ID - 10, -1))
+    exporter.cursor.execute(f"""
+        CREATE TRIGGER FailInsert BEFORE INSERT ON Tweets WHEN NEW.TweetID = {FIRST_TWEET_ID - 7}
+        BEGIN SELECT RAISE(ABORT, 'test failure'); END
+    """)
+
+    with pytest.raises(sqlite3.Error):
+        exporter.add_tweet_pages([("vaccines", good_page, make_results(good_page.tweets), None),
+                                  ("vaccines", bad_page, make_results(bad_page.tweets), None)])
+
+    assert count(exporter, "Tweets") == 0
+    assert count(exporter, "Users") == 0
+    assert all(len(cache) == 0 for cache in exporter.key_caches.values())
+
+
+def test_tweets_whose_author_is_missing_are_stored_with_a_placeholder(exporter, make_page, make_results, caplog):
+    # The API leaves withheld or suspended authors (here, user 101) out of includes.users:
+    response = build_response(range(FIRST_TWEET_ID - 5, FIRST_TWEET_ID - 10, -1))
+    response['includes']['users'] = [user for user in response['includes']['users'] if user['id'] != "101"]
+    page = split_page(response)
+    other_page = make_page(range(FIRST_TWEET_ID, FIRST_TWEET_ID - 5, -1))
+
+    exporter.add_tweet_pages([("vaccines", other_page, make_results(other_page.tweets), None),
+                              ("vaccines", page, make_results(page.tweets), None)])
+
+    assert count(exporter, "Tweets") == 10
+    assert count(exporter, "TweetSentiment") == 10
+    # User 101 was on the other page, so their row keeps its details:
+    assert exporter.cursor.execute("SELECT UserHandle FROM Users WHERE AuthorID = 101").fetchone() == ("user101",)
+    assert "1 authors missing from a vaccines page" in caplog.text
+
+    exporter.add_tweet_page("climate", split_page(dict(response, data=[dict(response['data'][0], id="42",
+                                                                             author_id="999")])))
+
+    assert exporter.cursor.execute("""
+        SELECT U.UserHandle, U.UserName FROM Tweets AS T INNER JOIN Users AS U ON T.TweetAuthorID = U.UserID
+        WHERE T.TweetID = 42
+    """).fetchone() == ("", "")
@@ -0,0 +1,73 @@
+"""
+Tests for IngestPipeline against a stub X API on localhost and a temporary database.
+
+@author Abigail Goodwin <abby.goodwin@outlook.com>
+Copyright 2024, Abigail Goodwin, All rights reserved.
+"""
+
+import threading
+
+import pytest
+
+from lib.ingest_pipeline import IngestPipeline
+from tests.fakes import analyze_page, open_store
+
+
+def test_pipeline_stores_every_topic_and_completes_checkpoints(exporter, db_path, stub_x_api, x_client):
+    stub_x_api.page_size = 20
+    for topic in ("vaccines", "gun control"):
+        stub_x_api.add(topic, 100)
+    checkpoints = {topic: exporter.start_checkpoint(topic, 50) for topic in ("vaccines", "gun control")}
+
+    pipeline = IngestPipeline(analyze_page, open_store(db_path), client=x_client, max_topics=2)
+    counts = pipeline.run(["vaccines", "gun control"], 50, checkpoints)
+
+    # Pages of 20, 20, then 10 (the last page only asks for what's still needed):
+    assert counts == {"vaccines": 50, "gun control": 50}
+    stored = dict(exporter.cursor.execute("SELECT TweetTopic, COUNT(*) FROM Tweets GROUP BY TweetTopic"))
+    assert stored == {"vaccines": 50, "gun control": 50}
+    assert exporter.cursor.execute("SELECT COUNT(*) FROM TweetSentiment").fetchone()[0] == 100
+    for topic in ("vaccines", "gun control"):
+        checkpoint = exporter.load_checkpoint(topic)
+        assert (checkpoint['status'], checkpoint['pass_fetched'], checkpoint['total_stored']) == ("complete", 50, 50)
+
+
+def test_next_pass_only_fetches_newer_tweets(exporter, db_path, stub_x_api, x_client):
+    stub_x_api.add("vaccines", 30)
+    pipeline = IngestPipeline(analyze_page, open_store(db_path), client=x_client)
+    pipeline.run(["vaccines"], 100, {"vaccines": exporter.start_checkpoint("vaccines", 100)})
+
+    stub_x_api.add("vaccines", 5)
+    pipeline = IngestPipeline(analyze_page, open_store(db_path), client=x_client)
+    counts = pipeline.run(["vaccines"], 100, {"vaccines": exporter.start_checkpoint("vaccines", 100)})
+
+    assert counts == {"vaccines": 5}
+    assert stub_x_api.requests[-1]['since_id'] == str(max(stub_x_api.corpus["vaccines"][5:]))
+    assert exporter.cursor.execute("SELECT COUNT(*) FROM Tweets").fetchone()[0] == 35
+
+
+def test_writer_failure_stops_fetching_and_analysis(exporter, db_path, stub_x_api, x_client):
+    stub_x_api.page_size = 10
+    stub_x_api.add("vaccines", 300)
+    checkpoints = {"vaccines": exporter.start_checkpoint("vaccines", 300)}
+    analyzed = []
+    analyzed_lock = threading.Lock()
+
+    def counting_analyze_page(topic, page):
+        with analyzed_lock:
+            analyzed.append(len(page))
+        return analyze_page(topic, page)
+
+    def open_failing_store():
+        def store_page(topic, page, tweet_sentiments, tweet_keywords):
+            raise RuntimeError("disk full")
+        return store_page
+
+    pipeline = IngestPipeline(counting_analyze_page, open_failing_store, client=x_client)
+    with pytest.raises(RuntimeError, match="disk full"):
+        pipeline.run(["vaccines"], 300, checkpoints)
+
+    # Only the pages already queued or in flight when the writer failed (of 30) were fetched and analyzed:
+    assert len(analyzed) <= 6
+    assert len(stub_x_api.requests) <= 10
+    assert exporter.load_checkpoint("vaccines")['status'] == "running"
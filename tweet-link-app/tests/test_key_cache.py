@@ -0,0 +1,82 @@
+"""
+Tests for the exporter's in-process caches (KeyCache, RecentIds) and how DataExporter uses them.
+
+@author Abigail Goodwin <abby.goodwin@outlook.com>
+Copyright 2024, Abigail Goodwin, All rights reserved.
+"""
+
+from lib.data_exporter import DataExporter
+from lib.key_cache import KeyCache, RecentIds
+
+
+def test_key_cache_evicts_least_recently_used():
+    cache = KeyCache(capacity=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1          # "b" is now the least recently used
+
+    cache.put("c", 3)
+
+    assert "b" not in cache
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats()['evictions'] == 1
+
+
+def test_key_cache_counts_hits_and_misses():
+    cache = KeyCache(capacity=10)
+    cache.put("a", 1)
+
+    cache.get("a")
+    cache.get("missing")
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['hit_rate']) == (1, 1, 0.5)
+
+
+def test_key_cache_with_no_capacity_stores_nothing():
+    cache = KeyCache(capacity=0)
+    cache.put("a", 1)
+    assert len(cache) == 0 and cache.get("a") is None
+
+
+def test_recent_ids_forget_oldest_first():
+    recent = RecentIds(capacity=3)
+    recent.add_all([1, 2, 3])
+    recent.add_all([1])             # refreshed, so 2 is now the oldest
+    recent.add_all([4])
+
+    assert 2 not in recent
+    assert all(tweet_id in recent for tweet_id in (1, 3, 4))
+
+
+def test_recent_ids_filter_unseen_compares_ids_as_strings():
+    recent = RecentIds()
+    recent.add_all([10, "11"])
+
+    unseen = recent.filter_unseen([{'id': "10"}, {'id': 11}, {'id': "12"}])
+
+    assert unseen == [{'id': "12"}]
+    assert (recent.stats()['hits'], recent.stats()['misses']) == (2, 1)
+
+
+def test_exporter_warms_its_key_caches_from_the_database(exporter, db_path, make_page, make_results):
+    page = make_page(range(200, 190, -1))
+    exporter.add_tweet_page("vaccines", page, make_results(page.tweets), make_results(page.tweets))
+
+    reopened = DataExporter(db_path)
+    try:
+        assert len(reopened.key_caches["Users"]) == 3
+        user_keys = reopened.resolve_keys("Users", ["100", "101", "102"])
+        assert len(user_keys) == 3
+        assert reopened.key_caches["Users"].stats()['misses'] == 0
+    finally:
+        reopened.connection.close()
+        reopened.connection = None
+
+
+def test_exporter_skips_recently_stored_tweets_without_a_query(exporter, make_page, make_results):
+    page = make_page(range(200, 190, -1))
+    exporter.add_tweet_page("vaccines", page, make_results(page.tweets), None)
+
+    assert exporter.check_existing_tweets(page.tweets) == []
+    assert exporter.seen_tweet_ids.stats()['hits'] == 10
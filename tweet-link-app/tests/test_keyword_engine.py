@@ -0,0 +1,65 @@
+"""
+Tests for KeywordEngine's key phrase filtering: the topic check, stop phrases and junk phrases.
+
+@author Abigail Goodwin <abby.goodwin@outlook.com>
+Copyright 2024, Abigail Goodwin, All rights reserved.
+"""
+
+import time
+
+import pytest
+
+from lib import keyword_engine
+from lib.keyword_engine import KeywordEngine, add_stop_phrases, read_stop_phrases
+
+
+@pytest.fixture
+def engine():
+    return KeywordEngine()
+
+
+@pytest.mark.parametrize("phrase", ["Gun Control", "gun-control laws", "#GunControl", "new GUN_CONTROL bill"])
+def test_phrases_mentioning_the_topic_are_dropped(engine, phrase):
+    assert not engine.is_kept("gun control", phrase)
+    assert engine.is_kept(None, phrase)
+
+
+@pytest.mark.parametrize("phrase", ["RT", " t.co ", "https t.co", "", "   ", "https://t.co/AbC123", "@someone",
+                                    "@someone https://t.co/AbC123", "2024", "!!!", "1. 2. 3.", "#", "t.co/AbC123"])
+def test_stop_phrases_and_junk_are_dropped(engine, phrase):
+    assert not engine.is_kept("vaccines", phrase)
+
+
+@pytest.mark.parametrize("phrase", ["county library", "@someone's post office", "2024 election", "1. 2. 3. tips",
+                                    "https://t.co/AbC123 flu shots"])
+def test_phrases_with_words_are_kept(engine, phrase):
+    assert engine.is_kept("vaccines", phrase)
+
+
+@pytest.mark.parametrize("phrase", ["!" * 24 + "a", " ." * 10 + " x", "1. 2. 3. 4. 5. 6. tips",
+                                    "!" * 5000 + "a", "1. " * 2000 + "tips", "@a " * 2000 + "b"])
+def test_junk_check_is_fast_on_long_runs_of_punctuation(engine, phrase):
+    start = time.perf_counter()
+    kept = engine.is_kept("vaccines", phrase)
+
+    assert kept
+    assert time.perf_counter() - start < 0.1
+
+
+def test_filter_phrases_drops_repeats_and_keeps_order(engine):
+    assert engine.filter_phrases("vaccines", ["flu shots", "RT", "Vaccines", "county library", "flu shots"]) \
+        == ["flu shots", "county library"]
+
+
+def test_added_stop_phrases_apply_to_new_engines(tmp_path, monkeypatch):
+    monkeypatch.setattr(keyword_engine, "_stop_phrases", set(keyword_engine.DEFAULT_STOP_PHRASES))
+    path = tmp_path / "stop_phrases.txt"
+    path.write_text("# Filler from local news accounts\nBreaking News\n\n  county update  \n")
+
+    existing = KeywordEngine()
+    add_stop_phrases(read_stop_phrases(str(path)))
+
+    assert read_stop_phrases(str(path)) == ["Breaking News", "county update"]
+    assert not KeywordEngine().is_kept("vaccines", "breaking news")
+    assert existing.is_kept("vaccines", "breaking news")
+    assert KeywordEngine(stop_phrases=["flu shots"]).is_kept("vaccines", "RT")
@@ -0,0 +1,67 @@
+"""
+Tests for LocalAnalyzer's lexicon sentiment and RAKE-style key phrases.
+
+@author Abigail Goodwin <abby.goodwin@outlook.com>
+Copyright 2024, Abigail Goodwin, All rights reserved.
+"""
+
+import pytest
+
+from lib.local_analyzer import LocalAnalyzer
+
+
+@pytest.fixture
+def analyzer():
+    return LocalAnalyzer()
+
+
+def analyze(analyzer, *texts):
+    return analyzer.analyze([{'id': index, 'text': text} for index, text in enumerate(texts)])
+
+
+@pytest.mark.parametrize("text, sentiment, scores", [
+    ("This is great, I love it", "positive", (0.73, 0.27, 0.0)),
+    ("This is terrible and awful", "negative", (0.0, 0.25, 0.75)),
+    ("The meeting is at noon", "neutral", (0.0, 1.0, 0.0)),
+    ("Great news, wonderful people, but a terrible tragedy", "mixed", (0.42, 0.16, 0.42)),
+])
+def test_sentiment_labels_and_scores(analyzer, text, sentiment, scores):
+    tweet_info, = analyze(analyzer, text)
+
+    assert tweet_info['overall_sentiment'] == sentiment
+    assert tuple(tweet_info['confidence_scores'].values()) == scores
+    assert list(tweet_info['confidence_scores']) == ["positive", "neutral", "negative"]
+
+
+def test_a_negator_flips_the_next_word_only_within_its_tweet(analyzer):
+    negated, positive = analyze(analyzer, "Not great", "great news")
+
+    assert negated['confidence_scores']['negative'] > 0 and negated['confidence_scores']['positive'] == 0
+    assert positive['overall_sentiment'] == "positive" and positive['confidence_scores']['negative'] == 0
+
+
+def test_key_phrases_are_runs_of_words_between_stopwords_and_punctuation(analyzer):
+    tweet_info, = analyze(analyzer, "Vaccine clinic opens downtown: free flu shots for seniors "
+                                    "https://t.co/AbC123 @countyhealth")
+
+    assert tweet_info['key_phrases'] == ["vaccine clinic opens downtown", "free flu shots", "seniors"]
+    assert LocalAnalyzer(max_key_phrases=1).analyze([{'id': 1, 'text': "free flu shots for seniors"}])[0][
+        'key_phrases'] == ["free flu shots"]
+
+
+def test_non_ascii_words_stay_whole(analyzer):
+    accented, cyrillic = analyze(analyzer, "Café résumé naïve are great", "Привет мир, отличный день")
+
+    assert accented['key_phrases'] == ["café résumé naïve", "great"]
+    assert cyrillic['key_phrases'] == ["привет мир", "отличный день"]
+    assert analyze(LocalAnalyzer(lexicon={"génial": 0.8}), "C'est génial")[0]['overall_sentiment'] == "positive"
+
+
+def test_empty_input(analyzer):
+    assert analyzer.analyze([]) == []
+
+    empty, links_only = analyze(analyzer, "", "https://t.co/AbC123 @countyhealth")
+    for tweet_info in (empty, links_only):
+        assert tweet_info['overall_sentiment'] == "neutral"
+        assert tweet_info['confidence_scores'] == {'positive': 0.0, 'neutral': 1.0, 'negative': 0.0}
+        assert tweet_info['key_phrases'] == []
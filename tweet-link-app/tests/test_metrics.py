@@ -0,0 +1,122 @@
+"""
+Tests for metrics: recording through the instrumentation calls, the Prometheus text and JSON outputs, and
+the cProfile hook.
+
+@author Abigail Goodwin <abby.goodwin@outlook.com>
+Copyright 2024, Abigail Goodwin, All rights reserved.
+"""
+
+import json
+import pstats
+
+import pytest
+
+from lib import metrics
+from lib.metrics import MetricsRegistry
+
+
+@pytest.fixture
+def registry():
+    yield metrics.enable(MetricsRegistry(buckets=(0.1, 1.0)))
+    metrics.disable()
+
+
+def record_requests():
+    metrics.inc("x_api_requests_total", status=200)
+    metrics.inc("x_api_requests_total", status=200)
+    metrics.inc("x_api_requests_total", status=429)
+    # An observation on a bucket's bound counts in that bucket:
+    for seconds in (0.1, 0.5, 2.0):
+        metrics.observe("x_api_request_seconds", seconds)
+
+
+def test_prometheus_text_format(registry):
+    record_requests()
+
+    assert registry.to_prometheus() == (
+        "# HELP x_api_request_seconds X API request latency.\n"
+        "# TYPE x_api_request_seconds histogram\n"
+        'x_api_request_seconds_bucket{le="0.1"} 1\n'
+        'x_api_request_seconds_bucket{le="1.0"} 2\n'
+        'x_api_request_seconds_bucket{le="+Inf"} 3\n'
+        "x_api_request_seconds_sum 2.6\n"
+        "x_api_request_seconds_count 3\n"
+        "# HELP x_api_requests_total X API requests made, by HTTP status.\n"
+        "# TYPE x_api_requests_total counter\n"
+        'x_api_requests_total{status="200"} 2\n'
+        'x_api_requests_total{status="429"} 1\n'
+    )
+
+
+def test_prometheus_label_values_are_escaped(registry):
+    metrics.inc("x_api_request_errors_total", error='Bad "gateway"\\\n')
+
+    assert registry.to_prometheus().splitlines()[-1] \
+        == 'x_api_request_errors_total{error="Bad \\"gateway\\"\\\\\\n"} 1'
+
+
+def test_json_output(registry, tmp_path):
+    record_requests()
+    path = tmp_path / "metrics.json"
+
+    registry.write(str(path))
+
+    with open(path) as metrics_file:
+        written = json.load(metrics_file)
+    assert written['started_at'] <= written['timestamp']
+    assert written['metrics'] == {
+        'x_api_request_seconds': {'type': "histogram", 'help': "X API request latency.", 'values': [
+            {'labels': {}, 'count': 3, 'sum': 2.6, 'buckets': {"0.1": 1, "1.0": 2, "+Inf": 3}}]},
+        'x_api_requests_total': {'type': "counter", 'help': "X API requests made, by HTTP status.", 'values': [
+            {'labels': {'status': "200"}, 'value': 2}, {'labels': {'status': "429"}, 'value': 1}]},
+    }
+    assert not (tmp_path / "metrics.json.tmp").exists()
+
+
+def test_prometheus_file_output(registry, tmp_path):
+    record_requests()
+    path = tmp_path / "twitter.prom"
+
+    registry.write(str(path))
+
+    assert path.read_text() == registry.to_prometheus()
+
+
+def test_timers_and_gauges(registry):
+    with metrics.in_flight("azure_batches_in_flight"):
+        assert registry.snapshot()['azure_batches_in_flight']['values'] == [{'labels': {}, 'value': 1}]
+        with metrics.timed("azure_batch_seconds"):
+            pass
+    metrics.set_gauge("worker_pages_in_flight", 4)
+
+    snapshot = registry.snapshot()
+    assert snapshot['azure_batches_in_flight']['values'] == [{'labels': {}, 'value': 0}]
+    assert snapshot['azure_batch_seconds']['values'][0]['buckets'] == {"0.1": 1, "1.0": 1, "+Inf": 1}
+    assert snapshot['worker_pages_in_flight']['values'] == [{'labels': {}, 'value': 4}]
+
+
+def test_nothing_is_recorded_while_disabled(registry):
+    metrics.disable()
+
+    record_requests()
+    with metrics.timed("azure_batch_seconds"), metrics.in_flight("azure_batches_in_flight"):
+        pass
+
+    assert registry.snapshot() == {}
+
+
+def busy_work():
+    return sum(index * index for index in range(10000))
+
+
+def test_profiled_writes_a_profile(tmp_path):
+    path = tmp_path / "ingest.prof"
+
+    with metrics.profiled(str(path)):
+        busy_work()
+
+    stats = pstats.Stats(str(path))
+    assert any(function_name == "busy_work" for _, _, function_name in stats.stats)
+
+    with metrics.profiled(None):
+        busy_work()
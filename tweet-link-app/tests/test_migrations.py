@@ -0,0 +1,167 @@
+"""
+Tests for DataExporter's versioned schema migrations (SCHEMA_MIGRATIONS / create_tables).
+
+@author Abigail Goodwin <abby.goodwin@outlook.com>
+Copyright 2024, Abigail Goodwin, All rights reserved.
+"""
+
+import shutil
+import sqlite3
+
+import pytest
+
+from lib import data_exporter
+from lib.data_exporter import SCHEMA_MIGRATIONS, SQL_PATH, DataExporter
+from tests.fakes import FIRST_TWEET_ID, build_results
+
+# The dimension and junction tables as the original TwitterBase.sql made them: T-SQL IDENTITY keys (which
+# SQLite doesn't treat as rowids) and natural keys that aren't UNIQUE.
+ORIGINAL_SCHEMA = """
+    CREATE TABLE Users (UserID int IDENTITY(1,1) PRIMARY KEY NOT NULL, AuthorID bigint NOT NULL,
+                        UserHandle nvarchar(255) NOT NULL, UserName nvarchar(255) NOT NULL);
+    CREATE TABLE Locations (LocationID int IDENTITY(1,1) PRIMARY KEY NOT NULL, LocationCode nvarchar(255) NOT NULL,
+                            LocationName nvarchar(255) NOT NULL);
+    CREATE TABLE Tweets (TweetID bigint PRIMARY KEY NOT NULL, TweetAuthorID int NOT NULL, TweetDate datetime NOT NULL,
+                         LocationID int DEFAULT NULL, TweetBody nvarchar(255) NOT NULL,
+                         TweetJSON nvarchar(255) NOT NULL, TweetTopic nvarchar(255) NOT NULL);
+    CREATE TABLE ConfidenceTypes (ConfidenceTypeID int IDENTITY(1,1) PRIMARY KEY NOT NULL,
+                                  ConfidenceLabel nvarchar(255) NOT NULL);
+    CREATE TABLE Hashtags (HashtagID int IDENTITY(1,1) PRIMARY KEY NOT NULL, HashtagText nvarchar(255) NOT NULL);
+    CREATE TABLE KeyPhrases (KeyPhraseID int IDENTITY(1,1) PRIMARY KEY NOT NULL,
+                             KeyPhraseText nvarchar(255) NOT NULL);
+    CREATE TABLE Sentiments (SentimentID int IDENTITY(1,1) PRIMARY KEY NOT NULL, SentimentName nvarchar(255) NOT NULL);
+    CREATE TABLE TweetSentiment (TweetID bigint NOT NULL, SentimentID int NOT NULL, PRIMARY KEY (TweetID, SentimentID));
+    CREATE TABLE TweetConfidence (TweetID bigint NOT NULL, ConfidenceTypeID int NOT NULL,
+                                  ConfidenceScore DECIMAL(3, 2) NOT NULL, PRIMARY KEY (TweetID, ConfidenceTypeID));
+    CREATE TABLE TweetKeyPhrases (TweetID bigint NOT NULL, KeyPhraseID int NOT NULL,
+                                  PRIMARY KEY (TweetID, KeyPhraseID));
+    CREATE TABLE TweetHashtags (TweetID bigint NOT NULL, HashtagID int NOT NULL, PRIMARY KEY (TweetID, HashtagID));
+    INSERT INTO ConfidenceTypes (ConfidenceTypeID, ConfidenceLabel) VALUES (1, 'positive'), (2, 'neutral'),
+                                                                           (3, 'negative');
+    INSERT INTO Sentiments (SentimentID, SentimentName) VALUES (1, 'positive'), (2, 'neutral'), (3, 'mixed'),
+                                                               (4, 'negative');
+"""
+
+
+def open_exporter(db_path):
+    data_uploader = DataExporter(db_path)
+    data_uploader.connection.close()
+    data_uploader.connection = None
+
+
+def applied_migrations(db_path):
+    with sqlite3.connect(db_path) as connection:
+        rows = connection.execute("SELECT Version, ScriptName, AppliedAt FROM SchemaVersion ORDER BY Version")
+        return rows.fetchall()
+
+
+def columns(connection, table_name):
+    return [row[1] for row in connection.execute(f"PRAGMA table_info({table_name})")]
+
+
+def test_new_database_gets_every_migration_in_order(exporter, db_path):
+    applied = applied_migrations(db_path)
+
+    assert [(version, script_name) for version, script_name, _ in applied] == SCHEMA_MIGRATIONS
+    assert exporter.schema_version() == SCHEMA_MIGRATIONS[-1][0]
+
+
+def test_reopening_does_not_reapply_migrations(db_path):
+    open_exporter(db_path)
+    before = applied_migrations(db_path)
+
+    open_exporter(db_path)
+
+    assert applied_migrations(db_path) == before
+
+
+def test_migrations_upgrade_a_database_made_before_versioning(db_path):
+    # A database made by the first two scripts, with no SchemaVersion table, holding one tagged tweet:
+    with sqlite3.connect(db_path) as connection:
+        for script_name in ("TwitterBase.sql", "TwitterBaseViews.sql"):
+            connection.executescript((SQL_PATH / script_name).read_text())
+        connection.executescript("""
+            INSERT INTO Users (UserID, AuthorID, UserHandle, UserName) VALUES (1, 100, 'abby', 'Abby');
+            INSERT INTO Tweets (TweetID, TweetAuthorID, TweetDate, TweetBody, TweetJSON, TweetTopic)
+                VALUES (42, 1, '2024-03-01 10:15:00', 'Get your #Vaccines', '{}', 'vaccines');
+            INSERT INTO Hashtags (HashtagID, HashtagText) VALUES (1, 'Vaccines');
+            INSERT INTO TweetHashtags (TweetID, HashtagID) VALUES (42, 1);
+        """)
+    connection.close()
+
+    open_exporter(db_path)
+
+    assert [version for version, _, _ in applied_migrations(db_path)] == [version for version, _ in SCHEMA_MIGRATIONS]
+    with sqlite3.connect(db_path) as connection:
+        assert {"TopicID", "RawPageID", "ClusterID"} <= set(columns(connection, "Tweets"))
+        # Later migrations backfill from the tweets already stored:
+        assert connection.execute("SELECT TopicName FROM Topics").fetchall() == [("vaccines",)]
+        assert connection.execute("SELECT TopicID FROM Tweets WHERE TweetID = 42").fetchone() == (1,)
+        assert connection.execute("SELECT TweetTopic, HashtagID, TweetCount FROM TopicHashtagCounts").fetchall() \
+            == [("vaccines", 1, 1)]
+    connection.close()
+
+
+def test_failed_migration_is_rolled_back_and_not_recorded(db_path, tmp_path, monkeypatch):
+    sql_path = tmp_path / "sql"
+    shutil.copytree(SQL_PATH, sql_path, ignore=shutil.ignore_patterns("*.db"))
+    (sql_path / "TwitterBroken.sql").write_text("""
+        CREATE TABLE HalfDone (ID INTEGER PRIMARY KEY);
+        INSERT INTO NoSuchTable VALUES (1);
+    """)
+    broken_version = SCHEMA_MIGRATIONS[-1][0] + 1
+    monkeypatch.setattr(data_exporter, "SQL_PATH", sql_path)
+    monkeypatch.setattr(data_exporter, "SCHEMA_MIGRATIONS", SCHEMA_MIGRATIONS + [(broken_version, "TwitterBroken.sql")])
+
+    with pytest.raises(sqlite3.Error):
+        open_exporter(db_path)
+
+    assert applied_migrations(db_path)[-1][0] == broken_version - 1
+    with sqlite3.connect(db_path) as connection:
+        assert connection.execute("SELECT name FROM sqlite_master WHERE name = 'HalfDone'").fetchall() == []
+    connection.close()
+
+
+def test_natural_keys_are_made_unique_on_a_database_with_the_original_schema(db_path, make_page):
+    with sqlite3.connect(db_path) as connection:
+        connection.executescript(ORIGINAL_SCHEMA)
+        connection.executescript("""
+            INSERT INTO Users VALUES (1, 100, 'abby', 'Abby'), (2, 100, 'abby', 'Abby'), (3, 101, 'carl', 'Carl');
+            INSERT INTO Locations VALUES (1, 'rva', 'Richmond, VA'), (2, 'rva', 'Richmond, VA');
+            INSERT INTO Hashtags VALUES (1, '#vaccines'), (2, '#vaccines'), (3, '#health');
+            INSERT INTO KeyPhrases VALUES (1, 'local news'), (2, 'local news');
+            INSERT INTO Tweets VALUES (42, 2, '2024-03-01 10:15:00', 2, 'Get your #Vaccines #Health', '{}', 'vaccines'),
+                                      (43, 1, '2024-03-01 11:15:00', 1, 'More #Vaccines', '{}', 'vaccines');
+            INSERT INTO TweetHashtags VALUES (42, 1), (42, 2), (42, 3), (43, 2);
+            INSERT INTO TweetKeyPhrases VALUES (42, 2), (43, 1);
+        """)
+    connection.close()
+
+    data_uploader = DataExporter(db_path)
+    try:
+        cursor = data_uploader.cursor
+        # Duplicates are merged into their lowest ID, and everything that pointed at them follows:
+        assert cursor.execute("SELECT UserID, AuthorID FROM Users ORDER BY UserID").fetchall() == [(1, 100), (3, 101)]
+        assert cursor.execute("SELECT LocationID FROM Locations").fetchall() == [(1,)]
+        assert cursor.execute("SELECT TweetID, TweetAuthorID, LocationID FROM Tweets ORDER BY TweetID").fetchall() \
+            == [(42, 1, 1), (43, 1, 1)]
+        assert cursor.execute("SELECT TweetID, HashtagID FROM TweetHashtags ORDER BY TweetID, HashtagID").fetchall() \
+            == [(42, 1), (42, 3), (43, 1)]
+        assert cursor.execute("SELECT TweetID, KeyPhraseID FROM TweetKeyPhrases ORDER BY TweetID").fetchall() \
+            == [(42, 1), (43, 1)]
+        assert cursor.execute("SELECT HashtagID, TweetCount FROM TopicHashtagCounts ORDER BY HashtagID").fetchall() \
+            == [(1, 2), (3, 1)]
+        assert cursor.execute("SELECT KeyPhraseID, TweetCount FROM TopicKeyPhraseCounts").fetchall() == [(1, 2)]
+        assert data_uploader.unindexed_queries() == {}
+
+        # The exporter's upserts now work on it, reusing the merged keys:
+        page = make_page(range(FIRST_TWEET_ID, FIRST_TWEET_ID - 3, -1))
+        data_uploader.add_tweet_page("vaccines", page, build_results(page.tweets), build_results(page.tweets))
+
+        assert cursor.execute("SELECT UserID, AuthorID FROM Users ORDER BY UserID").fetchall() \
+            == [(1, 100), (3, 101), (4, 102)]
+        assert cursor.execute("SELECT HashtagID FROM Hashtags WHERE HashtagText = '#vaccines'").fetchall() == [(1,)]
+        assert cursor.execute("SELECT TweetCount FROM TopicHashtagCounts WHERE HashtagID = 1").fetchone() == (5,)
+    finally:
+        data_uploader.connection.close()
+        data_uploader.connection = None
@@ -0,0 +1,173 @@
+"""
+Tests for near_duplicates' MinHash clustering and NearDuplicateIndex, and for how near-duplicates share
+analysis results through AnalysisCache, analyze_with_cache and analyze_clustered (for every backend).
+
+@author Abigail Goodwin <abby.goodwin@outlook.com>
+Copyright 2024, Abigail Goodwin, All rights reserved.
+"""
+
+import sqlite3
+
+import pytest
+
+from lib import sentiment_analyzer
+from lib.analysis_cache import AnalysisCache
+from lib.near_duplicates import NearDuplicateIndex, cluster, phrases_in_text, signature, similarity
+from lib.sentiment_analyzer import analyze_clustered, analyze_tweets, analyze_with_cache
+from lib.tweet_splitter import split_page
+from tests.fakes import build_response
+
+ORIGINAL = "Free vaccine clinic at the county library this Saturday from 9am to 3pm, bring your ID #vaccines"
+# One word changed (~0.84 similar), and a hashtag, link and mention added (~0.94 similar):
+EDITED = "Free vaccine clinic at the county library this Sunday from 9am to 3pm, bring your ID #vaccines"
+TAGGED = ORIGINAL + " #health https://t.co/AbC123 @countyhealth"
+UNRELATED = "Pharmacies are running low on flu shots again, call ahead before you go #vaccines"
+
+SCORES = {'positive': 0.75, 'neutral': 0.2, 'negative': 0.05}
+
+
+@pytest.fixture
+def index():
+    connection = sqlite3.connect(":memory:")
+    yield NearDuplicateIndex(connection)
+    connection.close()
+
+
+@pytest.fixture
+def local_backend(monkeypatch):
+    # Restored after the test, so other tests keep the default backend:
+    monkeypatch.setattr(sentiment_analyzer, "_backend", sentiment_analyzer._backend)
+    monkeypatch.setattr(sentiment_analyzer, "_default_engine", None)
+    sentiment_analyzer.use_backend("local")
+
+
+@pytest.fixture
+def cache(tmp_path):
+    result_cache = AnalysisCache(str(tmp_path / "analysis_cache.db"))
+    yield result_cache
+    result_cache.close()
+
+
+def test_signatures_ignore_case_links_and_mentions():
+    assert signature(ORIGINAL) == signature(ORIGINAL.upper() + " https://t.co/XyZ789 @someone")
+    assert similarity(signature(ORIGINAL), signature(UNRELATED)) < 0.2
+
+
+@pytest.mark.parametrize("min_similarity, representatives", [
+    (0.7, [0, 0, 0, 3]),
+    (0.9, [0, 1, 0, 3]),
+    (1.0, [0, 1, 2, 3]),
+])
+def test_cluster_groups_texts_at_least_min_similarity_alike(min_similarity, representatives):
+    signatures = [signature(text) for text in (ORIGINAL, EDITED, TAGGED, UNRELATED)]
+
+    assert cluster(signatures, min_similarity) == representatives
+
+
+def test_index_finds_the_most_similar_indexed_text(index):
+    index.add([("original", signature(ORIGINAL)), ("unrelated", signature(UNRELATED))])
+
+    assert index.find(signature(TAGGED)) == "original"
+    assert index.find(signature(EDITED)) == "original"
+    assert index.find(signature("Road closures downtown all weekend for the marathon")) is None
+
+    index.add([("tagged", signature(TAGGED))])
+    assert index.find(signature(TAGGED + " #shots")) == "tagged"
+
+
+def test_removed_texts_are_no_longer_found(index):
+    index.add([("original", signature(ORIGINAL))])
+    index.remove(["original"])
+
+    assert index.find(signature(EDITED)) is None
+    assert index.connection.execute("SELECT COUNT(*) FROM MinHashBands").fetchone()[0] == 0
+
+
+def test_find_looks_up_every_band_in_one_indexed_query(index):
+    index.add([("original", signature(ORIGINAL))])
+    statements = []
+    index.connection.set_trace_callback(statements.append)
+
+    index.find(signature(EDITED))
+
+    index.connection.set_trace_callback(None)
+    assert len(statements) == 1
+    plan = [row[3] for row in index.connection.execute("EXPLAIN QUERY PLAN " + statements[0])]
+    assert not any(step.startswith("SCAN B") or step.startswith("SCAN M") for step in plan)
+
+
+def test_phrases_in_text_keeps_the_phrases_the_text_uses():
+    assert phrases_in_text(["Vaccine clinic", "Saturday", "county library"], EDITED) \
+        == ["Vaccine clinic", "county library"]
+
+
+def test_near_duplicate_hits_only_get_the_key_phrases_in_their_text(cache):
+    cache.store([{'id': "1", 'text': ORIGINAL}],
+                [{'id': "1", 'overall_sentiment': "positive", 'confidence_scores': SCORES,
+                  'key_phrases': ["vaccine clinic", "Saturday"]}])
+
+    hits, misses = cache.lookup([{'id': "2", 'text': EDITED}, {'id': "3", 'text': ORIGINAL}])
+
+    assert misses == []
+    assert [(hit['id'], hit['overall_sentiment'], hit['key_phrases']) for hit in hits] \
+        == [("2", "positive", ["vaccine clinic"]), ("3", "positive", ["vaccine clinic", "Saturday"])]
+    assert hits[0]['cluster_id'] == hits[1]['cluster_id']
+    assert cache.stats()['near_duplicate_hits'] == 1
+
+
+def test_analyze_with_cache_analyzes_a_cluster_once(cache):
+    tweets = [{'id': "1", 'text': ORIGINAL}, {'id': "2", 'text': EDITED}, {'id': "3", 'text': UNRELATED}]
+    calls = []
+
+    def analyze(tweet_list):
+        calls.append([tweet['id'] for tweet in tweet_list])
+        return [{'id': tweet['id'], 'overall_sentiment': "positive", 'confidence_scores': SCORES,
+                 'key_phrases': ["vaccine clinic", "Saturday"] if tweet['id'] == "1" else ["flu shots"]}
+                for tweet in tweet_list]
+
+    results = analyze_with_cache(tweets, analyze, cache)
+
+    assert calls == [["1", "3"]]
+    assert [(tweet_info['id'], tweet_info['key_phrases']) for tweet_info in results] \
+        == [("1", ["vaccine clinic", "Saturday"]), ("2", ["vaccine clinic"]), ("3", ["flu shots"])]
+    assert results[0]['cluster_id'] == results[1]['cluster_id'] != results[2]['cluster_id']
+
+
+def test_analyze_clustered_analyzes_one_tweet_per_cluster():
+    tweets = [{'id': "1", 'text': ORIGINAL}, {'id': "2", 'text': ORIGINAL.upper()}, {'id': "3", 'text': EDITED},
+              {'id': "4", 'text': UNRELATED}]
+    calls = []
+
+    def analyze(tweet_list):
+        calls.append([tweet['id'] for tweet in tweet_list])
+        return [{'id': tweet['id'], 'key_phrases': ["vaccine clinic", "Saturday"] if tweet['id'] == "1"
+                 else ["flu shots"]} for tweet in tweet_list]
+
+    results = analyze_clustered(tweets, analyze, "local")
+
+    assert calls == [["1", "4"]]
+    assert [(tweet_info['id'], tweet_info['key_phrases']) for tweet_info in results] == [
+        ("1", ["vaccine clinic", "Saturday"]), ("2", ["vaccine clinic", "Saturday"]), ("3", ["vaccine clinic"]),
+        ("4", ["flu shots"])]
+    assert len({tweet_info['cluster_id'] for tweet_info in results[:3]}) == 1
+    assert results[3]['cluster_id'] != results[0]['cluster_id']
+
+    analyze_clustered(tweets, analyze, "local", min_similarity=None)
+    assert calls[-1] == ["1", "3", "4"]
+
+
+def test_the_local_backend_clusters_near_duplicates(local_backend, exporter):
+    response = build_response([3, 2, 1])
+    for tweet, text in zip(response['data'], (ORIGINAL, EDITED, UNRELATED)):
+        tweet['text'] = text
+    page = split_page(response)
+
+    results = analyze_tweets(page.tweets)
+    exporter.add_tweet_page("vaccines", page, results, results)
+
+    cluster_ids = dict(exporter.cursor.execute("SELECT TweetID, ClusterID FROM Tweets"))
+    assert None not in cluster_ids.values()
+    assert cluster_ids[3] == cluster_ids[2] != cluster_ids[1]
+    assert exporter.cursor.execute("""
+        SELECT SUM(TweetCount), SUM(ClusterCount) FROM TopicClusterSentimentView WHERE TopicName = 'vaccines'
+    """).fetchone() == (3, 2)
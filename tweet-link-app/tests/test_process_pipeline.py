@@ -0,0 +1,82 @@
+"""
+Tests for ProcessIngestPipeline (worker processes on the local backend) against a stub X API on localhost.
+
+@author Abigail Goodwin <abby.goodwin@outlook.com>
+Copyright 2024, Abigail Goodwin, All rights reserved.
+"""
+
+import multiprocessing
+
+import pytest
+
+from lib import metrics
+from lib.data_exporter import DataExporter
+from lib.metrics import MetricsRegistry
+from lib.process_pipeline import ProcessIngestPipeline
+from lib.tweet_splitter import split_page
+from tests.fakes import build_response, build_results
+
+
+@pytest.fixture
+def registry():
+    yield metrics.enable(MetricsRegistry())
+    metrics.disable()
+
+
+def open_batch_store(db_path, before_write=None):
+    """
+    @return Callable() opening (store_pages, stored_tweet_ids) on db_path, like the app's open_batch_store.
+    """
+    def open_store():
+        data_uploader = DataExporter(db_path)
+
+        def store_pages(pages):
+            if before_write is not None:
+                before_write()
+            data_uploader.add_tweet_pages([(topic, page.with_tweets(data_uploader.check_existing_tweets(page.tweets)),
+                                            tweet_sentiments, tweet_keywords)
+                                           for topic, page, tweet_sentiments, tweet_keywords in pages])
+
+        return store_pages, data_uploader.stored_tweet_ids
+    return open_store
+
+
+def counter_value(registry, name):
+    return sum(value['value'] for value in registry.snapshot().get(name, {'values': []})['values'])
+
+
+def test_stored_tweets_are_not_sent_for_analysis(exporter, db_path, stub_x_api, x_client, registry):
+    stub_x_api.page_size = 10
+    stub_x_api.add("vaccines", 50)
+    stored_page = split_page(build_response(stub_x_api.corpus["vaccines"][:20]))
+    exporter.add_tweet_page("vaccines", stored_page, build_results(stored_page.tweets), None)
+
+    pipeline = ProcessIngestPipeline(open_batch_store(db_path), backend="local", client=x_client, processes=1)
+    counts = pipeline.run(["vaccines"], 50, {"vaccines": exporter.start_checkpoint("vaccines", 50)})
+
+    assert counts == {"vaccines": 30}
+    assert counter_value(registry, "analysis_tweets_total") == 30
+    assert exporter.cursor.execute("SELECT COUNT(*) FROM Tweets").fetchone()[0] == 50
+    assert exporter.load_checkpoint("vaccines")['status'] == "complete"
+
+
+def test_pages_in_flight_when_a_worker_dies_are_resubmitted(exporter, db_path, stub_x_api, x_client, registry):
+    stub_x_api.page_size = 10
+    stub_x_api.add("vaccines", 50)
+    writes = []
+
+    def kill_workers_on_first_write():
+        if not writes:
+            for child in multiprocessing.active_children():
+                child.kill()
+        writes.append(1)
+
+    pipeline = ProcessIngestPipeline(open_batch_store(db_path, kill_workers_on_first_write), backend="local",
+                                     client=x_client, processes=1, batch_pages=1)
+    counts = pipeline.run(["vaccines"], 50, {"vaccines": exporter.start_checkpoint("vaccines", 50)})
+
+    assert counts == {"vaccines": 50}
+    assert counter_value(registry, "worker_pool_restarts_total") >= 1
+    assert exporter.cursor.execute("SELECT COUNT(*) FROM Tweets").fetchone()[0] == 50
+    checkpoint = exporter.load_checkpoint("vaccines")
+    assert (checkpoint['status'], checkpoint['pass_fetched'], checkpoint['total_stored']) == ("complete", 50, 50)
@@ -0,0 +1,17 @@
+"""
+Tests that every lookup in INDEXED_QUERIES is answered through an index (see benchmarks.check_query_plans).
+
+@author Abigail Goodwin <abby.goodwin@outlook.com>
+Copyright 2024, Abigail Goodwin, All rights reserved.
+"""
+
+
+def test_every_lookup_uses_an_index_on_a_new_database(exporter):
+    assert exporter.unindexed_queries() == {}
+
+
+def test_table_scans_are_reported(exporter):
+    unindexed = exporter.unindexed_queries({"tweets by body": "SELECT TweetID FROM Tweets WHERE TweetBody = ?"})
+
+    assert list(unindexed) == ["tweets by body"]
+    assert any(step.startswith("SCAN ") for step in unindexed["tweets by body"])
@@ -0,0 +1,94 @@
+"""
+Tests for raw_store's compressed API responses, and DataExporter's raw page storage (add_raw_page through
+add_tweet_page, raw_page, raw_tweet and raw_pages).
+
+@author Abigail Goodwin <abby.goodwin@outlook.com>
+Copyright 2024, Abigail Goodwin, All rights reserved.
+"""
+
+import json
+
+import pytest
+
+from lib import raw_store
+from lib.raw_store import RawPayload, compress, decompress
+from lib.tweet_splitter import split_page
+from tests.fakes import build_response
+
+
+@pytest.fixture(params=["zstd", "zlib"])
+def codec(request):
+    if request.param == "zstd":
+        pytest.importorskip("zstandard")
+    return request.param
+
+
+def store_raw_page(exporter, topic, tweet_ids, codec):
+    response = build_response(tweet_ids)
+    page = split_page(response)
+    page.raw_payload = RawPayload.pack(json.dumps(response).encode("utf-8"), codec)
+    exporter.add_tweet_page(topic, page)
+    return response
+
+
+def test_payloads_round_trip(codec):
+    raw_bytes = json.dumps(build_response(range(10))).encode("utf-8")
+
+    payload = RawPayload.pack(raw_bytes, codec)
+
+    assert payload.codec == codec and payload.raw_size == len(raw_bytes)
+    assert len(payload.blob) < len(raw_bytes)
+    assert decompress(codec, compress(raw_bytes, codec)) == payload.raw_bytes() == raw_bytes
+    assert payload.data == json.loads(raw_bytes)
+    assert payload.tweet(3)['text'] == "tweet 3 about #Vaccines and more" and payload.tweet(42) is None
+
+
+def test_zlib_is_the_fallback_without_zstandard(monkeypatch):
+    assert raw_store.DEFAULT_CODEC == ("zstd" if raw_store.zstandard is not None else "zlib")
+
+    monkeypatch.setattr(raw_store, "zstandard", None)
+    with pytest.raises(ImportError, match="zlib"):
+        compress(b"{}", "zstd")
+    with pytest.raises(ImportError):
+        decompress("zstd", b"")
+    assert RawPayload.pack(b'{"data": []}', "zlib").data == {'data': []}
+
+
+def test_unknown_codecs_are_rejected():
+    with pytest.raises(ValueError, match="brotli"):
+        compress(b"{}", "brotli")
+    with pytest.raises(ValueError, match="brotli"):
+        decompress("brotli", b"")
+
+
+def test_stored_pages_round_trip(exporter, codec):
+    vaccine_response = store_raw_page(exporter, "vaccines", [6, 5, 4], codec)
+    climate_response = store_raw_page(exporter, "climate", [3, 2, 1], codec)
+
+    # The tweets point at their page instead of keeping their own JSON:
+    assert exporter.cursor.execute("SELECT COUNT(*) FROM Tweets WHERE TweetJSON != ''").fetchone()[0] == 0
+    assert exporter.raw_tweet(5) == vaccine_response['data'][1]
+    assert exporter.raw_tweet(1) == climate_response['data'][2]
+    assert exporter.raw_tweet(42) is None
+
+    pages = list(exporter.raw_pages())
+    assert [payload.data for _, payload in pages] == [vaccine_response, climate_response]
+    assert [payload.codec for _, payload in pages] == [codec, codec]
+    assert [payload.data for _, payload in exporter.raw_pages("climate")] == [climate_response]
+    assert exporter.raw_page(pages[0][0]).raw_bytes() == json.dumps(vaccine_response).encode("utf-8")
+    assert exporter.raw_page(pages[-1][0] + 1) is None
+
+
+def test_tweets_without_a_raw_page_keep_their_json(exporter, make_page):
+    exporter.add_tweet_page("vaccines", make_page([2, 1]))
+
+    assert list(exporter.raw_pages()) == []
+    assert exporter.raw_tweet(1) == {'id': "1", 'author_id': "101", 'created_at': "2024-03-01 11:00:00",
+                                     'location': None, 'text': "tweet 1 about #Vaccines and more"}
+
+
+def test_pages_whose_tweets_are_all_stored_keep_no_raw_page(exporter, codec):
+    store_raw_page(exporter, "vaccines", [3, 2, 1], codec)
+    store_raw_page(exporter, "vaccines", [3, 2, 1], codec)
+
+    assert len(list(exporter.raw_pages())) == 1
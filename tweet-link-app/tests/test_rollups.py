@@ -0,0 +1,98 @@
+"""
+Tests for the per-topic rollups kept by add_tweet_pages (see TwitterRollups.sql) and the topic queries
+that read them: topics, topic_tweets, topic_sentiment, top_key_phrases and top_hashtags.
+
+@author Abigail Goodwin <abby.goodwin@outlook.com>
+Copyright 2024, Abigail Goodwin, All rights reserved.
+"""
+
+import pytest
+
+from tests.fakes import FIRST_TWEET_ID
+
+# build_response spreads each page's tweets over 10:00, 11:00 and 12:00, and build_results derives each
+# tweet's sentiment from its ID; for FIRST_TWEET_ID - k that's positive, mixed, negative, neutral, ...
+# with a positive score of 0, 0.75, 0.5, 0.25 (and the rest neutral).
+VACCINE_IDS = list(range(FIRST_TWEET_ID, FIRST_TWEET_ID - 8, -1))
+CLIMATE_IDS = list(range(FIRST_TWEET_ID - 100, FIRST_TWEET_ID - 103, -1))
+
+
+@pytest.fixture
+def ingest(exporter, make_page, make_results):
+    """
+    @return Callable() storing a page of 8 "vaccines" tweets and one of 3 "climate" tweets.
+    """
+    def ingest_pages():
+        vaccine_page = make_page(VACCINE_IDS)
+        climate_page = make_page(CLIMATE_IDS, text="tweet {id} on #Climate and #Vaccines")
+        climate_results = make_results(climate_page.tweets, key_phrases=("carbon tax", "Climate policy"))
+        exporter.add_tweet_pages([("vaccines", vaccine_page, make_results(vaccine_page.tweets),
+                                   make_results(vaccine_page.tweets)),
+                                  ("climate", climate_page, climate_results, climate_results)])
+    return ingest_pages
+
+
+def expected_sentiment(count, positive):
+    return {'tweets': count, 'avg_positive': positive, 'avg_neutral': 1 - positive, 'avg_negative': 0.0}
+
+
+def test_rollups_count_each_topic_separately(exporter, ingest):
+    ingest()
+
+    assert [topic['name'] for topic in exporter.topics()] == ["climate", "vaccines"]
+    assert exporter.topic_sentiment("vaccines") == {
+        'positive': expected_sentiment(2, 0.0), 'mixed': expected_sentiment(2, 0.75),
+        'negative': expected_sentiment(2, 0.5), 'neutral': expected_sentiment(2, 0.25)}
+    assert exporter.topic_sentiment("climate") == {
+        'positive': expected_sentiment(1, 0.0), 'mixed': expected_sentiment(1, 0.75),
+        'negative': expected_sentiment(1, 0.5)}
+
+    assert sorted(exporter.top_key_phrases("vaccines")) == [("local news", 8), ("senate vote", 8)]
+    # Phrases naming the topic itself are dropped:
+    assert exporter.top_key_phrases("climate") == [("carbon tax", 3)]
+    assert exporter.top_hashtags("vaccines") == [("#vaccines", 8)]
+    assert sorted(exporter.top_hashtags("climate")) == [("#climate", 3), ("#vaccines", 3)]
+    assert exporter.top_hashtags("vaccines", limit=0) == []
+
+
+def test_reingesting_stored_tweets_does_not_double_count(exporter, ingest, make_page, make_results):
+    ingest()
+    ingest()
+    # A page that's half stored tweets only adds the new half:
+    page = make_page(VACCINE_IDS[4:] + [FIRST_TWEET_ID - 8])
+    exporter.add_tweet_page("vaccines", page, make_results(page.tweets), make_results(page.tweets))
+
+    assert sum(summary['tweets'] for summary in exporter.topic_sentiment("vaccines").values()) == 9
+    assert exporter.topic_sentiment("vaccines")['positive'] == expected_sentiment(3, 0.0)
+    assert sorted(exporter.top_key_phrases("vaccines")) == [("local news", 9), ("senate vote", 9)]
+    assert exporter.top_hashtags("vaccines") == [("#vaccines", 9)]
+    assert exporter.top_hashtags("climate")[0][1] == 3
+    assert exporter.cursor.execute("SELECT SUM(TweetCount) FROM TopicSentimentHourly").fetchone()[0] == 12
+
+
+def test_topic_queries_filter_by_time(exporter, ingest):
+    ingest()
+
+    latest = exporter.topic_tweets("vaccines", since="2024-03-01 12:00:00")
+    assert sorted(tweet['id'] for tweet in latest) == [str(FIRST_TWEET_ID - 5), str(FIRST_TWEET_ID - 2)]
+    assert {(tweet['created_at'], tweet['username'], tweet['location']) for tweet in latest} \
+        == {("2024-03-01 12:00:00", "user102", None)}
+    assert latest[0]['text'] == f"tweet {latest[0]['id']} about #Vaccines and more"
+
+    dates = [tweet['created_at'] for tweet in exporter.topic_tweets("vaccines")]
+    assert len(dates) == 8 and dates == sorted(dates, reverse=True)
+    assert len(exporter.topic_tweets("vaccines", limit=3)) == 3
+    assert len(exporter.topic_tweets("vaccines", until="2024-03-01 10:59:59")) == 3
+
+    assert exporter.topic_sentiment("vaccines", since="2024-03-01 11:00:00", until="2024-03-01 11:00:00") \
+        == {'mixed': expected_sentiment(1, 0.75), 'positive': expected_sentiment(1, 0.0),
+            'neutral': expected_sentiment(1, 0.25)}
+
+
+def test_unknown_topics_have_no_results(exporter, ingest):
+    ingest()
+
+    assert exporter.topic_tweets("elections") == []
+    assert exporter.topic_sentiment("elections") == {}
+    assert exporter.top_key_phrases("elections") == []
+    assert exporter.top_hashtags("elections") == []
@@ -0,0 +1,87 @@
+"""
+Tests for AnalysisEngine (the Azure backend) against FakeTextAnalyticsClient (see benchmarks.bench_azure).
+
+@author Abigail Goodwin <abby.goodwin@outlook.com>
+Copyright 2024, Abigail Goodwin, All rights reserved.
+"""
+
+import pytest
+
+from lib.sentiment_analyzer import MAX_ACTIONS_BATCH_SIZE, AnalysisEngine, TweetAnalyzer
+from benchmarks.bench_azure import FakeTextAnalyticsClient
+
+
+def make_tweets(n):
+    return [{'id': str(tweet_id), 'text': f"tweet number {tweet_id} about vaccines"} for tweet_id in range(n)]
+
+
+def test_tweets_are_sent_once_in_batches_of_25():
+    client = FakeTextAnalyticsClient()
+    engine = AnalysisEngine(client=client, polling_interval=0)
+
+    results = engine.analyze(make_tweets(60))
+
+    assert len(results) == 60
+    assert [method_name for method_name, _ in client.requests] == ["begin_analyze_actions"] * 3
+    assert sorted(len(document_ids) for _, document_ids in client.requests) == [10, 25, 25]
+    sent_ids = [tweet_id for _, document_ids in client.requests for tweet_id in document_ids]
+    assert sorted(sent_ids, key=int) == [str(tweet_id) for tweet_id in range(60)]
+
+
+def test_batch_size_is_capped_at_the_service_limit():
+    client = FakeTextAnalyticsClient()
+    engine = AnalysisEngine(client=client, batch_size=100, polling_interval=0)
+
+    engine.analyze(make_tweets(30))
+
+    assert engine.batch_size == MAX_ACTIONS_BATCH_SIZE
+    assert max(len(document_ids) for _, document_ids in client.requests) == MAX_ACTIONS_BATCH_SIZE
+
+
+def test_results_keep_the_input_order_when_batches_finish_out_of_order():
+    # The first batch is the slowest, so later batches finish before it:
+    client = FakeTextAnalyticsClient(latency=lambda documents: 0.2 if documents[0]['id'] == "0" else 0.0)
+    engine = AnalysisEngine(client=client, max_workers=4, polling_interval=0)
+
+    results = engine.analyze(make_tweets(100))
+
+    assert [tweet_info['id'] for tweet_info in results] == [str(tweet_id) for tweet_id in range(100)]
+
+
+def test_results_combine_both_actions():
+    tweets = make_tweets(1)
+    client = FakeTextAnalyticsClient()
+
+    tweet_info = AnalysisEngine(client=client, polling_interval=0).analyze(tweets)[0]
+
+    document = {'id': "0", 'text': tweets[0]['text']}
+    sentiment_info, keyword_info = client.sentiment_result(document), client.key_phrases_result(document)
+    assert tweet_info == {'id': "0", 'overall_sentiment': sentiment_info['sentiment'],
+                          'confidence_scores': sentiment_info['confidence_scores'],
+                          'key_phrases': keyword_info['key_phrases']}
+
+
+def test_documents_azure_rejects_are_skipped():
+    client = FakeTextAnalyticsClient(error_ids=["3", "27"])
+    engine = AnalysisEngine(client=client, polling_interval=0)
+
+    results = engine.analyze(make_tweets(30))
+
+    assert [tweet_info['id'] for tweet_info in results] == [str(tweet_id) for tweet_id in range(30)
+                                                            if tweet_id not in (3, 27)]
+
+
+def test_no_tweets_makes_no_requests():
+    client = FakeTextAnalyticsClient()
+
+    assert AnalysisEngine(client=client).analyze([]) == []
+    assert client.requests == []
+
+
+def test_backends_must_implement_analyze():
+    class PartialAnalyzer(TweetAnalyzer):
+        pass
+
+    with pytest.raises(TypeError, match="analyze"):
+        PartialAnalyzer()
+    assert isinstance(AnalysisEngine(client=FakeTextAnalyticsClient()), TweetAnalyzer)
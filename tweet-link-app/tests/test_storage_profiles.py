@@ -0,0 +1,75 @@
+"""
+Tests for the storage profiles (STORAGE_PROFILES) applied by connect(), and read-only reporting connections.
+
+@author Abigail Goodwin <abby.goodwin@outlook.com>
+Copyright 2024, Abigail Goodwin, All rights reserved.
+"""
+
+import sqlite3
+
+import pytest
+
+from lib.data_exporter import STORAGE_PROFILES, DataExporter, connect, connect_read_only
+
+# What SQLite reports back for each profile's settings (it reads synchronous and temp_store as numbers):
+EXPECTED_PRAGMAS = {
+    "compat": {'journal_mode': "delete", 'synchronous': 2, 'busy_timeout': 5000},
+    "balanced": {'journal_mode': "wal", 'synchronous': 1, 'cache_size': -65536, 'mmap_size': 268435456,
+                 'temp_store': 2, 'busy_timeout': 5000},
+    "bulk": {'journal_mode': "wal", 'synchronous': 0, 'cache_size': -262144, 'mmap_size': 1073741824,
+             'temp_store': 2, 'busy_timeout': 10000, 'wal_autocheckpoint': 10000},
+}
+
+
+def pragmas(connection, names):
+    return {name: connection.execute(f"PRAGMA {name}").fetchone()[0] for name in names}
+
+
+@pytest.mark.parametrize("profile", sorted(STORAGE_PROFILES))
+def test_each_profile_applies_its_pragmas(tmp_path, profile):
+    assert set(EXPECTED_PRAGMAS[profile]) == set(STORAGE_PROFILES[profile])
+
+    connection = connect(str(tmp_path / "profile.db"), profile)
+    try:
+        assert pragmas(connection, STORAGE_PROFILES[profile]) == EXPECTED_PRAGMAS[profile]
+    finally:
+        connection.close()
+
+
+def test_data_exporter_opens_with_its_profile(tmp_path):
+    data_uploader = DataExporter(str(tmp_path / "bulk.db"), profile="bulk")
+    try:
+        assert pragmas(data_uploader.connection, ["journal_mode", "synchronous"]) \
+            == {'journal_mode': "wal", 'synchronous': 0}
+    finally:
+        data_uploader.connection.close()
+        data_uploader.connection = None
+
+
+def test_unknown_profiles_are_rejected(tmp_path):
+    with pytest.raises(ValueError, match="Unknown storage profile"):
+        connect(str(tmp_path / "profile.db"), "fastest")
+
+
+def test_read_only_connections_read_but_reject_writes(exporter, db_path, make_page):
+    exporter.add_tweet_page("vaccines", make_page([3, 2, 1]))
+
+    connection = connect_read_only(db_path)
+    try:
+        assert connection.execute("SELECT COUNT(*) FROM Tweets").fetchone()[0] == 3
+        # Writer-only settings are left alone, and the others still apply:
+        assert pragmas(connection, ["journal_mode", "query_only", "busy_timeout"]) \
+            == {'journal_mode': "wal", 'query_only': 1, 'busy_timeout': 5000}
+        with pytest.raises(sqlite3.OperationalError):
+            connection.execute("DELETE FROM Tweets")
+        with pytest.raises(sqlite3.OperationalError):
+            connection.execute("CREATE TABLE Scratch (ID int)")
+    finally:
+        connection.close()
+
+    assert exporter.cursor.execute("SELECT COUNT(*) FROM Tweets").fetchone()[0] == 3
+
+
+def test_read_only_connections_need_an_existing_database(tmp_path):
+    with pytest.raises(sqlite3.OperationalError):
+        connect_read_only(str(tmp_path / "missing.db"))
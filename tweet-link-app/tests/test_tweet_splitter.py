@@ -0,0 +1,169 @@
+"""
+Tests for tweet_splitter: the columnar TweetPage model, and entity extraction.
+
+@author Abigail Goodwin <abby.goodwin@outlook.com>
+Copyright 2024, Abigail Goodwin, All rights reserved.
+"""
+
+import pytest
+
+from lib.tweet_splitter import (TweetPage, TweetRecord, extract_entities, extract_page_entities, split_json,
+                                split_page)
+from tests.fakes import build_response
+
+
+@pytest.fixture
+def response():
+    # Three tweets; the middle one is geo-tagged and has the API's entities:
+    raw_json = build_response([5, 4, 3], next_token="next", text="tweet {id} about #Vaccines and more")
+    raw_json['data'][0]['text'] = "Café ☕ #Vaccines"
+    raw_json['data'][1]['geo'] = {'place_id': "p1"}
+    raw_json['data'][1]['entities'] = {'hashtags': [{'tag': "Vaccines"}]}
+    raw_json['includes']['places'] = [{'id': "p1", 'full_name': "Boise, ID"}]
+    return raw_json
+
+
+############################################################
+#   Tweet Pages
+############################################################
+
+def test_split_page_matches_split_json(response):
+    page = split_page(response)
+
+    assert [dict(tweet) for tweet in page] == split_json(response)
+    assert [dict(tweet) for tweet in TweetPage.from_tweets(split_json(response), page.authors, page.places)] \
+        == split_json(response)
+    assert (page.next_token, page.result_count, page.newest_id, page.oldest_id) == ("next", 3, 5, 3)
+
+
+def test_tweet_records_read_like_dictionaries(response):
+    page = split_page(response)
+    first, middle, last = page.tweets
+
+    assert len(page) == 3 and isinstance(middle, TweetRecord)
+    assert (middle['id'], middle['author_id'], middle['created_at'], middle['location']) \
+        == ("4", "101", "2024-03-01 11:00:00", "p1")
+    assert middle.get('entities') == {'hashtags': [{'tag': "Vaccines"}]} and "entities" in middle
+    assert first.get('entities') is None and "entities" not in first and first['location'] is None
+    with pytest.raises(KeyError):
+        first['entities']
+    with pytest.raises(KeyError):
+        first['geo']
+    assert [tweet['id'] for tweet in page] == ["5", "4", "3"]
+
+
+def test_texts_are_sliced_from_one_buffer(response):
+    page = split_page(response)
+    texts = [tweet['text'] for tweet in response['data']]
+
+    assert page.text_buffer == "".join(texts)
+    assert list(page.text_offsets) == [0, len(texts[0]), len(texts[0]) + len(texts[1]), len(page.text_buffer)]
+    assert page.texts() == texts == [tweet['text'] for tweet in page]
+
+
+def test_with_tweets_keeps_only_the_given_rows(response):
+    page = split_page(response)
+    page.raw_payload = object()
+
+    kept = page.with_tweets(page.tweets[1:])
+    copied = page.with_tweets(split_json(response)[:1])
+
+    assert [dict(tweet) for tweet in kept] == split_json(response)[1:]
+    assert kept.texts() == page.texts()[1:] and list(kept.text_offsets)[0] == 0
+    assert [tweet.get('entities') for tweet in kept] == [{'hashtags': [{'tag': "Vaccines"}]}, None]
+    assert (kept.result_count, kept.newest_id, kept.oldest_id, kept.next_token) == (3, 5, 3, "next")
+    assert kept.raw_payload is page.raw_payload and kept.authors is page.authors
+    assert [dict(tweet) for tweet in copied] == split_json(response)[:1]
+    assert copied.raw_payload is page.raw_payload
+    assert len(page.with_tweets([])) == 0
+
+
+def test_authors_and_places_are_joined_by_id(response):
+    page = split_page(response)
+    first, middle, _ = page.tweets
+
+    assert page.author_of(middle) == {'id': "101", 'name': "User 101", 'username': "user101"}
+    assert page.place_of(middle) == {'id': "p1", 'full_name': "Boise, ID"}
+    assert page.place_of(first) is None
+
+
+def test_missing_authors_and_places_join_to_none(response):
+    # Withheld or suspended authors (and some places) are left out of includes:
+    response['includes']['users'] = [user for user in response['includes']['users'] if user['id'] != "101"]
+    response['includes']['places'] = []
+    page = split_page(response)
+    first, middle, _ = page.tweets
+
+    assert page.author_of(middle) is None and middle['author_id'] == "101"
+    assert page.place_of(middle) is None and middle['location'] == "p1"
+    assert page.author_of(first) == {'id': "100", 'name': "User 100", 'username': "user100"}
+    kept = page.with_tweets([middle])
+    assert kept.author_of(kept.tweets[0]) is None and kept.place_of(kept.tweets[0]) is None
+
+############################################################
+#   Entity Extraction
+############################################################
+
+@pytest.mark.parametrize("text, hashtags", [
+    ("Get your #Vaccines and #vaccines today #FluSeason", ["#vaccines", "#fluseason"]),
+    ("#2024 is not a hashtag but #2024Election is", ["#2024election"]),
+    ("Not tags: a#b, &#39; or ##double", []),
+    ("Full-width ＃ワクチン works too", ["#ワクチン"]),
+    ("Ends at punctuation: #vaccines, #flu… and #shots。", ["#vaccines", "#flu", "#shots"]),
+])
+def test_hashtags(text, hashtags):
+    assert extract_entities({'text': text}, ("hashtags",)) == {'hashtags': hashtags}
+
+
+@pytest.mark.parametrize("text, mentions", [
+    ("Thanks @CountyHealth and @countyhealth!", ["@countyhealth"]),
+    ("Ask @cdcgov: is it safe?", ["@cdcgov"]),
+    ("Emails like someone@example.com aren't mentions", []),
+    ("@fifteen_chars_x is the longest allowed", ["@fifteen_chars_x"]),
+    ("@toolongusername_abcdefg is rejected, not truncated", []),
+    ("Full-width ＠someone works too", ["@someone"]),
+])
+def test_mentions(text, mentions):
+    assert extract_entities({'text': text}, ("mentions",)) == {'mentions': mentions}
+
+
+@pytest.mark.parametrize("text, urls", [
+    ("Sign up at https://example.com/clinic today", ["https://example.com/clinic"]),
+    ("Details: http://example.com/a?b=1&c=2.", ["http://example.com/a?b=1&c=2"]),
+    ("Trailing punctuation: https://t.co/AbC123, https://t.co/XyZ789!", ["https://t.co/AbC123",
+                                                                          "https://t.co/XyZ789"]),
+    ("Quoted “https://t.co/AbC123” and https://t.co/XyZ789…", ["https://t.co/AbC123",
+                                                                            "https://t.co/XyZ789"]),
+    ("See https://en.wikipedia.org/wiki/Foo_(bar) for more", ["https://en.wikipedia.org/wiki/Foo_(bar)"]),
+    ("(see https://en.wikipedia.org/wiki/Foo_(bar))", ["https://en.wikipedia.org/wiki/Foo_(bar)"]),
+    ("(see https://example.com/clinic).", ["https://example.com/clinic"]),
+    ("No links in here", []),
+])
+def test_urls(text, urls):
+    assert extract_entities({'text': text}, ("urls",)) == {'urls': urls}
+
+
+def test_cashtags():
+    assert extract_entities({'text': "$PFE and $mrna up, $BRK.B flat, $100 isn't one"}, ("cashtags",)) \
+        == {'cashtags': ["$PFE", "$MRNA", "$BRK.B"]}
+
+
+def test_api_entities_are_used_instead_of_the_text():
+    tweet = {'text': "#ignored @ignored", 'entities': {
+        'hashtags': [{'tag': "Vaccines"}, {'tag': "vaccines"}],
+        'mentions': [{'username': "CountyHealth"}],
+        'urls': [{'url': "https://t.co/AbC123", 'expanded_url': "https://example.com/clinic"}],
+        'cashtags': [{'tag': "pfe"}]
+    }}
+
+    assert extract_entities(tweet) == {'hashtags': ["#vaccines"], 'mentions': ["@countyhealth"],
+                                       'urls': ["https://example.com/clinic"], 'cashtags': ["$PFE"]}
+
+
+def test_extract_page_entities_keys_by_tweet_id():
+    tweets = [{'id': "1", 'text': "#Vaccines via @CountyHealth"}, {'id': "2", 'text': "nothing here"}]
+
+    assert extract_page_entities(tweets, ("hashtags", "mentions")) == {
+        "1": {'hashtags': ["#vaccines"], 'mentions': ["@countyhealth"]},
+        "2": {'hashtags': [], 'mentions': []},
+    }
@@ -0,0 +1,85 @@
+"""
+Tests for XClient's error handling and retries, against a stub X API on localhost, and for how the app
+reports a rejected request.
+
+@author Abigail Goodwin <abby.goodwin@outlook.com>
+Copyright 2024, Abigail Goodwin, All rights reserved.
+"""
+
+import importlib.util
+import json
+import os
+
+import pytest
+
+import lib.twitter_importer as twitter_importer
+from lib.ingest_pipeline import IngestPipeline
+from lib.twitter_importer import RateLimitError, XApiError, build_search_params
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), "tweet-scan-app.py")
+
+
+def test_fetch_raw_page_returns_the_page(stub_x_api, x_client):
+    stub_x_api.add("vaccines", 5)
+
+    response = json.loads(x_client.fetch_raw_page(build_search_params("vaccines")))
+
+    assert len(response['data']) == 5
+    assert x_client.request_stats()['statuses'] == {200: 1}
+
+
+@pytest.mark.parametrize("status", [400, 401, 403, 404])
+def test_client_errors_raise_without_retrying(stub_x_api, x_client, status):
+    stub_x_api.statuses = [status] * 3
+
+    with pytest.raises(XApiError) as error_info:
+        x_client.fetch_raw_page(build_search_params("vaccines"))
+
+    assert error_info.value.status_code == status
+    assert f"Stub error {status}." in str(error_info.value)
+    assert len(stub_x_api.requests) == 1
+
+
+@pytest.mark.parametrize("status", [429, 503])
+def test_throttling_and_server_errors_are_retried(stub_x_api, x_client, status):
+    stub_x_api.add("vaccines", 5)
+    stub_x_api.statuses = [status]
+
+    response = json.loads(x_client.fetch_raw_page(build_search_params("vaccines")))
+
+    assert len(response['data']) == 5
+    assert x_client.request_stats()['retries'] == 1
+
+
+def test_persistent_throttling_gives_up(stub_x_api, x_client):
+    stub_x_api.statuses = [429] * 5
+
+    with pytest.raises(RateLimitError):
+        x_client.fetch_raw_page(build_search_params("vaccines"))
+    assert len(stub_x_api.requests) == x_client.max_retries + 1
+
+
+def test_pipeline_leaves_checkpoints_running_on_invalid_credentials(exporter, stub_x_api, x_client):
+    stub_x_api.add("vaccines", 50)
+    stub_x_api.statuses = [401] * 5
+    checkpoints = {"vaccines": exporter.start_checkpoint("vaccines", 50)}
+
+    pipeline = IngestPipeline(lambda topic, page: (page, [], []), lambda: None, client=x_client)
+    with pytest.raises(XApiError):
+        pipeline.run(["vaccines"], 50, checkpoints)
+
+    assert exporter.load_checkpoint("vaccines")['status'] == "running"
+    assert exporter.cursor.execute("SELECT COUNT(*) FROM Tweets").fetchone()[0] == 0
+
+
+def test_app_exits_non_zero_on_invalid_credentials(db_path, stub_x_api, x_client, monkeypatch, capfd):
+    spec = importlib.util.spec_from_file_location("tweet_scan_app", APP_PATH)
+    app = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(app)
+    monkeypatch.setattr(twitter_importer, "_default_client", x_client)
+    stub_x_api.statuses = [401] * 5
+
+    exit_code = app.main(["vaccines", "--backend", "local", "--db", db_path])
+
+    assert exit_code == 1
+    assert "Invalid X API credentials" in capfd.readouterr().err
@@ -1,195 +1,451 @@
 """
-Fetches 1,000 Tweets from X (formerly Twitter) on the user's given topics and analyzes popular sentiment
+Fetches Tweets from X (formerly Twitter) on the user's given topics and analyzes popular sentiment
 across those topics.
 
+Run with no arguments to be prompted for three topics, or non-interactively, e.g.:
+    python tweet-scan-app.py vaccines "gun control" --count 1000 --backend local
+    python tweet-scan-app.py --topics-file topics.txt --interval 900 --log-format json
+    python tweet-scan-app.py vaccines --export-dir exports/     # also writes new tweets out as Parquet
+    python tweet-scan-app.py vaccines --metrics-file metrics.prom --cprofile pull.prof
+
 @author Abigail Goodwin <abby.goodwin@outlook.com>
 Copyright 2024, Abigail Goodwin, All rights reserved.
 """
 
+import argparse
+import json
+import logging
+import signal
+import sys
+import threading
+
 import lib.twitter_importer as twitter_importer
-from lib.tweet_splitter import split_authors, split_json, split_locations
-from lib.data_exporter import DataExporter
-from lib.sentiment_analyzer import analyze_tweet_sentiments, analyze_tweet_keywords
+from lib import metrics
+from lib.tweet_splitter import split_page
+from lib.raw_store import RawPayload
+from lib.data_exporter import DataExporter, STORAGE_PROFILES
+from lib.sentiment_analyzer import ANALYZER_BACKENDS, analyze_tweets, default_cache, use_backend
+from lib.ingest_pipeline import IngestPipeline
+from lib.process_pipeline import ProcessIngestPipeline
+from lib.key_cache import RecentIds
+from lib.app_logging import LOG_FORMATS, configure_logging
+from lib.columnar_export import ColumnarExporter
+from lib.keyword_engine import add_stop_phrases, read_stop_phrases
+
+logger = logging.getLogger("tweet-scan-app")
+
+# TweetIDs known to be stored; shared by the pipeline's analysis and write stages:
+seen_tweet_ids = RecentIds()
+
+# Set by SIGINT/SIGTERM to end a --interval run after the current cycle:
+stop_requested = threading.Event()
 
 
 ############################################################
 #   Tweet-Pulling Functions
 ############################################################
 
-def pull_topic_tweets(in_topic, token):
+def pull_topic_tweets(in_topic, token, data_uploader, since_id=None):
     """
     Pulls 100 tweets for the given topic.
 
     @param in_topic: String; the topic that we want to pull tweets for.
     @param token: (If given) the next page of results to pull tweets from.
-    @return next_token: The next pagination token for the same topic.
+    @param data_uploader: The run's DataExporter.
+    @param since_id: (If given) only tweets newer than this tweet ID are pulled.
+    @return (next_token, result_count); the next pagination token for the same topic (None after the
+            last page), and how many tweets the API returned. Raises ValueError if the API's response
+            isn't a page of search results.
     """
 
     ############################################################
     #   Fetching Tweets
     ############################################################
     topic = in_topic
-    query_params = {'query': (topic + ' -is:retweet lang:en'),
-                    'tweet.fields': 'created_at,geo',
-                    'max_results': 100,
-                    'expansions': 'author_id,geo.place_id'}
 
     ############################################################
     #   Pagination Control Here
     ############################################################
-    if (token != None):
-        query_params['next_token'] = token
+    query_params = twitter_importer.build_search_params(
+        topic, token, since_id=since_id)
 
-    print("INFO: Starting tweet import.")
-    response = twitter_importer.fetch_tweets(query_params)
+    raw_bytes = twitter_importer.fetch_raw_tweets(query_params)
+    response = json.loads(raw_bytes)
 
-    # Should allow us to get the next page of tweets if a valid
-    # response was returned.
-    next_token = None
-    try:
-        next_token = response['meta']['next_token']
-    except:
-        print("Invalid X API credentials provided.")
-        exit(1)
+    # A valid response always has 'meta' (the last page just has no next_token); rejected requests already
+    # raised XApiError, so this is a malformed page, which a --interval run retries on its next pass:
+    if 'meta' not in response:
+        raise ValueError(f"X API response for {topic} has no 'meta': "
+                         f"{response.get('detail') or response.get('title') or 'no details given'}")
 
     ############################################################
     #   Splitting Tweets
     ############################################################
-    tweet_list = split_json(response)
-    author_list = split_authors(response)
-    location_list = split_locations(response)
+    page = split_page(response)
+    page.raw_payload = RawPayload.pack(raw_bytes)
+    next_token = page.next_token
+    result_count = page.result_count
 
     ############################################################
     #   Filtering Tweets Down to Remove Duplicates
     ############################################################
-    data_uploader = DataExporter()
-    tweet_list = data_uploader.check_existing_tweets(tweet_list)
+    page = page.with_tweets(data_uploader.check_existing_tweets(page.tweets))
+    tweet_list = page.tweets
 
     ############################################################
-    #   Iterating Through Tweets & Exporting to DB
+    #   Cognitive Analysis
     ############################################################
-    deleted_authors = []
-    deleted_locations = []
-    counter = 1
-    for tweet in tweet_list:
-        ##############################
-        # Adding User to Table
-        ##############################
-        user_id = 0
-        remove_author = None
-        for author in author_list:
-            if (tweet['author_id'] == author['id']):
-                user_id = data_uploader.addUser(author)
-                remove_author = author
-                break
-
-        if (remove_author is not None):  # Remove author from list to shorten iteration time
-            author_list.remove(remove_author)
-            deleted_authors.append(remove_author)
-        else:  # However, multiple tweets from the same author can be pulled; so go here if the author is not found.
-            for author in deleted_authors:
-                if (tweet['author_id'] == author['id']):
-                    user_id = data_uploader.addUser(author)
-                    break
-
-        ##############################
-        # Add Location to Table
-        ##############################
-        location_id = 0
-        remove_location = None
-        if tweet['location'] is not None:  # If the tweet is geo-tagged
-
-            # Search for matching location in the location list.
-            for place in location_list:
-                if (tweet['location'] == place['id']):
-                    location_id = data_uploader.addLocation(place)
-                    remove_location = place
-                    break
-
-            # Remove the location to speed up iteration
-            if (remove_location is not None):
-                location_list.remove(remove_location)
-                deleted_locations.append(remove_location)
-            else:  # Find the location in the deleted list if all else fails
-                for place in location_list:
-                    if (tweet['location'] == place['id']):
-                        location_id = data_uploader.addLocation(place)
-                        break
-
-        ##############################
-        # Adding Tweet to Table
-        ##############################
-        data_uploader.add_tweet(topic, tweet, user_id, location_id)
-
-        ##############################
-        # Finding Hashtags & Adding
-        ##############################
-        data_uploader.add_tweet_tags(tweet)
-
-        print("INFO: " + str(counter) + " out of " +
-              str(len(tweet_list)) + " tweets pulled.")
-        counter += 1
-
-    print("INFO: Tweet import finished.")
+    tweet_results = analyze_tweets(tweet_list)
 
     ############################################################
-    #   Cognitive Analysis & Upload to DB
+    #   Exporting the Page to the DB (Single Transaction)
     ############################################################
-    print("INFO: Starting Azure analysis.")
-    tweet_sentiments = analyze_tweet_sentiments(tweet_list)
-    tweet_keywords = analyze_tweet_keywords(tweet_list)
-
-    for tweet in tweet_sentiments:
-        data_uploader.add_tweet_sentiment_info(tweet)
+    data_uploader.add_tweet_page(topic, page, tweet_results, tweet_results)
 
-    counter = 1
-    for tweet in tweet_keywords:
-        data_uploader.add_tweet_keywords(tweet, topic)
-        print("INFO: " + str(counter) + " out of " +
-              str(len(tweet_list)) + " tweets complete.")
-        counter += 1
+    logger.debug("Stored a page of %s tweets (%d new of %d).", topic, len(page), result_count,
+                 extra={'topic': topic, 'stored': len(page), 'fetched': result_count})
+    return next_token, result_count
 
-    print("INFO: Analysis finished.")
-    print("=================================================")
-    return next_token
 
-
-def pull_topic(in_topic, num_desired):
+def pull_topic(in_topic, num_desired, data_uploader=None):
     """
-    Pulls in all of the desired tweets for a given topic.
+    Pulls in all of the desired tweets for a given topic, resuming from the topic's checkpoint if an
+    earlier run was interrupted.
 
     @param in_topic: String; the topic we want to pull tweets for.
     @param num_desired: The number of tweets we want for that given topic
+    @param data_uploader: (If given) the run's DataExporter; one is opened for this topic otherwise.
     """
+    if data_uploader is None:
+        data_uploader = DataExporter()
 
-    print("\n=================================================")
-    print("\tFetching Tweets for : " + in_topic)
-    print("=================================================")
-    tweet_count = 0
-    next_token = None
+    logger.info("Fetching Tweets for %s.", in_topic, extra={'topic': in_topic})
+    checkpoint = data_uploader.start_checkpoint(in_topic, num_desired)
+    tweet_count = checkpoint['pass_fetched']
+    next_token = checkpoint['next_token']
     while (tweet_count < num_desired):
-        next_token = pull_topic_tweets(in_topic, next_token)
-        tweet_count += 100
-    print("\n=================================================")
-    print("\tDone Fetching Tweets for : " + in_topic)
-    print("=================================================")
+        next_token, result_count = pull_topic_tweets(
+            in_topic, next_token, data_uploader, checkpoint['since_id'])
+        tweet_count += result_count
+        if next_token is None or result_count == 0:
+            break
+    logger.info("Done Fetching Tweets for %s.", in_topic,
+                extra={'topic': in_topic, 'tweets': tweet_count})
 
 
 ############################################################
-#   Main
+#   Pipelined Tweet-Pulling Functions
+############################################################
+
+def analyze_page(topic, page):
+    """
+    Analysis stage of the pipelined import: runs the page's tweets through the analyzer.
+
+    @param topic: String; the topic the page was pulled for.
+    @param page: TweetPage; the fetched page.
+    @return (page, tweet_sentiments, tweet_keywords)
+    """
+    # Don't pay for analysis of tweets the writer has already stored:
+    page = page.with_tweets(seen_tweet_ids.filter_unseen(page.tweets))
+
+    tweet_results = analyze_tweets(page.tweets)
+    return page, tweet_results, tweet_results
+
+
+def open_page_store(db_path=None, profile="balanced"):
+    """
+    Write stage of the pipelined import. Called once on the writer thread, which then owns the DB connection.
+
+    @param db_path: (If given) the SQLite database to write to; DataExporter's default otherwise.
+    @param profile: The database connection's storage profile (see data_exporter.STORAGE_PROFILES).
+    @return store_page: Callable(topic, page, tweet_sentiments, tweet_keywords).
+    """
+    data_uploader = DataExporter(db_path, seen_tweet_ids=seen_tweet_ids, profile=profile)
+
+    def store_page(topic, page, tweet_sentiments, tweet_keywords):
+        page = page.with_tweets(
+            data_uploader.check_existing_tweets(page.tweets))
+        data_uploader.add_tweet_page(
+            topic, page, tweet_sentiments, tweet_keywords)
+
+    return store_page
+
+
+def open_batch_store(db_path=None, profile="balanced"):
+    """
+    Write stage of the multi-process import (see open_page_store); commits several pages at a time.
+
+    @return (store_pages, stored_tweet_ids): store_pages is a Callable(list of (topic, page, tweet_sentiments,
+            tweet_keywords)); stored_tweet_ids(tweet IDs) is the set of those IDs already stored, which the
+            pipeline checks before a page is sent for analysis.
+    """
+    data_uploader = DataExporter(db_path, seen_tweet_ids=seen_tweet_ids, profile=profile)
+
+    def store_pages(pages):
+        new_pages = []
+        for topic, page, tweet_sentiments, tweet_keywords in pages:
+            # Drop tweets stored since their page was sent for analysis (e.g. by another topic's pages):
+            page = page.with_tweets(data_uploader.check_existing_tweets(page.tweets))
+            page_ids = {str(tweet_id) for tweet_id in page.ids}
+            tweet_results = [tweet_info for tweet_info in tweet_sentiments if str(tweet_info['id']) in page_ids]
+            new_pages.append((topic, page, tweet_results, tweet_results))
+        data_uploader.add_tweet_pages(new_pages)
+
+    return store_pages, data_uploader.stored_tweet_ids
+
+
+def pull_topics_pipelined(topics, num_desired, workers=None, db_path=None, profile="balanced",
+                          processes=0, backend="azure") -> dict:
+    """
+    Pulls in all of the desired tweets for several topics at once, overlapping fetching, analysis and DB writes.
+
+    @param topics: List of topic strings.
+    @param num_desired: The number of tweets we want for each topic.
+    @param workers: (If given) how many topics to pull at the same time; all of them otherwise.
+    @param db_path: (If given) the SQLite database to write to.
+    @param profile: The database connection's storage profile.
+    @param processes: (If given) how many worker processes to parse and analyze pages in (see
+                      process_pipeline); analysis runs on threads in this process otherwise.
+    @param backend: The analysis backend worker processes use.
+    @return Python dictionary; topic -> the number of tweets pulled.
+    """
+    logger.info("Fetching Tweets for %s.", ", ".join(topics), extra={'topics': topics})
+
+    # Start (or resume) each topic's checkpoint; the writer thread opens its own connection later:
+    data_uploader = DataExporter(db_path, seen_tweet_ids=seen_tweet_ids, profile=profile)
+    checkpoints = {topic: data_uploader.start_checkpoint(topic, num_desired)
+                   for topic in topics}
+    del data_uploader
+
+    if processes:
+        pipeline = ProcessIngestPipeline(lambda: open_batch_store(db_path, profile), backend,
+                                         processes=processes, max_topics=workers or len(topics))
+    else:
+        pipeline = IngestPipeline(analyze_page, lambda: open_page_store(db_path, profile),
+                                  max_topics=workers or len(topics))
+    counts = pipeline.run(topics, num_desired, checkpoints)
+
+    for topic, tweet_count in counts.items():
+        logger.info("%d tweets pulled for %s.", tweet_count, topic,
+                    extra={'topic': topic, 'tweets': tweet_count})
+
+    fetch_stats = twitter_importer.default_client().request_stats()
+    logger.info("%d X API requests, %d bytes, p50 %.3fs, p95 %.3fs, statuses %s.",
+                fetch_stats['requests'], fetch_stats['bytes'], fetch_stats['latency_p50'],
+                fetch_stats['latency_p95'], fetch_stats['statuses'], extra={'fetch': fetch_stats})
+
+    cache_stats = default_cache().stats()
+    if cache_stats['hits'] + cache_stats['misses'] > 0:
+        logger.info("Analysis cache: %d hits (%d near-duplicates), %d misses (%.1f%% hit rate).",
+                    cache_stats['hits'], cache_stats['near_duplicate_hits'], cache_stats['misses'],
+                    100 * cache_stats['hit_rate'], extra={'cache': cache_stats})
+
+    logger.info("Done Fetching Tweets for %s.", ", ".join(topics), extra={'counts': counts})
+    return counts
+
+
+def run_pass(topics, args, columnar_exporter=None) -> None:
+    """
+    Pulls every topic once, then exports the new tweets and writes the metrics file (if asked for).
+
+    With --cprofile, topics are pulled one after another through pull_topic() instead of the pipeline,
+    since cProfile only sees the thread that started it.
+
+    @param topics: List of topic strings.
+    @param args: The parsed command line (see parse_args).
+    @param columnar_exporter: (If given) ColumnarExporter to write the new tweets to.
+    """
+    if args.cprofile:
+        data_uploader = DataExporter(args.db, seen_tweet_ids=seen_tweet_ids, profile=args.storage_profile)
+        with metrics.profiled(args.cprofile):
+            for topic in topics:
+                pull_topic(topic, args.count, data_uploader)
+        del data_uploader
+    else:
+        pull_topics_pipelined(topics, args.count, args.workers, args.db, args.storage_profile,
+                              args.processes, args.backend)
+
+    if columnar_exporter is not None:
+        columnar_exporter.export()
+
+    if args.metrics_file:
+        metrics.default_registry().write(args.metrics_file)
+        logger.debug("Metrics written to %s.", args.metrics_file)
+
+
 ############################################################
-def main():
-    data_uploader = DataExporter()
+#   Command Line
+############################################################
+
+def read_topics(topics, topics_file=None):
+    """
+    Collects the run's topics from the command line and/or a file (one topic per line; blank lines and
+    lines starting with "#" are skipped). Duplicates are dropped.
+
+    @param topics: List of topics given as arguments.
+    @param topics_file: (If given) path to the topics file.
+    @return List of topic strings.
+    """
+    all_topics = list(topics)
+    if topics_file is not None:
+        with open(topics_file) as file:
+            all_topics.extend(line.strip() for line in file
+                              if line.strip() and not line.lstrip().startswith("#"))
+
+    return list(dict.fromkeys(topic.strip() for topic in all_topics if topic.strip()))
 
+
+def parse_args(argv=None):
+    """
+    @param argv: (If given) the arguments to parse; sys.argv otherwise.
+    @return argparse.Namespace
+    """
+    parser = argparse.ArgumentParser(
+        description="Fetch tweets on the given topics, analyze their sentiment and key phrases, and store them.")
+    parser.add_argument("topics", nargs="*",
+                        help="Topics to pull (prompted for if none are given here or in --topics-file).")
+    parser.add_argument("--topics-file", help="File with one topic per line.")
+    parser.add_argument("--count", type=int, default=500,
+                        help="Tweets to pull per topic on each pass (default: 500).")
+    parser.add_argument("--interval", type=float, default=0,
+                        help="Seconds between passes; keeps refreshing (newer tweets only) until stopped. "
+                             "0 runs a single pass (default).")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Topics pulled at the same time (default: all of them).")
+    parser.add_argument("--processes", type=int, default=0,
+                        help="Worker processes to parse and analyze pages in, for large backfills "
+                             "(default: 0, analyze on threads in this process).")
+    parser.add_argument("--backend", choices=ANALYZER_BACKENDS, default="azure",
+                        help="Sentiment/key-phrase analyzer (default: azure).")
+    parser.add_argument("--db", help="SQLite database path (default: sql/twitter_base.db).")
+    parser.add_argument("--storage-profile", choices=list(STORAGE_PROFILES), default="balanced",
+                        help="SQLite connection settings; bulk trades crash safety for speed (default: balanced).")
+    parser.add_argument("--stop-phrases",
+                        help="File with one key phrase per line to leave out of the stored key phrases, on top "
+                             "of the built-in stop phrases.")
+    parser.add_argument("--export-dir",
+                        help="After each pass, export the newly stored tweets here as Parquet (needs pyarrow).")
+    parser.add_argument("--metrics-file",
+                        help="Record per-stage counters and timings, and write them here after each pass "
+                             "(JSON for a .json path, Prometheus text otherwise).")
+    parser.add_argument("--cprofile",
+                        help="Profile each pass with cProfile (topics are pulled one at a time) and save the "
+                             "stats here.")
+    parser.add_argument("--log-level", default="INFO",
+                        choices=["DEBUG", "INFO", "WARNING", "ERROR"], help="Default: INFO.")
+    parser.add_argument("--log-format", default="text", choices=LOG_FORMATS,
+                        help="text, or json for one JSON object per line (default: text).")
+
+    args = parser.parse_args(argv)
+    if args.count < 1:
+        parser.error("--count must be at least 1.")
+    if args.workers is not None and args.workers < 1:
+        parser.error("--workers must be at least 1.")
+    if args.processes < 0:
+        parser.error("--processes can't be negative.")
+    if args.interval < 0:
+        parser.error("--interval can't be negative.")
+    return args
+
+
+def prompt_topics():
+    """
+    Asks for three topics on the terminal (the app's original interactive mode).
+    """
     first_topic = input("Enter in your first topic: ")
-    pull_topic(first_topic, 500)
     second_topic = input("Enter in your second topic: ")
-    pull_topic(second_topic, 500)
     third_topic = input("Enter in your third topic: ")
-    pull_topic(third_topic, 500)
+    return read_topics([first_topic, second_topic, third_topic])
+
+
+def report_api_error(error) -> None:
+    """
+    Logs why the X API rejected the run's requests.
+
+    @param error: twitter_importer.XApiError
+    """
+    if error.status_code in (401, 403):
+        logger.error("Invalid X API credentials provided (%s).", error, extra={'status': error.status_code})
+    else:
+        logger.error("%s", error, extra={'status': error.status_code})
 
-    print("\n\n Done!")
+
+def request_stop(signal_number, frame) -> None:
+    """
+    Signal handler; lets a --interval run finish its current pass and exit.
+    """
+    if stop_requested.is_set():
+        raise KeyboardInterrupt
+    logger.info("Stopping after the current pass (signal %d); send again to stop now.", signal_number)
+    stop_requested.set()
+
+
+############################################################
+#   Main
+############################################################
+def main(argv=None):
+    args = parse_args(argv)
+    configure_logging(args.log_level, args.log_format)
+    use_backend(args.backend)
+
+    if args.stop_phrases:
+        try:
+            add_stop_phrases(read_stop_phrases(args.stop_phrases))
+        except OSError as error:
+            logger.error("Couldn't read --stop-phrases: %s", error)
+            return 2
+
+    topics = read_topics(args.topics, args.topics_file)
+    if not topics:
+        if not sys.stdin.isatty():
+            logger.error("No topics given; pass them as arguments or with --topics-file.")
+            return 2
+        topics = prompt_topics()
+
+    columnar_exporter = None
+    if args.export_dir:
+        try:
+            columnar_exporter = ColumnarExporter(args.export_dir, args.db, args.storage_profile)
+        except ImportError as error:
+            logger.error("%s", error)
+            return 2
+
+    if args.metrics_file:
+        metrics.enable()
+
+    if args.interval <= 0:
+        try:
+            run_pass(topics, args, columnar_exporter)
+        except twitter_importer.XApiError as error:
+            report_api_error(error)
+            return 1
+        except ValueError as error:
+            logger.error("%s", error)
+            return 1
+        return 0
+
+    # Daemon mode: one pass per interval, each picking up only tweets newer than the last:
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+    passes = 0
+    while not stop_requested.is_set():
+        try:
+            run_pass(topics, args, columnar_exporter)
+        except twitter_importer.XApiError as error:
+            # Retrying won't help until the request (or the credentials) are fixed:
+            report_api_error(error)
+            return 1
+        except Exception:
+            logger.exception("Pass failed; retrying next interval.")
+        passes += 1
+
+        logger.info("Pass %d finished; next pass in %.0fs.", passes, args.interval,
+                    extra={'passes': passes})
+        stop_requested.wait(args.interval)
+
+    logger.info("Stopped after %d passes.", passes, extra={'passes': passes})
+    return 0
 
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())